@@ -1,14 +1,202 @@
 import requests
 import json
 import base64
+import logging
+import threading
+import time
+from io import BytesIO
+from concurrent.futures import ThreadPoolExecutor
 from django.core.mail.backends.base import BaseEmailBackend
 from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
 from msal import ConfidentialClientApplication
+from requests.adapters import HTTPAdapter
 from urllib.parse import quote
 
+logger = logging.getLogger(__name__)
+
+# Graph accepts at most 20 requests per JSON $batch call.
+GRAPH_BATCH_LIMIT = 20
+# $batch bodies are capped at 4 MB, so messages with attachments are sent on their own.
+GRAPH_BATCH_MAX_PAYLOAD = 3 * 1024 * 1024
+
+# Graph rejects inline (base64) attachments above ~3 MB; bigger files go through a
+# draft + attachment upload session, streamed in chunks that are multiples of 320 KiB.
+GRAPH_INLINE_ATTACHMENT_LIMIT = 3 * 1024 * 1024
+UPLOAD_CHUNK_SIZE = 10 * 320 * 1024
+
+# App-only tokens are shared through the Django cache so every gunicorn worker and
+# Celery process reuses one token instead of each hitting the identity endpoint.
+TOKEN_CACHE_KEY = "graph_access_token:{tenant_id}:{client_id}"
+TOKEN_LOCK_TIMEOUT = 30
+TOKEN_WAIT_SECONDS = 5
+
+# Shared send budget and global back-off, so every process slows down together
+# when Graph returns 429/503 instead of each one retrying into the limit.
+SEND_WINDOW_KEY = "graph_send_window:{window}"
+THROTTLED_UNTIL_KEY = "graph_send_throttled_until"
+THROTTLE_STATUSES = (429, 503)
+DEFAULT_RETRY_AFTER = 30
+# Cache backends that live inside one process. With these, the token, the send
+# budget and the back-off are per process, so N workers send at N times the limit.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+_lock = threading.Lock()
+_session = None
+_apps = {}
+# Per-process copy of the shared token, to skip the cache round-trip on hot paths.
+_tokens = {}
+_cache_checked = False
+
+
+def get_graph_session():
+    """
+    One keep-alive session per process, sized for the backend's worker pool.
+    requests.Session is safe to share between threads for plain POSTs.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                pool_size = getattr(settings, 'GRAPH_EMAIL_MAX_WORKERS', 4)
+                adapter = HTTPAdapter(pool_connections=2, pool_maxsize=max(pool_size, 1))
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                _session = session
+    return _session
+
+
+def get_msal_app(client_id, client_secret, authority):
+    """MSAL apps keep their own in-memory token cache, so reuse one per process."""
+    key = (client_id, authority)
+    app = _apps.get(key)
+    if app is None:
+        with _lock:
+            app = _apps.get(key)
+            if app is None:
+                app = ConfidentialClientApplication(
+                    client_id,
+                    authority=authority,
+                    client_credential=client_secret
+                )
+                _apps[key] = app
+    return app
+
+
+class GraphSendError(Exception):
+    """Some messages failed outright. `failed` holds them; the rest of the call was sent."""
+
+    def __init__(self, message, failed=None):
+        super().__init__(message)
+        self.failed = failed or []
+
+
+class GraphThrottledError(Exception):
+    """
+    Graph is throttling sends. `unsent` holds the messages the caller should
+    re-queue; `failed` any that failed for other reasons in the same call.
+    """
+
+    def __init__(self, message, retry_after, unsent=None, failed=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.unsent = unsent or []
+        self.failed = failed or []
+
+
+def parse_retry_after(value):
+    try:
+        return max(int(float(value)), 1)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+
+def warn_if_cache_not_shared():
+    """Logs once per process when the default cache cannot coordinate sends across processes."""
+    global _cache_checked
+    if _cache_checked:
+        return
+    _cache_checked = True
+    backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+    if backend in PROCESS_LOCAL_CACHES:
+        logger.warning(
+            "The default cache (%s) is local to this process, so the Graph send budget "
+            "(GRAPH_EMAIL_RATE_PER_MINUTE) and the 429 back-off are not shared between "
+            "web and Celery workers. Set CACHE_URL to a Redis instance in production.",
+            backend,
+        )
+
+
+def throttle_sends(retry_after):
+    """Starts (or extends) the global back-off that every process honours."""
+    until = time.time() + retry_after
+    current = cache.get(THROTTLED_UNTIL_KEY)
+    if not current or current < until:
+        cache.set(THROTTLED_UNTIL_KEY, until, int(retry_after) + 1)
+
+
+def reserve_send_capacity(count, max_wait):
+    """
+    Blocks until `count` sends fit in the shared per-minute budget
+    (GRAPH_EMAIL_RATE_PER_MINUTE, 0 = unlimited) and no global back-off is
+    active. Raises GraphThrottledError when that would take longer than max_wait.
+    """
+    warn_if_cache_not_shared()
+    limit = getattr(settings, 'GRAPH_EMAIL_RATE_PER_MINUTE', 0)
+    deadline = time.time() + max_wait
+    while True:
+        now = time.time()
+        until = cache.get(THROTTLED_UNTIL_KEY)
+        if until and until > now:
+            wait = until - now
+        elif not limit:
+            return
+        else:
+            window = int(now // 60)
+            key = SEND_WINDOW_KEY.format(window=window)
+            cache.add(key, 0, 120)
+            try:
+                used = cache.incr(key, count)
+            except ValueError:
+                cache.set(key, count, 120)
+                used = count
+            if used <= limit:
+                return
+            cache.decr(key, count)
+            wait = (window + 1) * 60 - now
+
+        if now + wait > deadline:
+            retry_after = max(int(wait) + 1, 1)
+            raise GraphThrottledError(f"Graph send budget exhausted; retry after {retry_after}s.", retry_after)
+        time.sleep(wait)
+
+
+class _GraphStepError(Exception):
+    def __init__(self, response):
+        super().__init__(f"Graph API error {response.status_code}: {response.text}")
+        self.response = response
+
 
 class GraphEmailBackend(BaseEmailBackend):
-    def __init__(self, fail_silently=False, **kwargs):
+    """
+    Sends mail through Microsoft Graph sendMail. Messages go out over a shared
+    pooled session, concurrently on a bounded thread pool, and (when enabled)
+    grouped up to 20 per JSON $batch round-trip.
+
+    Attachments over GRAPH_INLINE_ATTACHMENT_LIMIT, and files listed in a
+    message's `storage_attachments` ({storage_name, filename, mimetype, size}),
+    are uploaded through a Graph upload session, read from storage chunk by chunk.
+
+    GRAPH_API_BASE_URL can point at a local stand-in server for testing; the
+    access token can be supplied with the `access_token` kwarg in that case.
+    """
+
+    def __init__(self, fail_silently=False, access_token=None, session=None, **kwargs):
         super().__init__(fail_silently=fail_silently)
 
         self.client_id = settings.SOCIAL_AUTH_AZUREAD_OAUTH2_KEY
@@ -21,96 +209,394 @@ class GraphEmailBackend(BaseEmailBackend):
         self.authority = f"https://login.microsoftonline.com/{self.tenant_id}"
         self.scope = ["https://graph.microsoft.com/.default"]
 
-        self.app = ConfidentialClientApplication(
-            self.client_id,
-            authority=self.authority,
-            client_credential=self.client_secret
-        )
+        self.base_url = getattr(settings, 'GRAPH_API_BASE_URL', "https://graph.microsoft.com/v1.0").rstrip("/")
+        self.max_workers = max(getattr(settings, 'GRAPH_EMAIL_MAX_WORKERS', 4), 1)
+        self.use_batch = getattr(settings, 'GRAPH_EMAIL_USE_BATCH', True)
+        self.timeout = getattr(settings, 'GRAPH_EMAIL_TIMEOUT', 30)
+        self.max_throttle_wait = getattr(settings, 'GRAPH_THROTTLE_MAX_WAIT', 30)
+        self.max_throttle_retries = getattr(settings, 'GRAPH_THROTTLE_MAX_RETRIES', 2)
 
+        self._access_token = access_token
+        self._upload_attachments = {}
+        self.session = session or get_graph_session()
         self.encoded_sender_email = quote(self.sender_email)
 
-    def get_access_token(self):
+    @property
+    def app(self):
+        return get_msal_app(self.client_id, self.client_secret, self.authority)
+
+    def _acquire_token(self):
         result = self.app.acquire_token_silent(self.scope, account=None)
         if not result:
             result = self.app.acquire_token_for_client(scopes=self.scope)
 
         if "access_token" not in result:
             raise Exception("Failed to acquire access token from Microsoft Graph API.")
-        return result["access_token"]
+        return {
+            "access_token": result["access_token"],
+            "expires_at": time.time() + int(result.get("expires_in", 3599)),
+        }
 
-    def send_messages(self, email_messages):
-        access_token = self.get_access_token()
+    def get_access_token(self):
+        """
+        Returns a token from the shared cache, refreshing it once it is within
+        GRAPH_TOKEN_REFRESH_MARGIN seconds of expiry. Only the process holding the
+        refresh lock calls the identity endpoint; the others keep using the
+        still-valid token or wait briefly for the new one.
+        """
+        if self._access_token:
+            return self._access_token
+
+        key = TOKEN_CACHE_KEY.format(tenant_id=self.tenant_id, client_id=self.client_id)
+        margin = getattr(settings, 'GRAPH_TOKEN_REFRESH_MARGIN', 300)
+
+        token = _tokens.get(key)
+        if token and token["expires_at"] - time.time() > margin:
+            return token["access_token"]
 
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
+        token = cache.get(key)
+        if not token or token["expires_at"] - time.time() <= margin:
+            token = self._refresh_shared_token(key, token)
+
+        _tokens[key] = token
+        return token["access_token"]
+
+    def _refresh_shared_token(self, key, current):
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, TOKEN_LOCK_TIMEOUT):
+            try:
+                token = self._acquire_token()
+                cache.set(key, token, max(int(token["expires_at"] - time.time()), 1))
+                return token
+            finally:
+                cache.delete(lock_key)
+
+        # Another process is refreshing. A token that has not actually expired is still usable.
+        if current and current["expires_at"] > time.time():
+            return current
+
+        deadline = time.time() + TOKEN_WAIT_SECONDS
+        while time.time() < deadline:
+            time.sleep(0.2)
+            token = cache.get(key)
+            if token and token["expires_at"] > time.time():
+                return token
+
+        logger.warning("Timed out waiting for the shared Graph token refresh; acquiring directly.")
+        return self._acquire_token()
+
+    @property
+    def send_mail_path(self):
+        return f"/users/{self.encoded_sender_email}/sendMail"
+
+    def build_payload(self, email_message):
+        # Recipients
+        recipients = [
+            {"emailAddress": {"address": email}}
+            for email in email_message.to
+        ]
+
+        # Attachments
+        attachments_list = []
+        for attachment in email_message.attachments:
+            filename, content, mimetype = attachment
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            if len(content) > GRAPH_INLINE_ATTACHMENT_LIMIT:
+                continue  # sent through an upload session instead
+            base64_content = base64.b64encode(content).decode("utf-8")
+
+            attachments_list.append({
+                "@odata.type": "#microsoft.graph.fileAttachment",
+                "name": filename,
+                "contentType": mimetype,
+                "contentBytes": base64_content,
+                "isInline": False
+            })
+
+        # Message body
+        message = {
+            "subject": email_message.subject,
+            "body": {
+                "contentType": "HTML",
+                "content": email_message.body
+            },
+            "toRecipients": recipients,
+            "attachments": attachments_list
         }
+        if email_message.cc:
+            message["ccRecipients"] = [{"emailAddress": {"address": e}} for e in email_message.cc]
+        if email_message.bcc:
+            message["bccRecipients"] = [{"emailAddress": {"address": e}} for e in email_message.bcc]
 
-        num_sent = 0
+        return {
+            "message": message,
+            "saveToSentItems": True
+        }
+
+    def _post(self, url, access_token, body):
+        return self.session.post(
+            url,
+            headers={
+                "Authorization": f"Bearer {access_token}",
+                "Content-Type": "application/json"
+            },
+            data=body,
+            timeout=self.timeout
+        )
 
-        for email_message in email_messages:
+    def large_attachments(self, email_message):
+        """(filename, mimetype, size, open_file) for attachments that need an upload session."""
+        large = []
+        for filename, content, mimetype in email_message.attachments:
+            if isinstance(content, str):
+                content = content.encode("utf-8")
+            if len(content) > GRAPH_INLINE_ATTACHMENT_LIMIT:
+                large.append((filename, mimetype or "application/octet-stream", len(content),
+                              lambda content=content: BytesIO(content)))
+        for attachment in getattr(email_message, "storage_attachments", []):
+            storage_name = attachment["storage_name"]
+            size = attachment.get("size") or default_storage.size(storage_name)
+            large.append((attachment["filename"], attachment.get("mimetype") or "application/octet-stream", size,
+                          lambda storage_name=storage_name: default_storage.open(storage_name, "rb")))
+        return large
 
-            # Recipients
-            recipients = [
-                {"emailAddress": {"address": email}}
-                for email in email_message.to
+    def _throttled(self, items, response, retry_after_header):
+        retry_after = parse_retry_after(retry_after_header)
+        throttle_sends(retry_after)
+        logger.warning("Graph API throttled mail send (status %s); backing off %ss.",
+                       response.status_code if response is not None else "batch item", retry_after)
+        error = GraphThrottledError(f"Graph API throttled the request; retry after {retry_after}s.", retry_after)
+        return [(index, False, error, retry_after) for index, _ in items]
+
+    def _send_single(self, access_token, items):
+        """Posts one message. Returns [(index, sent, error, retry_after)]."""
+        [(index, payload)] = items
+        url = f"{self.base_url}{self.send_mail_path}"
+        try:
+            response = self._post(url, access_token, json.dumps(payload))
+        except requests.RequestException as e:
+            return [(index, False, e, None)]
+
+        if response.status_code == 202:
+            return [(index, True, None, None)]
+        if response.status_code in THROTTLE_STATUSES:
+            return self._throttled(items, response, response.headers.get("Retry-After"))
+        logger.error("Graph API mail send failure (status %s): %s", response.status_code, response.text)
+        return [(index, False, Exception(f"Graph API error {response.status_code}: {response.text}"), None)]
+
+    def _send_batch(self, access_token, items):
+        """Sends up to GRAPH_BATCH_LIMIT messages in one $batch call. Returns [(index, sent, error, retry_after)]."""
+        body = {
+            "requests": [
+                {
+                    "id": str(index),
+                    "method": "POST",
+                    "url": self.send_mail_path,
+                    "headers": {"Content-Type": "application/json"},
+                    "body": payload,
+                }
+                for index, payload in items
             ]
+        }
+        try:
+            response = self._post(f"{self.base_url}/$batch", access_token, json.dumps(body))
+        except requests.RequestException as e:
+            return [(index, False, e, None) for index, _ in items]
 
-            # Attachments
-            attachments_list = []
-            for attachment in email_message.attachments:
-                filename, content, mimetype = attachment
-                base64_content = base64.b64encode(content).decode("utf-8")
-
-                attachments_list.append({
-                    "@odata.type": "#microsoft.graph.fileAttachment",
-                    "name": filename,
-                    "contentType": mimetype,
-                    "contentBytes": base64_content,
-                    "isInline": False
-                })
-
-            # Message body
-            message = {
-                "subject": email_message.subject,
-                "body": {
-                    "contentType": "HTML",
-                    "content": email_message.body
-                },
-                "toRecipients": recipients,
-                "attachments": attachments_list
-            }
-
-            payload = {
-                "message": message,
-                "saveToSentItems": True
-            }
-
-            send_mail_url = (
-                f"https://graph.microsoft.com/v1.0/users/"
-                f"{self.encoded_sender_email}/sendMail"
-            )
+        if response.status_code in THROTTLE_STATUSES:
+            return self._throttled(items, response, response.headers.get("Retry-After"))
+        if response.status_code != 200:
+            logger.error("Graph API $batch failure (status %s): %s", response.status_code, response.text)
+            error = Exception(f"Graph API $batch error {response.status_code}: {response.text}")
+            return [(index, False, error, None) for index, _ in items]
 
-            try:
-                response = requests.post(
-                    send_mail_url,
-                    headers=headers,
-                    data=json.dumps(payload),
-                    timeout=30
-                )
+        outcomes = []
+        for item in response.json().get("responses", []):
+            index = int(item.get("id"))
+            status = item.get("status")
+            if status == 202:
+                outcomes.append((index, True, None, None))
+            elif status in THROTTLE_STATUSES:
+                retry_header = (item.get("headers") or {}).get("Retry-After")
+                outcomes.extend(self._throttled([(index, None)], None, retry_header))
+            else:
+                logger.error("Graph API $batch item %s failed (status %s): %s", index, status, item.get("body"))
+                outcomes.append((index, False, Exception(f"Graph API error {status}: {item.get('body')}"), None))
+        return outcomes
+
+    def _send_with_upload_session(self, access_token, items):
+        """
+        Creates a draft, streams each large attachment through an upload session,
+        then sends the draft. Returns [(index, sent, error, retry_after)].
+        """
+        [(index, (payload, attachments))] = items
+        messages_url = f"{self.base_url}/users/{self.encoded_sender_email}/messages"
+        message_id = None
+
+        def check(response, *expected):
+            if response.status_code not in expected:
+                raise _GraphStepError(response)
+            return response
+
+        try:
+            response = check(self._post(messages_url, access_token, json.dumps(payload["message"])), 201)
+            message_id = response.json()["id"]
+
+            for filename, mimetype, size, open_file in attachments:
+                session_body = {
+                    "AttachmentItem": {
+                        "attachmentType": "file",
+                        "name": filename,
+                        "size": size,
+                        "contentType": mimetype,
+                    }
+                }
+                response = check(self._post(
+                    f"{messages_url}/{message_id}/attachments/createUploadSession",
+                    access_token, json.dumps(session_body)
+                ), 200, 201)
+                upload_url = response.json()["uploadUrl"]
+
+                # The upload URL is pre-authorised; it must not carry the bearer token.
+                with open_file() as f:
+                    offset = 0
+                    while offset < size:
+                        chunk = f.read(UPLOAD_CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        end = offset + len(chunk) - 1
+                        check(self.session.put(
+                            upload_url,
+                            data=chunk,
+                            headers={
+                                "Content-Type": "application/octet-stream",
+                                "Content-Length": str(len(chunk)),
+                                "Content-Range": f"bytes {offset}-{end}/{size}",
+                            },
+                            timeout=self.timeout
+                        ), 200, 201)
+                        offset = end + 1
+
+            check(self._post(f"{messages_url}/{message_id}/send", access_token, ""), 202)
+            return [(index, True, None, None)]
+
+        except (_GraphStepError, requests.RequestException, KeyError, ValueError) as e:
+            if message_id:
+                self._discard_draft(access_token, f"{messages_url}/{message_id}")
+            response = getattr(e, "response", None)
+            if isinstance(e, _GraphStepError) and response.status_code in THROTTLE_STATUSES:
+                return self._throttled(items, response, response.headers.get("Retry-After"))
+            logger.error("Graph API upload-session send failed: %s", e)
+            return [(index, False, e, None)]
+
+    def _discard_draft(self, access_token, draft_url):
+        try:
+            self.session.delete(draft_url, headers={"Authorization": f"Bearer {access_token}"}, timeout=self.timeout)
+        except requests.RequestException:
+            logger.warning("Could not delete Graph draft %s after a failed send.", draft_url)
+
+    def _plan_requests(self, items):
+        """Groups (index, payload) items into $batch chunks; large ones are sent individually."""
+        singles, batchable, uploads = [], [], []
+        for index, payload in items:
+            if index in self._upload_attachments:
+                uploads.append((index, (payload, self._upload_attachments[index])))
+            elif self.use_batch and len(json.dumps(payload)) <= GRAPH_BATCH_MAX_PAYLOAD // GRAPH_BATCH_LIMIT:
+                batchable.append((index, payload))
+            else:
+                singles.append((index, payload))
 
-                if response.status_code == 202:
+        plan = [(self._send_with_upload_session, [item]) for item in uploads]
+        plan += [(self._send_single, [item]) for item in singles]
+        if len(batchable) == 1:
+            plan.append((self._send_single, batchable))
+        else:
+            chunk_size = GRAPH_BATCH_LIMIT
+            rate_limit = getattr(settings, 'GRAPH_EMAIL_RATE_PER_MINUTE', 0)
+            if rate_limit:
+                chunk_size = max(min(chunk_size, rate_limit), 1)
+            for start in range(0, len(batchable), chunk_size):
+                plan.append((self._send_batch, batchable[start:start + chunk_size]))
+        return plan
+
+    def _run_planned(self, access_token, send, items):
+        try:
+            reserve_send_capacity(len(items), self.max_throttle_wait)
+        except GraphThrottledError as e:
+            return [(index, False, e, e.retry_after) for index, _ in items]
+        return send(access_token, items)
+
+    def send_messages(self, email_messages):
+        """
+        Sends what it can and returns the count. Throttled messages are retried
+        after the shared back-off while that stays under GRAPH_THROTTLE_MAX_WAIT;
+        anything still unsent is raised as GraphThrottledError(unsent=[...]) so
+        the caller can re-queue it instead of dropping it.
+        """
+        email_messages = [m for m in email_messages if m.recipients()]
+        if not email_messages:
+            return 0
+
+        try:
+            access_token = self.get_access_token()
+        except Exception:
+            if not self.fail_silently:
+                raise
+            return 0
+
+        payloads = {index: self.build_payload(m) for index, m in enumerate(email_messages)}
+        self._upload_attachments = {}
+        for index, m in enumerate(email_messages):
+            large = self.large_attachments(m)
+            if large:
+                self._upload_attachments[index] = large
+        pending = set(payloads)
+        num_sent = 0
+        errors = []
+        failed = []
+        retry_after = 0
+
+        for _ in range(self.max_throttle_retries + 1):
+            plan = self._plan_requests([(index, payloads[index]) for index in sorted(pending)])
+            if len(plan) == 1:
+                send, items = plan[0]
+                outcomes = self._run_planned(access_token, send, items)
+            else:
+                with ThreadPoolExecutor(max_workers=min(self.max_workers, len(plan))) as pool:
+                    outcomes = [
+                        outcome
+                        for result in pool.map(lambda step: self._run_planned(access_token, *step), plan)
+                        for outcome in result
+                    ]
+
+            throttled = False
+            for index, sent, error, item_retry_after in outcomes:
+                if sent:
                     num_sent += 1
+                    pending.discard(index)
+                elif item_retry_after is not None:
+                    throttled = True
+                    retry_after = max(retry_after, item_retry_after)
                 else:
-                    print(f"Graph API Mail Send Failure (Status {response.status_code})")
-                    print(f"URL: {send_mail_url}")
-                    print(f"Response: {response.text}")
-                    raise Exception(
-                        f"Graph API error {response.status_code}: {response.text}"
-                    )
-
-            except Exception as e:
-                if not self.fail_silently:
-                    raise e
+                    errors.append(error)
+                    failed.append(index)
+                    pending.discard(index)
+            if not throttled:
+                break
+
+        if not self.fail_silently:
+            if pending:
+                raise GraphThrottledError(
+                    f"{len(pending)} message(s) not sent: Graph API is throttling.",
+                    retry_after,
+                    unsent=[email_messages[index] for index in sorted(pending)],
+                    failed=[email_messages[index] for index in failed],
+                )
+            if errors:
+                raise GraphSendError(
+                    f"{len(errors)} message(s) failed: {errors[0]}",
+                    failed=[email_messages[index] for index in failed],
+                ) from errors[0]
 
         return num_sent
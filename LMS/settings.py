@@ -75,6 +75,7 @@ TEMPLATES = [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
+                'lmsApp.context_processors.notifications',
             ],
         },
     },
@@ -102,6 +103,26 @@ else:
         }
     }
 
+# Redis is required in production: the Graph token, the shared email send budget and
+# 429 back-off, and the conversion/notification locks all coordinate through this cache.
+# Without CACHE_URL every process gets its own LocMemCache and none of that is shared
+# (the Graph backend logs a warning when it sees this).
+CACHE_URL = config('CACHE_URL', default=None)
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
 
 # DATABASES = {
 
@@ -222,6 +243,21 @@ SOCIAL_AUTH_AZUREAD_OAUTH2_ACCESS_TOKEN_URL = (
 LMS_MIN_QUIZ_QUESTIONS = 20
 LMS_QUESTIONS_PER_LESSON = 2
 LMS_MAX_PDF_PAGES = 400
+LMS_COURSE_NOTIFICATION_DEBOUNCE_SECONDS = config('LMS_COURSE_NOTIFICATION_DEBOUNCE_SECONDS', default=10 * 60, cast=int)
+LMS_NOTIFICATION_CHUNK_SIZE = config('LMS_NOTIFICATION_CHUNK_SIZE', default=100, cast=int)
+LMS_OUTBOX_BATCH_SIZE = config('LMS_OUTBOX_BATCH_SIZE', default=50, cast=int)
+# 'weasyprint' lays out the HTML template; 'reportlab' stamps fields onto a pre-drawn background.
+LMS_CERTIFICATE_RENDERER = config('LMS_CERTIFICATE_RENDERER', default='weasyprint')
+LMS_CERTIFICATE_BACKGROUND = config('LMS_CERTIFICATE_BACKGROUND', default='')
+LMS_DOWNLOAD_URL_EXPIRY = config('LMS_DOWNLOAD_URL_EXPIRY', default=5 * 60, cast=int)  # signed blob URL lifetime
+LMS_MEDIA_URL_EXPIRY = config('LMS_MEDIA_URL_EXPIRY', default=6 * 60 * 60, cast=int)  # video/audio: longer than any recording
+LMS_DOWNLOAD_MAX_AGE = config('LMS_DOWNLOAD_MAX_AGE', default=60 * 60, cast=int)
+# Office -> PDF conversion runs on the 'conversions' queue; each worker process keeps one warm LibreOffice:
+#   celery -A LMS worker -Q conversions --concurrency=2 --max-tasks-per-child=500
+LMS_LIBREOFFICE_WARM_WORKERS = config('LMS_LIBREOFFICE_WARM_WORKERS', default=True, cast=bool)
+LMS_LIBREOFFICE_MAX_JOBS = config('LMS_LIBREOFFICE_MAX_JOBS', default=200, cast=int)  # recycle the office after this many
+LMS_CONVERSION_TIMEOUT = config('LMS_CONVERSION_TIMEOUT', default=120, cast=int)
+LMS_CONVERSION_RETRY_AFTER = config('LMS_CONVERSION_RETRY_AFTER', default=60 * 60, cast=int)  # seconds before a failed conversion is retried
 
 MAX_UPLOAD_SIZE = 100 * 1024 * 1024  # 100MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = MAX_UPLOAD_SIZE
@@ -245,6 +281,14 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 USE_X_FORWARDED_HOST = True
     
 EMAIL_BACKEND = 'LMS.graph_email_backend.GraphEmailBackend'
+GRAPH_API_BASE_URL = config('GRAPH_API_BASE_URL', default='https://graph.microsoft.com/v1.0')
+GRAPH_EMAIL_MAX_WORKERS = config('GRAPH_EMAIL_MAX_WORKERS', default=4, cast=int)  # Graph allows 4 concurrent requests per mailbox
+GRAPH_EMAIL_USE_BATCH = config('GRAPH_EMAIL_USE_BATCH', default=True, cast=bool)
+GRAPH_EMAIL_TIMEOUT = config('GRAPH_EMAIL_TIMEOUT', default=30, cast=int)
+GRAPH_TOKEN_REFRESH_MARGIN = config('GRAPH_TOKEN_REFRESH_MARGIN', default=5 * 60, cast=int)
+GRAPH_EMAIL_RATE_PER_MINUTE = config('GRAPH_EMAIL_RATE_PER_MINUTE', default=30, cast=int)  # Exchange Online per-mailbox limit; 0 disables
+GRAPH_THROTTLE_MAX_WAIT = config('GRAPH_THROTTLE_MAX_WAIT', default=30, cast=int)
+GRAPH_THROTTLE_MAX_RETRIES = config('GRAPH_THROTTLE_MAX_RETRIES', default=2, cast=int)
 
 USE_AZURE_STORAGE = config("USE_AZURE_STORAGE", default=not DEBUG, cast=bool)
 
@@ -303,6 +347,10 @@ CELERY_TIMEZONE = TIME_ZONE
 CELERY_TASK_TIME_LIMIT = 30 * 60 
 CELERY_TASK_SOFT_TIME_LIMIT = 25 * 60
 
+CELERY_TASK_ROUTES = {
+    'lmsApp.tasks.convert_content_document': {'queue': 'conversions'},
+}
+
 DATA_UPLOAD_MAX_MEMORY_SIZE = 524288000   # 500 MB
 FILE_UPLOAD_MAX_MEMORY_SIZE = 524288000   # 500 MB
 
@@ -328,6 +376,28 @@ CELERY_BEAT_SCHEDULE = {
     'schedule': crontab(hour=3, minute=0),  # off-peak
     'kwargs': {'products': ['azure', 'm365', 'security', 'entra'], 'roles': ['administrator']},
     },
+    'dispatch-pending-completion-events': {
+        'task': 'lmsApp.tasks.dispatch_pending_completion_events',
+        'schedule': crontab(minute='*/10'),
+    },
+    'dispatch-pending-certificates': {
+        'task': 'lmsApp.tasks.dispatch_pending_certificates',
+        'schedule': crontab(minute='*/10'),
+    },
+    'send-daily-notification-digests': {
+        'task': 'lmsApp.tasks.send_notification_digests',
+        'schedule': crontab(hour=7, minute=30),
+        'args': ('daily',),
+    },
+    'send-weekly-notification-digests': {
+        'task': 'lmsApp.tasks.send_notification_digests',
+        'schedule': crontab(hour=7, minute=30, day_of_week='mon'),
+        'args': ('weekly',),
+    },
+    'deliver-outbound-emails': {
+        'task': 'lmsApp.tasks.deliver_outbound_emails',
+        'schedule': crontab(),  # every minute; picks up retries whose backoff has elapsed
+    },
 
 }
 
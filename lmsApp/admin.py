@@ -3,10 +3,12 @@ from django.contrib.auth.admin import UserAdmin
 from django.contrib import messages
 from .models import *
 from django.db.models import Count
+from django.utils import timezone
 from django_ckeditor_5.widgets import CKEditor5Widget
 from django import forms
 from urllib.parse import urlencode
 from django.shortcuts import redirect
+from .batching import defer_course_updates
 
 
 # ==========================
@@ -62,6 +64,7 @@ class CustomUserAdmin(UserAdmin):
                     "first_name",
                     "last_name",
                     "department",
+                    "notification_frequency",
                 )
             },
         ),
@@ -184,6 +187,11 @@ class ModuleAdmin(admin.ModelAdmin):
     has_knowledge_check.boolean = True
     has_knowledge_check.short_description = "Knowledge Check?"
 
+    def save_related(self, request, form, formsets, change):
+        # Recompute course duration/progress once for the whole inline formset.
+        with defer_course_updates():
+            super().save_related(request, form, formsets, change)
+
 
 class ContentInline(admin.StackedInline):
     model = Content
@@ -199,6 +207,11 @@ class LessonAdmin(admin.ModelAdmin):
     search_fields = ('title', 'description', 'module__title', 'module__course__title')
     inlines = [ContentInline]
 
+    def save_related(self, request, form, formsets, change):
+        # Recompute course duration/progress once for the whole inline formset.
+        with defer_course_updates():
+            super().save_related(request, form, formsets, change)
+
 
 @admin.register(Enrollment)
 class EnrollmentAdmin(admin.ModelAdmin):
@@ -207,6 +220,7 @@ class EnrollmentAdmin(admin.ModelAdmin):
     list_filter = ('completed', 'assignment_reason', 'course', 'student')
     search_fields = ('student__email', 'student__first_name', 'student__last_name', 'course__title')
     raw_id_fields = ('student', 'course', 'assigned_by')
+    readonly_fields = ('completed_content_count', 'total_content_count', 'final_quiz_passed', 'last_activity_at')
 
 
 @admin.register(StudentContentProgress)
@@ -238,8 +252,9 @@ class StudentAnswerAdmin(admin.ModelAdmin):
 
 @admin.register(Certificate)
 class CertificateAdmin(admin.ModelAdmin):
-    list_display = ('student', 'course', 'issue_date', 'certificate_id')
-    list_filter = ('course', 'student')
+    list_display = ('student', 'course', 'issue_date', 'status', 'certificate_id')
+    list_filter = ('status', 'course', 'student')
+    readonly_fields = ('generation_error', 'status_updated_at')
     search_fields = ('student__email', 'student__first_name', 'student__last_name', 'course__title', 'certificate_id')
     raw_id_fields = ('student', 'course')
 
@@ -498,4 +513,60 @@ class EmployeeCompetencyAdmin(admin.ModelAdmin):
         return False
  
     def has_change_permission(self, request, obj=None):
-        return False
\ No newline at end of file
+        return False
+
+
+@admin.register(CourseCompletionEvent)
+class CourseCompletionEventAdmin(admin.ModelAdmin):
+    list_display = ('enrollment', 'status', 'attempts', 'created_at', 'processed_at')
+    list_filter = ('status',)
+    search_fields = ('enrollment__student__email', 'enrollment__course__title')
+    raw_id_fields = ('enrollment',)
+    readonly_fields = ('attempts', 'error_message', 'created_at', 'processed_at')
+
+
+@admin.register(OutboundEmail)
+class OutboundEmailAdmin(admin.ModelAdmin):
+    list_display = ('subject', 'template_name', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at')
+    list_filter = ('status', 'template_name')
+    search_fields = ('subject', 'recipients')
+    readonly_fields = ('template_name', 'recipients', 'html_body', 'attachments', 'attempts',
+                       'locked_at', 'last_error', 'created_at', 'sent_at')
+    actions = ['requeue_emails']
+
+    @admin.action(description="Re-queue selected emails for delivery")
+    def requeue_emails(self, request, queryset):
+        updated = queryset.exclude(status='sent').update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), locked_at=None
+        )
+        self.message_user(request, f"{updated} email(s) re-queued.", level=messages.SUCCESS)
+
+
+@admin.register(PendingNotification)
+class PendingNotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'subject', 'created_at', 'digested_at')
+    list_filter = ('kind', 'digested_at')
+    search_fields = ('user__email', 'subject')
+    raw_id_fields = ('user',)
+
+
+@admin.register(Notification)
+class NotificationAdmin(admin.ModelAdmin):
+    list_display = ('user', 'kind', 'title', 'is_read', 'created_at')
+    list_filter = ('kind', 'is_read')
+    search_fields = ('user__email', 'title')
+    raw_id_fields = ('user',)
+
+
+@admin.register(ConvertedDocument)
+class ConvertedDocumentAdmin(admin.ModelAdmin):
+    list_display = ('source_hash', 'status', 'pdf_file', 'created_at', 'updated_at')
+    list_filter = ('status',)
+    search_fields = ('source_hash',)
+    readonly_fields = ('source_hash', 'error', 'created_at', 'updated_at')
+    actions = ['retry_conversion']
+
+    @admin.action(description="Allow failed conversions to be retried")
+    def retry_conversion(self, request, queryset):
+        updated = queryset.filter(status='failed').update(status='pending', error=None)
+        self.message_user(request, f"{updated} conversion(s) reset; they are retried on the next view.", level=messages.SUCCESS)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+import threading
+from contextlib import contextmanager
+
+from django.db import transaction
+
+_state = threading.local()
+
+
+def course_updates_deferred() -> bool:
+    return getattr(_state, 'depth', 0) > 0
+
+
+def mark_course_dirty(course_id) -> bool:
+    """
+    Records that a course's derived fields need recomputing. Returns True when a
+    defer_course_updates() block is collecting marks, so the caller can skip its
+    own immediate recompute; False means the caller should do the work itself.
+    """
+    if not course_updates_deferred():
+        return False
+    if course_id:
+        _state.course_ids.add(course_id)
+    return True
+
+
+def mark_lesson_dirty(lesson_id) -> bool:
+    """Same as mark_course_dirty, resolved to the owning course at flush time."""
+    if not course_updates_deferred():
+        return False
+    if lesson_id:
+        _state.lesson_ids.add(lesson_id)
+    return True
+
+
+def _flush_dirty_courses(course_ids, lesson_ids):
+    from .course_structure import bump_course_structure_version
+    from .models import Course, Lesson
+
+    course_ids = set(course_ids)
+    if lesson_ids:
+        course_ids.update(
+            Lesson.objects.filter(id__in=lesson_ids).values_list('module__course_id', flat=True)
+        )
+
+    for course in Course.objects.filter(id__in=course_ids):
+        course.update_duration()
+        course.refresh_enrollment_progress()
+        bump_course_structure_version(course.id)
+
+
+@contextmanager
+def defer_course_updates():
+    """
+    Collects "course X is dirty" marks from Content/Lesson/Module/Quiz writes and
+    recomputes duration, enrollment progress counters and the structure cache
+    version once per course when the surrounding transaction commits.
+    Nested blocks fold into the outermost one; nothing is flushed on error.
+    """
+    if course_updates_deferred():
+        _state.depth += 1
+        try:
+            yield
+        finally:
+            _state.depth -= 1
+        return
+
+    _state.depth = 1
+    _state.course_ids = set()
+    _state.lesson_ids = set()
+    try:
+        yield
+    except BaseException:
+        _state.depth = 0
+        raise
+    else:
+        _state.depth = 0
+        course_ids, lesson_ids = _state.course_ids, _state.lesson_ids
+        if course_ids or lesson_ids:
+            transaction.on_commit(lambda: _flush_dirty_courses(course_ids, lesson_ids))
@@ -0,0 +1,339 @@
+from __future__ import annotations
+import abc
+import mimetypes
+import re
+import threading
+from io import BytesIO
+from urllib.parse import urlparse
+
+from django.conf import settings
+from django.contrib.staticfiles import finders
+from django.core.files.base import ContentFile
+from django.template.loader import get_template
+from django.urls import reverse
+from django.utils import dateformat, timezone
+
+try:
+    import weasyprint
+    from weasyprint.text.fonts import FontConfiguration
+    WEASYPRINT_AVAILABLE = True
+except (ImportError, OSError):
+    WEASYPRINT_AVAILABLE = False
+
+try:
+    from pypdf import PdfReader, PdfWriter
+    from reportlab.lib.colors import Color, HexColor
+    from reportlab.lib.pagesizes import A4, landscape
+    from reportlab.lib.units import mm
+    from reportlab.lib.utils import ImageReader
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+    REPORTLAB_AVAILABLE = True
+except ImportError:
+    REPORTLAB_AVAILABLE = False
+
+
+CERTIFICATE_TEMPLATE = 'student/certificate_template.html'
+
+
+def certificate_context(certificate, domain, protocol):
+    student = certificate.student
+    instructor = certificate.course.instructor
+    return {
+        'certificate': certificate,
+        'student_name': student.get_full_name() or student.email,
+        'course_title': certificate.course.title,
+        'instructor_name': instructor.get_full_name() or instructor.email,
+        'issue_date': certificate.issue_date,
+        'certificate_id': certificate.certificate_id,
+        'protocol': protocol,
+        'domain': domain,
+        'current_year': timezone.now().year,
+    }
+
+
+def certificate_file_name(certificate):
+    safe_course_title = re.sub(r'[^A-Za-z0-9_-]', '_', certificate.course.title)
+    return f"{safe_course_title}.pdf"
+
+
+def certificate_url(certificate, domain, protocol):
+    return f"{protocol}://{domain}{reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id})}"
+
+
+def find_static_file(url):
+    """Maps a /static/... (or STATIC_URL-prefixed) URL to a local file path, or None."""
+    path = urlparse(url).path
+    static_path = urlparse(settings.STATIC_URL).path
+    if not path.startswith(static_path):
+        return None
+    return finders.find(path[len(static_path):])
+
+
+class CertificateRenderer(abc.ABC):
+    """
+    Renders one Certificate to PDF bytes. Instances are long-lived (one per
+    worker process, see get_certificate_renderer) so subclasses can keep
+    parsed assets warm between renders.
+    """
+    name = ''
+
+    @classmethod
+    def available(cls) -> bool:
+        return False
+
+    @abc.abstractmethod
+    def render(self, certificate, domain, protocol) -> bytes:
+        ...
+
+
+class WeasyPrintCertificateRenderer(CertificateRenderer):
+    """
+    Lays out certificate_template.html with WeasyPrint. Static assets are read
+    from local files instead of fetched over HTTP, remote web fonts and their
+    stylesheets are fetched once per process, and the font configuration is
+    reused across renders. Any other remote URL is fetched on every render, so
+    the cache only ever holds the template's own static and font assets.
+    """
+    name = 'weasyprint'
+
+    def __init__(self):
+        self._template = get_template(CERTIFICATE_TEMPLATE)
+        self._font_config = FontConfiguration()
+        self._resources = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def available(cls):
+        return WEASYPRINT_AVAILABLE
+
+    @staticmethod
+    def _is_font_resource(mime_type):
+        mime_type = mime_type or ''
+        # font/woff2, application/font-woff, application/x-font-ttf, and the @font-face CSS.
+        return 'font' in mime_type or mime_type == 'text/css'
+
+    def _fetch(self, url):
+        with self._lock:
+            resource = self._resources.get(url)
+        if resource is not None:
+            return dict(resource)
+
+        local_path = find_static_file(url)
+        if local_path:
+            with open(local_path, 'rb') as fh:
+                resource = {
+                    'string': fh.read(),
+                    'mime_type': mimetypes.guess_type(local_path)[0],
+                }
+            cacheable = True
+        else:
+            fetched = weasyprint.default_url_fetcher(url)
+            resource = {
+                'string': fetched.get('string') or fetched['file_obj'].read(),
+                'mime_type': fetched.get('mime_type'),
+                'encoding': fetched.get('encoding'),
+                'redirected_url': fetched.get('redirected_url', url),
+            }
+            cacheable = self._is_font_resource(resource['mime_type'])
+
+        if cacheable:
+            with self._lock:
+                self._resources[url] = resource
+        return dict(resource)
+
+    def render(self, certificate, domain, protocol):
+        html_string = self._template.render(certificate_context(certificate, domain, protocol))
+        return weasyprint.HTML(
+            string=html_string,
+            base_url=f"{protocol}://{domain}/",
+            url_fetcher=self._fetch,
+        ).write_pdf(font_config=self._font_config)
+
+
+class ReportLabCertificateRenderer(CertificateRenderer):
+    """
+    Stamps the variable fields (name, course, date, signatures, ID) onto a
+    background page that is drawn once per process. LMS_CERTIFICATE_BACKGROUND
+    may point at a designer-supplied single-page A4 landscape PDF instead.
+    """
+    name = 'reportlab'
+
+    BRAND = '#4338ca'
+    TEXT = '#1a202c'
+    MUTED = '#6b7280'
+
+    def __init__(self):
+        self.page_size = landscape(A4)
+        self.body_font, self.bold_font = self._register_fonts()
+        self._background = self._load_background()
+
+    @classmethod
+    def available(cls):
+        return REPORTLAB_AVAILABLE
+
+    def _register_fonts(self):
+        regular = finders.find('fonts/century_gothic.ttf')
+        bold = finders.find('fonts/century_gothic_bold.ttf')
+        if not (regular and bold):
+            return 'Helvetica', 'Helvetica-Bold'
+        pdfmetrics.registerFont(TTFont('CenturyGothic', regular))
+        pdfmetrics.registerFont(TTFont('CenturyGothic-Bold', bold))
+        return 'CenturyGothic', 'CenturyGothic-Bold'
+
+    def _load_background(self) -> bytes:
+        background_path = getattr(settings, 'LMS_CERTIFICATE_BACKGROUND', '')
+        if background_path:
+            with open(background_path, 'rb') as fh:
+                return fh.read()
+
+        width, height = self.page_size
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pagesize=self.page_size)
+
+        border = 5 * mm
+        c.setStrokeColor(HexColor(self.BRAND))
+        c.setLineWidth(border)
+        c.rect(border / 2, border / 2, width - border, height - border)
+
+        watermark = finders.find('images/Ha-Shem-Blue-Favicon-2.png')
+        if watermark:
+            c.saveState()
+            c.setFillAlpha(0.05)
+            c.translate(width / 2, height / 2)
+            c.rotate(30)
+            size = height * 0.8
+            c.drawImage(ImageReader(watermark), -size / 2, -size / 2, size, size, mask='auto', preserveAspectRatio=True)
+            c.restoreState()
+
+        c.setFillColor(HexColor(self.BRAND))
+        c.setFont(self.bold_font, 44)
+        c.drawCentredString(width / 2, height - 55 * mm, 'Certificate of Completion')
+        c.setFillColor(HexColor(self.MUTED))
+        c.setFont(self.body_font, 16)
+        c.drawCentredString(width / 2, height - 68 * mm, 'This certifies that')
+        c.setFillColor(HexColor('#374151'))
+        c.setFont(self.body_font, 14)
+        c.drawCentredString(width / 2, height - 108 * mm, 'has successfully completed the online course')
+
+        c.setStrokeColor(HexColor('#e5e7eb'))
+        c.setLineWidth(1)
+        c.line(30 * mm, 62 * mm, width - 30 * mm, 62 * mm)
+        c.setStrokeColor(HexColor('#4b5563'))
+        c.setLineWidth(1.2)
+        for centre in (width * 0.3, width * 0.7):
+            c.line(centre - 40 * mm, 42 * mm, centre + 40 * mm, 42 * mm)
+
+        c.setFillColor(HexColor(self.MUTED))
+        c.setFont(self.body_font, 10)
+        c.drawCentredString(width * 0.3, 30 * mm, 'Instructor')
+        c.drawCentredString(width * 0.7, 30 * mm, 'Director of Education')
+        c.setFillColor(HexColor('#1f2937'))
+        c.setFont(self.bold_font, 12)
+        c.drawCentredString(width * 0.7, 36 * mm, 'Ha-Shem LMS')
+
+        c.showPage()
+        c.save()
+        return buffer.getvalue()
+
+    def _fit_font_size(self, text, font, size, max_width, min_size=12):
+        while size > min_size and pdfmetrics.stringWidth(text, font, size) > max_width:
+            size -= 1
+        return size
+
+    def _overlay(self, context) -> bytes:
+        width, height = self.page_size
+        buffer = BytesIO()
+        c = canvas.Canvas(buffer, pagesize=self.page_size)
+
+        student_name = context['student_name']
+        size = self._fit_font_size(student_name, self.bold_font, 36, width - 60 * mm)
+        c.setFillColor(HexColor(self.TEXT))
+        c.setFont(self.bold_font, size)
+        c.drawCentredString(width / 2, height - 90 * mm, student_name)
+
+        course_title = context['course_title']
+        size = self._fit_font_size(course_title, self.bold_font, 18, width - 60 * mm, min_size=10)
+        c.setFillColor(HexColor('#4f46e5'))
+        c.setFont(self.bold_font, size)
+        c.drawCentredString(width / 2, height - 118 * mm, course_title)
+
+        c.setFillColor(HexColor('#374151'))
+        c.setFont(self.body_font, 14)
+        c.drawCentredString(width / 2, height - 128 * mm, f"on {dateformat.format(context['issue_date'], 'F j, Y')}")
+
+        c.setFillColor(HexColor('#1e1b4b'))
+        c.setFont('Times-Italic', 22)
+        c.drawCentredString(width * 0.3, 45 * mm, context['instructor_name'])
+        c.drawCentredString(width * 0.7, 45 * mm, 'Ha-Shem LMS')
+        c.setFillColor(HexColor('#1f2937'))
+        c.setFont(self.bold_font, 12)
+        c.drawCentredString(width * 0.3, 36 * mm, context['instructor_name'])
+
+        c.setFillColor(Color(0.61, 0.64, 0.69))
+        c.setFont(self.body_font, 9)
+        c.drawCentredString(width / 2, 18 * mm, f"Certificate ID: {context['certificate_id']}")
+        verify_url = f"{context['protocol']}://{context['domain']}{reverse('view_certificate', kwargs={'certificate_id': context['certificate_id']})}"
+        c.drawCentredString(width / 2, 13 * mm, f"Verify at: {verify_url}")
+
+        c.showPage()
+        c.save()
+        return buffer.getvalue()
+
+    def render(self, certificate, domain, protocol):
+        overlay = PdfReader(BytesIO(self._overlay(certificate_context(certificate, domain, protocol))))
+        page = PdfReader(BytesIO(self._background)).pages[0]
+        page.merge_page(overlay.pages[0])
+
+        writer = PdfWriter()
+        writer.add_page(page)
+        output = BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+
+CERTIFICATE_RENDERERS = {
+    renderer.name: renderer
+    for renderer in (WeasyPrintCertificateRenderer, ReportLabCertificateRenderer)
+}
+
+_renderers = {}
+_renderers_lock = threading.Lock()
+
+
+def get_certificate_renderer(name=None) -> CertificateRenderer:
+    """
+    Returns this process's renderer for `name` (default LMS_CERTIFICATE_RENDERER),
+    building it on first use so later renders reuse its warm state.
+    """
+    name = name or getattr(settings, 'LMS_CERTIFICATE_RENDERER', 'weasyprint')
+    renderer_class = CERTIFICATE_RENDERERS.get(name)
+    if renderer_class is None:
+        raise ValueError(f"Unknown certificate renderer '{name}'.")
+    if not renderer_class.available():
+        raise RuntimeError(f"Certificate renderer '{name}' is not available in this environment.")
+
+    with _renderers_lock:
+        renderer = _renderers.get(name)
+        if renderer is None:
+            renderer = _renderers[name] = renderer_class()
+    return renderer
+
+
+def certificate_renderer_available(name=None) -> bool:
+    name = name or getattr(settings, 'LMS_CERTIFICATE_RENDERER', 'weasyprint')
+    renderer_class = CERTIFICATE_RENDERERS.get(name)
+    return bool(renderer_class and renderer_class.available())
+
+
+def render_certificate_pdf(certificate, domain, protocol, renderer=None) -> bytes:
+    return (renderer or get_certificate_renderer()).render(certificate, domain, protocol)
+
+
+def store_certificate_pdf(certificate, pdf_bytes):
+    certificate.pdf_file.save(certificate_file_name(certificate), ContentFile(pdf_bytes), save=False)
+    certificate.status = 'ready'
+    certificate.generation_error = None
+    certificate.status_updated_at = timezone.now()
+    certificate.save(update_fields=['pdf_file', 'status', 'generation_error', 'status_updated_at'])
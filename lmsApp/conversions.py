@@ -0,0 +1,483 @@
+from __future__ import annotations
+import atexit
+import hashlib
+import logging
+import glob
+import os
+import pathlib
+import shutil
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import timedelta
+
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.utils import timezone
+
+from .models import Content, ConvertedDocument
+
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    UNO_AVAILABLE = True
+except ImportError:
+    UNO_AVAILABLE = False
+
+logger = logging.getLogger(__name__)
+
+LIBREOFFICE_PATH = (
+    r"C:\Program Files\LibreOffice\program\soffice.exe"
+    if sys.platform.startswith('win')
+    else 'libreoffice'
+)
+LIBREOFFICE_TIMEOUT = getattr(settings, 'LMS_CONVERSION_TIMEOUT', 120)
+LIBREOFFICE_START_TIMEOUT = 30
+# Each warm worker records "<owner pid> <soffice pid>" here, so a later worker
+# can reap an office whose owner was killed before it could stop it.
+LIBREOFFICE_PID_FILE = "lms_lo_profile_{owner_pid}.pid"
+
+CONVERSION_LOCK_KEY = "document_conversion_lock:{source_hash}"
+CONVERSION_LOCK_TIMEOUT = LIBREOFFICE_TIMEOUT + 60
+CONVERSION_DISPATCH_KEY = "document_conversion_dispatched:{source_hash}"
+# Uploads not hashed yet are dispatched per content row: the hash is only known once the worker has read the file.
+CONVERSION_HASH_DISPATCH_KEY = "document_hash_dispatched:{content_id}"
+# A failed conversion is not retried on every view, but is not final either:
+# it is attempted again once this long has passed since it failed.
+CONVERSION_RETRY_AFTER = timedelta(seconds=getattr(settings, 'LMS_CONVERSION_RETRY_AFTER', 60 * 60))
+
+# Content types whose uploads are previewed inline as a converted PDF.
+CONVERTIBLE_CONTENT_TYPES = ('slide', 'document')
+
+PDF_EXPORT_FILTERS = {
+    '.ppt': 'impress_pdf_Export',
+    '.pptx': 'impress_pdf_Export',
+    '.odp': 'impress_pdf_Export',
+    '.doc': 'writer_pdf_Export',
+    '.docx': 'writer_pdf_Export',
+    '.odt': 'writer_pdf_Export',
+    '.rtf': 'writer_pdf_Export',
+    '.xls': 'calc_pdf_Export',
+    '.xlsx': 'calc_pdf_Export',
+    '.ods': 'calc_pdf_Export',
+}
+
+
+def _uno_properties(**values):
+    properties = []
+    for name, value in values.items():
+        prop = PropertyValue()
+        prop.Name, prop.Value = name, value
+        properties.append(prop)
+    return tuple(properties)
+
+
+class LibreOfficeWorker:
+    """
+    One long-lived headless LibreOffice owned by the current process, with its
+    own user profile and UNO pipe so workers never share state. Conversions
+    reuse the running office instead of cold-starting soffice each time; it is
+    recycled after LMS_LIBREOFFICE_MAX_JOBS conversions, after a timed-out job,
+    or whenever the office process dies.
+
+    soffice runs in its own process group (the `libreoffice` launcher forks
+    soffice.bin), and every kill targets the whole group.
+    """
+
+    def __init__(self, max_jobs):
+        self.max_jobs = max_jobs
+        self.pipe_name = f"lms_lo_{os.getpid()}"
+        self.profile_dir = os.path.join(tempfile.gettempdir(), f"lms_lo_profile_{os.getpid()}")
+        self.pid_file = os.path.join(tempfile.gettempdir(), LIBREOFFICE_PID_FILE.format(owner_pid=os.getpid()))
+        self.process = None
+        self.desktop = None
+        self.jobs = 0
+
+    def alive(self):
+        return self.process is not None and self.process.poll() is None
+
+    def start(self):
+        self.process = subprocess.Popen(
+            [
+                LIBREOFFICE_PATH,
+                '--headless', '--invisible', '--nologo', '--norestore', '--nodefault', '--nolockcheck',
+                f"-env:UserInstallation={pathlib.Path(self.profile_dir).as_uri()}",
+                f"--accept=pipe,name={self.pipe_name};urp;StarOffice.ComponentContext",
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            start_new_session=True,
+        )
+        with open(self.pid_file, 'w') as fh:
+            fh.write(f"{os.getpid()} {self.process.pid}")
+
+        local_context = uno.getComponentContext()
+        resolver = local_context.ServiceManager.createInstanceWithContext(
+            'com.sun.star.bridge.UnoUrlResolver', local_context
+        )
+        deadline = time.monotonic() + LIBREOFFICE_START_TIMEOUT
+        while True:
+            try:
+                context = resolver.resolve(f"uno:pipe,name={self.pipe_name};urp;StarOffice.ComponentContext")
+                break
+            except Exception:
+                if self.process.poll() is not None or time.monotonic() > deadline:
+                    self.stop()
+                    raise RuntimeError("LibreOffice worker failed to start.")
+                time.sleep(0.25)
+
+        self.desktop = context.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', context)
+        self.jobs = 0
+        logger.info(f"Started LibreOffice worker (pid {self.process.pid}, pipe {self.pipe_name})")
+
+    def _signal_group(self, sig):
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(self.process.pid, sig)
+            except (ProcessLookupError, PermissionError):
+                pass
+        elif sig == signal.SIGTERM:
+            self.process.terminate()
+        else:
+            self.process.kill()
+
+    def _forget_process(self):
+        self.process = None
+        self.desktop = None
+        try:
+            os.remove(self.pid_file)
+        except OSError:
+            pass
+
+    def stop(self):
+        if self.desktop is not None:
+            try:
+                self.desktop.terminate()
+            except Exception:
+                pass
+        if self.process is not None:
+            self._signal_group(signal.SIGTERM)
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                pass
+            # Also catches soffice.bin children left behind by the launcher.
+            self._signal_group(getattr(signal, 'SIGKILL', signal.SIGTERM))
+        self._forget_process()
+
+    def kill(self):
+        """
+        Kills the office process group without going through UNO. Used when a
+        job has hung or the office has died: the bridge is then unresponsive and
+        desktop.terminate() would block just like the stuck call did.
+        """
+        if self.process is not None:
+            self._signal_group(getattr(signal, 'SIGKILL', signal.SIGTERM))
+            try:
+                self.process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                logger.warning(f"LibreOffice worker (pid {self.process.pid}) did not exit after SIGKILL")
+        self._forget_process()
+
+    def shutdown(self):
+        """Stops the office for good and removes this process's profile."""
+        self.stop()
+        shutil.rmtree(self.profile_dir, ignore_errors=True)
+
+    def _convert(self, input_path, output_path, filter_name):
+        document = self.desktop.loadComponentFromURL(
+            pathlib.Path(input_path).as_uri(), '_blank', 0, _uno_properties(Hidden=True, ReadOnly=True)
+        )
+        if document is None:
+            raise RuntimeError(f"LibreOffice could not open {os.path.basename(input_path)}.")
+        try:
+            document.storeToURL(pathlib.Path(output_path).as_uri(), _uno_properties(FilterName=filter_name))
+        finally:
+            document.close(True)
+
+    def convert(self, input_path, output_path, filter_name, timeout):
+        if not self.alive():
+            self.start()
+
+        errors = []
+
+        def run():
+            try:
+                self._convert(input_path, output_path, filter_name)
+            except Exception as e:
+                errors.append(e)
+
+        job = threading.Thread(target=run, daemon=True)
+        job.start()
+        job.join(timeout)
+        if job.is_alive():
+            # Killing the office unblocks the stuck UNO call; the next job starts a fresh one.
+            self.kill()
+            raise subprocess.TimeoutExpired(LIBREOFFICE_PATH, timeout)
+        if errors:
+            if not self.alive():
+                self.kill()
+            raise errors[0]
+
+        self.jobs += 1
+        if self.jobs >= self.max_jobs:
+            self.stop()
+
+
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def _reap_orphaned_workers():
+    """
+    Kills offices (and removes profiles) left by worker processes that died
+    without stopping them, e.g. a Celery child killed at its hard time_limit.
+    """
+    for pid_file in glob.glob(os.path.join(tempfile.gettempdir(), LIBREOFFICE_PID_FILE.format(owner_pid='*'))):
+        try:
+            with open(pid_file) as fh:
+                owner_pid, office_pid = (int(pid) for pid in fh.read().split())
+        except (OSError, ValueError):
+            continue
+        if owner_pid == os.getpid():
+            continue
+        try:
+            os.kill(owner_pid, 0)
+            continue  # owner still running; it stops its own office
+        except ProcessLookupError:
+            pass
+        except PermissionError:
+            continue
+
+        if hasattr(os, 'killpg'):
+            try:
+                os.killpg(office_pid, signal.SIGKILL)
+            except (ProcessLookupError, PermissionError):
+                pass
+        shutil.rmtree(os.path.join(tempfile.gettempdir(), f"lms_lo_profile_{owner_pid}"), ignore_errors=True)
+        try:
+            os.remove(pid_file)
+        except OSError:
+            pass
+        logger.info(f"Reaped LibreOffice worker (pid {office_pid}) orphaned by process {owner_pid}")
+
+
+def get_libreoffice_worker():
+    global _worker
+    with _worker_lock:
+        if _worker is None:
+            _reap_orphaned_workers()
+            _worker = LibreOfficeWorker(max_jobs=getattr(settings, 'LMS_LIBREOFFICE_MAX_JOBS', 200))
+            # Celery pool children leave through os._exit, which skips atexit;
+            # worker_process_shutdown below covers them.
+            atexit.register(_worker.shutdown)
+    return _worker
+
+
+@worker_process_shutdown.connect
+def stop_libreoffice_worker(**kwargs):
+    """Stops this Celery child's office when it is recycled (--max-tasks-per-child) or shut down."""
+    if _worker is not None:
+        _worker.shutdown()
+
+
+def warm_workers_enabled():
+    return UNO_AVAILABLE and getattr(settings, 'LMS_LIBREOFFICE_WARM_WORKERS', True)
+
+
+def _run_libreoffice(input_path: str, output_dir: str) -> str:
+    """
+    Cold-start fallback when UNO is unavailable: one soffice run per
+    conversion, with a throwaway profile so concurrent runs don't collide.
+    Returns the absolute path of the generated PDF.
+    Raises on any failure.
+    """
+    if sys.platform.startswith('win') and not os.path.exists(LIBREOFFICE_PATH):
+        raise FileNotFoundError(
+            f"LibreOffice not found at: {LIBREOFFICE_PATH}\n"
+            "Download from https://www.libreoffice.org/download/download-libreoffice/"
+        )
+
+    profile_dir = os.path.join(output_dir, 'lo_profile')
+    command = [
+        LIBREOFFICE_PATH,
+        '--headless',
+        f"-env:UserInstallation={pathlib.Path(profile_dir).as_uri()}",
+        '--convert-to', 'pdf',
+        '--outdir', output_dir,
+        input_path,
+    ]
+
+    result = subprocess.run(command, capture_output=True, text=True, timeout=LIBREOFFICE_TIMEOUT)
+
+    if result.returncode != 0:
+        raise RuntimeError(
+            f"LibreOffice exited with code {result.returncode}.\n"
+            f"STDOUT: {result.stdout}\nSTDERR: {result.stderr}"
+        )
+
+    base_name = os.path.basename(input_path).rsplit('.', 1)[0]
+    pdf_path = os.path.join(output_dir, base_name + '.pdf')
+
+    if not os.path.exists(pdf_path):
+        raise FileNotFoundError(
+            f"LibreOffice ran but PDF not found at: {pdf_path}\nSTDOUT: {result.stdout}"
+        )
+
+    return pdf_path
+
+
+def convert_to_pdf(field_file) -> bytes:
+    """
+    Converts an uploaded office document (PPTX, DOCX, XLSX, ...) to PDF bytes.
+    The source is copied to a temp file first, so this works the same for
+    local and Azure storage. Uses this process's warm LibreOffice worker when
+    UNO is available, otherwise a cold soffice run.
+    """
+    extension = os.path.splitext(field_file.name)[1].lower()
+    filter_name = PDF_EXPORT_FILTERS.get(extension)
+    if filter_name is None:
+        raise ValueError(f"Unsupported document type '{extension or field_file.name}'.")
+
+    work_dir = tempfile.mkdtemp()
+    try:
+        source_path = os.path.join(work_dir, f"source{extension}")
+        with field_file.open('rb') as src, open(source_path, 'wb') as dst:
+            shutil.copyfileobj(src, dst)
+
+        if warm_workers_enabled():
+            pdf_path = os.path.join(work_dir, 'source.pdf')
+            get_libreoffice_worker().convert(source_path, pdf_path, filter_name, LIBREOFFICE_TIMEOUT)
+        else:
+            pdf_path = _run_libreoffice(source_path, work_dir)
+        with open(pdf_path, 'rb') as pdf:
+            return pdf.read()
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+def file_sha256(field_file) -> str:
+    digest = hashlib.sha256()
+    with field_file.open('rb') as fh:
+        for chunk in iter(lambda: fh.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def content_file_hash(content) -> str | None:
+    """
+    The sha256 of content.file, computed once per uploaded file name and kept
+    on the row (file_hash / file_hash_name) so views never re-read the file.
+    """
+    if not content.file:
+        return None
+    if content.file_hash and content.file_hash_name == content.file.name:
+        return content.file_hash
+
+    file_hash = file_sha256(content.file)
+    # .update() keeps the Content post_save signals (and their cache bumps) out of it.
+    Content.objects.filter(pk=content.pk).update(file_hash=file_hash, file_hash_name=content.file.name)
+    content.file_hash, content.file_hash_name = file_hash, content.file.name
+    return file_hash
+
+
+def convert_document(source_hash, field_file):
+    """
+    Produces the ConvertedDocument for source_hash unless one is already ready.
+    A cache lock keeps concurrent requests/workers from converting the same
+    file twice; returns None while another process holds it, or on failure.
+    """
+    document = ConvertedDocument.objects.filter(source_hash=source_hash, status='ready').first()
+    if document:
+        return document
+
+    lock_key = CONVERSION_LOCK_KEY.format(source_hash=source_hash)
+    if not cache.add(lock_key, 1, CONVERSION_LOCK_TIMEOUT):
+        return None
+
+    try:
+        document, _ = ConvertedDocument.objects.get_or_create(source_hash=source_hash)
+        if document.status == 'ready':
+            return document
+        try:
+            pdf_bytes = convert_to_pdf(field_file)
+        except Exception as e:
+            logger.exception(f"Document conversion failed for {field_file.name}")
+            document.status = 'failed'
+            document.error = str(e)
+            document.save(update_fields=['status', 'error', 'updated_at'])
+            return None
+
+        document.pdf_file.save(f"{source_hash}.pdf", ContentFile(pdf_bytes), save=False)
+        document.status = 'ready'
+        document.error = None
+        document.save(update_fields=['pdf_file', 'status', 'error', 'updated_at'])
+        logger.info(f"Converted {field_file.name} -> {document.pdf_file.name}")
+        return document
+    finally:
+        cache.delete(lock_key)
+
+
+def conversion_recently_failed(document):
+    """True for a failed ConvertedDocument still inside its CONVERSION_RETRY_AFTER window."""
+    return (
+        document is not None
+        and document.status == 'failed'
+        and document.updated_at > timezone.now() - CONVERSION_RETRY_AFTER
+    )
+
+
+def get_converted_document(content, convert_if_missing=True):
+    """
+    Returns the ready ConvertedDocument for a content's file, or None.
+    With convert_if_missing, a file that has not been converted yet (or whose
+    last failure is older than CONVERSION_RETRY_AFTER) is converted inline
+    under the per-hash lock.
+    """
+    source_hash = content_file_hash(content)
+    if not source_hash:
+        return None
+
+    document = ConvertedDocument.objects.filter(source_hash=source_hash).first()
+    if document and document.status == 'ready':
+        return document
+    if not convert_if_missing or conversion_recently_failed(document):
+        return None
+    return convert_document(source_hash, content.file)
+
+
+def request_converted_document(content):
+    """
+    For web requests, never blocks: returns (status, document) where status is
+    'ready' (document is the ConvertedDocument), 'preparing' or 'failed'.
+    A missing rendition is handed to the 'conversions' Celery queue at most
+    once per CONVERSION_LOCK_TIMEOUT per file, however often the page is
+    loaded or polled while it is being converted. The file itself is never
+    read here: an upload without a current file_hash is hashed by the worker.
+    """
+    from .tasks import convert_content_document
+
+    if not content.file:
+        return 'failed', None
+    if not content.file_hash or content.file_hash_name != content.file.name:
+        dispatch_key = CONVERSION_HASH_DISPATCH_KEY.format(content_id=content.pk)
+        if cache.add(dispatch_key, 1, CONVERSION_LOCK_TIMEOUT):
+            convert_content_document.delay(content.pk)
+        return 'preparing', None
+
+    existing = ConvertedDocument.objects.filter(source_hash=content.file_hash).first()
+    if existing and existing.status == 'ready':
+        return 'ready', existing
+    if conversion_recently_failed(existing):
+        return 'failed', None
+
+    converting = cache.get(CONVERSION_LOCK_KEY.format(source_hash=content.file_hash))
+    dispatch_key = CONVERSION_DISPATCH_KEY.format(source_hash=content.file_hash)
+    if not converting and cache.add(dispatch_key, 1, CONVERSION_LOCK_TIMEOUT):
+        convert_content_document.delay(content.pk)
+    return 'preparing', None
@@ -0,0 +1,108 @@
+from __future__ import annotations
+import time
+
+from django.core.cache import cache
+from django.db.models import Prefetch
+
+from .models import Content, Lesson, Module, Quiz
+
+STRUCTURE_VERSION_KEY = "course_structure_version:{course_id}"
+STRUCTURE_KEY = "course_structure:{course_id}:v{version}"
+STRUCTURE_TIMEOUT = 60 * 60 * 24
+
+
+def _new_version():
+    # Millisecond timestamps keep a re-created version key from ever pointing
+    # back at an older cached structure after eviction.
+    return int(time.time() * 1000)
+
+
+def get_course_structure_version(course_id):
+    key = STRUCTURE_VERSION_KEY.format(course_id=course_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, _new_version(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_course_structure_version(course_id):
+    key = STRUCTURE_VERSION_KEY.format(course_id=course_id)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        version = _new_version()
+        cache.set(key, version, None)
+        return version
+
+
+def _serialize_quiz(quiz):
+    if quiz is None:
+        return None
+    return {
+        'id': quiz.id,
+        'title': quiz.title,
+        'pass_percentage': quiz.pass_percentage,
+        'max_attempts': quiz.max_attempts,
+    }
+
+
+def _build_course_structure(course_id):
+    modules_queryset = Module.objects.filter(course_id=course_id).select_related('quiz').order_by('order').prefetch_related(
+        Prefetch('lessons', queryset=Lesson.objects.order_by('order').prefetch_related(
+            Prefetch('contents', queryset=Content.objects.order_by('order')),
+        ))
+    )
+
+    modules = []
+    for module in modules_queryset:
+        lessons = []
+        for lesson in module.lessons.all():
+            lessons.append({
+                'id': lesson.id,
+                'title': lesson.title,
+                'description': lesson.description,
+                'order': lesson.order,
+                'contents': [
+                    {
+                        'id': content_item.id,
+                        'title': content_item.title,
+                        'content_type': content_item.content_type,
+                        'get_content_type_display': content_item.get_content_type_display(),
+                        'duration': content_item.duration,
+                    }
+                    for content_item in lesson.contents.all()
+                ],
+            })
+        modules.append({
+            'id': module.id,
+            'title': module.title,
+            'description': module.description,
+            'order': module.order,
+            'quiz': _serialize_quiz(getattr(module, 'quiz', None)),
+            'lessons': lessons,
+        })
+
+    final_quiz = Quiz.objects.filter(course_id=course_id, quiz_type='final').first()
+    return {
+        'course_id': course_id,
+        'final_quiz': _serialize_quiz(final_quiz),
+        'modules': modules,
+    }
+
+
+def get_course_structure(course):
+    """
+    Returns the serialized, ordered Module -> Lesson -> Content outline of a course.
+    Cached under a per-course version that signals bump on any structural change,
+    so readers never have to invalidate anything themselves.
+    """
+    course_id = getattr(course, 'pk', course)
+    version = get_course_structure_version(course_id)
+    key = STRUCTURE_KEY.format(course_id=course_id, version=version)
+
+    structure = cache.get(key)
+    if structure is None:
+        structure = _build_course_structure(course_id)
+        cache.set(key, structure, STRUCTURE_TIMEOUT)
+    return structure
@@ -0,0 +1,88 @@
+from __future__ import annotations
+import hashlib
+import mimetypes
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, Http404, HttpResponseRedirect
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+
+
+def _use_signed_redirects():
+    return getattr(settings, 'USE_AZURE_STORAGE', False) and not settings.DEBUG
+
+
+def _etag(storage, name):
+    """
+    Stored files are never overwritten in place (new uploads and regenerated
+    PDFs get a new name), so the name alone identifies the content on Azure.
+    Locally the size and mtime are folded in for files replaced by hand.
+    """
+    fingerprint = name
+    if not _use_signed_redirects():
+        try:
+            stat = os.stat(storage.path(name))
+            fingerprint = f"{name}:{stat.st_size}:{int(stat.st_mtime)}"
+        except (NotImplementedError, OSError):
+            pass
+    return f'"{hashlib.sha1(fingerprint.encode()).hexdigest()}"'
+
+
+def serve_stored_file(request, name, storage=None, filename=None, as_attachment=False, content_type=None):
+    """
+    Serves a file from storage without buffering it in the app server.
+
+    - Azure: redirects to a short-lived signed blob URL (LMS_DOWNLOAD_URL_EXPIRY seconds)
+      that carries the download filename and content type. Video and audio get
+      LMS_MEDIA_URL_EXPIRY instead: the player keeps issuing range requests against
+      the same URL for as long as it plays, so it must outlive the longest recording.
+    - Local: streams the file through FileResponse.
+
+    Both carry an ETag and a private Cache-Control, so a repeat request with
+    If-None-Match gets a 304 without touching storage.
+    """
+    storage = storage or default_storage
+    if not name:
+        raise Http404("No file attached.")
+
+    filename = filename or os.path.basename(name)
+    content_type = content_type or mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    etag = _etag(storage, name)
+
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        return not_modified
+
+    if _use_signed_redirects():
+        if content_type.startswith(('video/', 'audio/')):
+            expiry = getattr(settings, 'LMS_MEDIA_URL_EXPIRY', 6 * 60 * 60)
+        else:
+            expiry = getattr(settings, 'LMS_DOWNLOAD_URL_EXPIRY', 5 * 60)
+        signed_url = storage.url(name, expire=expiry, parameters={
+            'content_disposition': content_disposition_header(as_attachment, filename),
+            'content_type': content_type,
+        })
+        response = HttpResponseRedirect(signed_url)
+        # Never let a cached redirect outlive its signature.
+        patch_cache_control(response, private=True, max_age=expiry // 2)
+    else:
+        try:
+            file_handle = storage.open(name, 'rb')
+        except FileNotFoundError:
+            raise Http404("File not found.")
+        response = FileResponse(
+            file_handle, as_attachment=as_attachment, filename=filename, content_type=content_type
+        )
+        patch_cache_control(response, private=True, max_age=getattr(settings, 'LMS_DOWNLOAD_MAX_AGE', 60 * 60))
+
+    response['ETag'] = etag
+    return response
+
+
+def serve_field_file(request, field_file, **kwargs):
+    """serve_stored_file for a FieldFile (e.g. content.file, certificate.pdf_file)."""
+    if not field_file:
+        raise Http404("No file attached.")
+    return serve_stored_file(request, field_file.name, storage=field_file.storage, **kwargs)
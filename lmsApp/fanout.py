@@ -0,0 +1,47 @@
+from __future__ import annotations
+import uuid
+
+from celery import chord, group
+from django.conf import settings
+
+from .models import BulkEmailDelivery
+
+
+def new_campaign_id(prefix, *parts):
+    """A unique key for one fan-out run, e.g. "bulk_assignment:12:3f9c0a1b2d4e"."""
+    return ":".join([prefix, *(str(part) for part in parts), uuid.uuid4().hex[:12]])
+
+
+def fan_out(task, campaign, recipients, *args, callback=None, chunk_size=None):
+    """
+    Splits recipients into fixed-size chunks and runs task.s(campaign, chunk, *args)
+    for each one as a Celery group, or as a chord when a callback signature is
+    given, so the chunks run in parallel across workers.
+    """
+    recipients = list(recipients)
+    chunk_size = chunk_size or getattr(settings, 'LMS_NOTIFICATION_CHUNK_SIZE', 100)
+    signatures = [
+        task.s(campaign, recipients[start:start + chunk_size], *args)
+        for start in range(0, len(recipients), chunk_size)
+    ]
+    if not signatures:
+        return None
+    if callback is not None:
+        return chord(signatures)(callback)
+    return group(signatures).apply_async()
+
+
+def pending_recipients(campaign, recipients):
+    """The recipients this campaign has not delivered to yet."""
+    delivered = set(
+        BulkEmailDelivery.objects.filter(campaign=campaign, recipient__in=[str(r) for r in recipients])
+        .values_list('recipient', flat=True)
+    )
+    return [r for r in recipients if str(r) not in delivered]
+
+
+def record_delivered(campaign, recipients):
+    BulkEmailDelivery.objects.bulk_create(
+        [BulkEmailDelivery(campaign=campaign, recipient=str(r)) for r in recipients],
+        ignore_conflicts=True,
+    )
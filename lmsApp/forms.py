@@ -1,3 +1,4 @@
+import os
 from django import forms
 from django.contrib.auth.forms import UserChangeForm
 from crispy_forms.helper import FormHelper
@@ -7,6 +8,12 @@ from django.forms import inlineformset_factory, BaseInlineFormSet, widgets, Inte
 from django_ckeditor_5.widgets import CKEditor5Widget
 from django.core.validators import FileExtensionValidator
 
+# Uploads previewed through the LibreOffice conversion workers.
+CONVERTIBLE_EXTENSIONS = {
+    'slide': ('.ppt', '.pptx', '.odp'),
+    'document': ('.doc', '.docx', '.odt', '.rtf', '.xls', '.xlsx', '.ods'),
+}
+
 INTEGER_WIDGET = widgets.NumberInput(attrs={'class': 'w-full p-2 border rounded shadow-sm', 'min': 1, 'max': 365})
 
 class InstructorCreationForm(forms.ModelForm):
@@ -157,6 +164,17 @@ class ContentForm(forms.ModelForm):
             Submit('submit', 'Save Content', css_class='w-full bg-indigo-600 text-white py-2 px-4 rounded-md hover:bg-indigo-700 focus:outline-none focus:ring-2 focus:ring-offset-2 focus:ring-indigo-500 mt-4')
         )
 
+    def clean(self):
+        cleaned_data = super().clean()
+        content_type = cleaned_data.get('content_type')
+        uploaded = cleaned_data.get('file')
+        allowed = CONVERTIBLE_EXTENSIONS.get(content_type)
+        if allowed and uploaded:
+            extension = os.path.splitext(uploaded.name)[1].lower()
+            if extension not in allowed:
+                self.add_error('file', f"Upload one of: {', '.join(allowed)}.")
+        return cleaned_data
+
 
 class QuizDetailsForm(forms.ModelForm):
     allow_multiple_correct = forms.BooleanField(
@@ -587,9 +605,29 @@ class PreferenceForm(forms.ModelForm):
         label="Select Your Department"
     )
 
+    notification_frequency = forms.ChoiceField(
+        choices=User.NOTIFICATION_FREQUENCY_CHOICES,
+        initial='immediate',
+        widget=forms.Select(attrs={'class': 'w-full p-3 border border-gray-300 rounded-md focus:ring-indigo-500 focus:border-indigo-500 shadow-sm'}),
+        label="Email Notifications",
+        help_text="Get course alerts, assignments and reminders as they happen, or bundled into one digest email."
+    )
+
+    class Meta:
+        model = User
+        fields = ['department', 'notification_frequency']
+
+
+class NotificationPreferenceForm(forms.ModelForm):
+    notification_frequency = forms.ChoiceField(
+        choices=User.NOTIFICATION_FREQUENCY_CHOICES,
+        widget=forms.RadioSelect,
+        label="How should we email you about course alerts, assignments and reminders?"
+    )
+
     class Meta:
         model = User
-        fields = ['department']
+        fields = ['notification_frequency']
 
 
 class CourseEvaluationForm(forms.ModelForm):
@@ -0,0 +1,86 @@
+import time
+
+from django.contrib.sites.models import Site
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from lmsApp.certificates import CERTIFICATE_RENDERERS, get_certificate_renderer
+from lmsApp.models import Certificate, Course, User
+
+
+class Command(BaseCommand):
+    help = "Measure renders per second for each certificate rendering backend."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--renderer",
+            action="append",
+            choices=sorted(CERTIFICATE_RENDERERS),
+            help="Backend to benchmark; repeat for several (default: all available).",
+        )
+        parser.add_argument(
+            "--count",
+            type=int,
+            default=50,
+            help="Number of warm renders per backend (default: 50).",
+        )
+        parser.add_argument(
+            "--certificate",
+            type=str,
+            help="certificate_id of an existing certificate to render (default: the latest one).",
+        )
+
+    def _sample_certificate(self, certificate_id):
+        certificates = Certificate.objects.select_related("student", "course__instructor")
+        if certificate_id:
+            certificate = certificates.filter(certificate_id=certificate_id).first()
+            if not certificate:
+                raise CommandError(f"No certificate found with id '{certificate_id}'.")
+            return certificate
+
+        certificate = certificates.order_by("-issue_date").first()
+        if certificate:
+            return certificate
+
+        # Nothing issued yet: build an unsaved one from existing rows.
+        course = Course.objects.select_related("instructor").exclude(instructor=None).first()
+        student = User.objects.filter(is_student=True).first()
+        if not (course and student):
+            raise CommandError("Need at least one course with an instructor and one student to benchmark.")
+        return Certificate(student=student, course=course, issue_date=timezone.localdate())
+
+    def handle(self, *args, **options):
+        if options["count"] < 1:
+            raise CommandError("--count must be at least 1.")
+
+        certificate = self._sample_certificate(options["certificate"])
+        domain = Site.objects.get_current().domain
+        protocol = "https"
+
+        names = options["renderer"] or [
+            name for name, renderer_class in CERTIFICATE_RENDERERS.items() if renderer_class.available()
+        ]
+        if not names:
+            raise CommandError("No certificate renderer is available in this environment.")
+
+        for name in names:
+            try:
+                start = time.perf_counter()
+                renderer = get_certificate_renderer(name)
+                pdf = renderer.render(certificate, domain, protocol)
+                cold = time.perf_counter() - start
+            except Exception as e:
+                self.stderr.write(self.style.ERROR(f"{name}: failed ({e})"))
+                continue
+
+            start = time.perf_counter()
+            for _ in range(options["count"]):
+                renderer.render(certificate, domain, protocol)
+            elapsed = time.perf_counter() - start
+
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"{name}: {options['count'] / elapsed:.1f} renders/s warm "
+                    f"({elapsed / options['count'] * 1000:.1f} ms each), "
+                    f"first render {cold * 1000:.0f} ms, {len(pdf) / 1024:.0f} KB"
+                )
+            )
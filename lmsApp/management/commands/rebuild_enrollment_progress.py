@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from lmsApp.models import Course
+
+
+class Command(BaseCommand):
+    help = "Rebuild the stored per-enrollment progress counters from content progress and quiz attempts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--course",
+            type=str,
+            help="Only rebuild enrollments for the course with this slug.",
+        )
+        parser.add_argument(
+            "--sync-completion",
+            action="store_true",
+            help="Also re-derive each enrollment's completed flag with a full walk of the course tree.",
+        )
+
+    def handle(self, *args, **options):
+        courses = Course.objects.all()
+        if options["course"]:
+            courses = courses.filter(slug=options["course"])
+            if not courses.exists():
+                raise CommandError(f"No course found with slug '{options['course']}'.")
+
+        total_updated = 0
+        for course in courses.iterator():
+            updated = course.refresh_enrollment_progress()
+            total_updated += updated
+            if updated:
+                self.stdout.write(f"{course.title}: {updated} enrollment(s) updated")
+
+            if options["sync_completion"]:
+                for enrollment in course.enrollments.select_related("student", "course").iterator():
+                    enrollment.recompute_completion_status()
+
+        self.stdout.write(
+            self.style.SUCCESS(f"Progress rebuild finished. {total_updated} enrollment(s) updated.")
+        )
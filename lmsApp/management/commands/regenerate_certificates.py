@@ -0,0 +1,234 @@
+import json
+import multiprocessing
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django import db
+from django.conf import settings
+from django.contrib.sites.models import Site
+from django.core.files.base import ContentFile
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from lmsApp.certificates import (
+    CERTIFICATE_RENDERERS, certificate_file_name, get_certificate_renderer,
+)
+from lmsApp.models import Certificate
+
+DEFAULT_STATE_FILE = os.path.join(tempfile.gettempdir(), "lms_certificate_regeneration.json")
+
+
+def _regenerate_chunk(certificate_ids, renderer_name, domain, protocol, upload_workers):
+    """
+    Runs inside a pool worker: renders every certificate in the chunk with this
+    process's warm renderer, uploads the PDFs concurrently and records the new
+    file names in one bulk update. Returns (regenerated_ids, {id: error}).
+    """
+    renderer = get_certificate_renderer(renderer_name)
+    certificates = list(
+        Certificate.objects.select_related("student", "course__instructor")
+        .filter(pk__in=certificate_ids)
+        .order_by("pk")
+    )
+
+    rendered, failures = [], {}
+    for certificate in certificates:
+        try:
+            rendered.append((certificate, renderer.render(certificate, domain, protocol)))
+        except Exception as e:
+            failures[certificate.pk] = f"render: {e}"
+
+    def upload(item):
+        certificate, pdf_bytes = item
+        storage = certificate.pdf_file.storage
+        name = certificate.pdf_file.field.generate_filename(certificate, certificate_file_name(certificate))
+        return storage.save(name, ContentFile(pdf_bytes))
+
+    uploaded, stale_files = [], []
+    with ThreadPoolExecutor(max_workers=upload_workers) as pool:
+        futures = [(certificate, pool.submit(upload, (certificate, pdf))) for certificate, pdf in rendered]
+        for certificate, future in futures:
+            try:
+                new_name = future.result()
+            except Exception as e:
+                failures[certificate.pk] = f"upload: {e}"
+                continue
+            if certificate.pdf_file.name and certificate.pdf_file.name != new_name:
+                stale_files.append((certificate.pdf_file.storage, certificate.pdf_file.name))
+            certificate.pdf_file.name = new_name
+            certificate.status = "ready"
+            certificate.generation_error = None
+            certificate.status_updated_at = timezone.now()
+            uploaded.append(certificate)
+
+    Certificate.objects.bulk_update(
+        uploaded, ["pdf_file", "status", "generation_error", "status_updated_at"]
+    )
+
+    # Old PDFs go only once the rows point at the new ones.
+    for storage, name in stale_files:
+        try:
+            storage.delete(name)
+        except Exception:
+            pass
+
+    return [certificate.pk for certificate in uploaded], failures
+
+
+def _regenerate_chunk_star(args):
+    return _regenerate_chunk(*args)
+
+
+class Command(BaseCommand):
+    help = (
+        "Regenerate Certificate PDFs (e.g. after a template or branding change) across a "
+        "process pool. Progress is checkpointed so an interrupted run can --resume."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--course", action="append", help="Course slug to include; repeat for several.")
+        parser.add_argument("--since", type=date.fromisoformat, help="Only certificates issued on or after YYYY-MM-DD.")
+        parser.add_argument("--until", type=date.fromisoformat, help="Only certificates issued on or before YYYY-MM-DD.")
+        parser.add_argument("--all", action="store_true", help="Regenerate every certificate (required when no filter is given).")
+        parser.add_argument(
+            "--renderer",
+            choices=sorted(CERTIFICATE_RENDERERS),
+            help="Rendering backend (default: LMS_CERTIFICATE_RENDERER).",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=os.cpu_count() or 1,
+            help="Rendering processes (default: CPU count).",
+        )
+        parser.add_argument("--upload-workers", type=int, default=8, help="Concurrent storage uploads per process (default: 8).")
+        parser.add_argument("--chunk-size", type=int, default=50, help="Certificates per pool task (default: 50).")
+        parser.add_argument("--resume", action="store_true", help="Continue from the checkpoint of an interrupted run with the same filters.")
+        parser.add_argument("--state-file", default=DEFAULT_STATE_FILE, help="Where progress is checkpointed.")
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Count matching certificates and estimate the run time from a few sample renders; nothing is saved.",
+        )
+
+    def _filtered_queryset(self, options):
+        if not (options["course"] or options["since"] or options["until"] or options["all"]):
+            raise CommandError("Pass --course, --since/--until, or --all.")
+
+        certificates = Certificate.objects.filter(status__in=["ready", "failed"])
+        if options["course"]:
+            certificates = certificates.filter(course__slug__in=options["course"])
+        if options["since"]:
+            certificates = certificates.filter(issue_date__gte=options["since"])
+        if options["until"]:
+            certificates = certificates.filter(issue_date__lte=options["until"])
+        return certificates
+
+    def _filter_signature(self, options):
+        return {
+            "course": sorted(options["course"] or []),
+            "since": options["since"].isoformat() if options["since"] else None,
+            "until": options["until"].isoformat() if options["until"] else None,
+            "renderer": options["renderer"],
+        }
+
+    def _load_state(self, options):
+        signature = self._filter_signature(options)
+        state = {"filters": signature, "last_id": 0, "regenerated": 0, "failed": {}}
+        if options["resume"] and os.path.exists(options["state_file"]):
+            with open(options["state_file"]) as fh:
+                saved = json.load(fh)
+            if saved.get("filters") != signature:
+                raise CommandError("The checkpoint was written for different filters; rerun without --resume.")
+            state = saved
+        return state
+
+    def _save_state(self, path, state):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as fh:
+            json.dump(state, fh)
+        os.replace(tmp_path, path)
+
+    def _dry_run(self, certificates, renderer_name, domain, protocol, workers):
+        total = certificates.count()
+        sample = list(certificates.select_related("student", "course__instructor").order_by("pk")[:5])
+        if not sample:
+            self.stdout.write("Dry run: no certificates match.")
+            return
+
+        renderer = get_certificate_renderer(renderer_name)
+        renderer.render(sample[0], domain, protocol)  # warm-up, not timed
+        start = time.perf_counter()
+        for certificate in sample:
+            renderer.render(certificate, domain, protocol)
+        per_render = (time.perf_counter() - start) / len(sample)
+
+        estimate = total * per_render / workers
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Dry run: {total} certificate(s) to regenerate, ~{per_render * 1000:.0f} ms per render; "
+                f"estimated {estimate / 60:.1f} min with {workers} worker(s) (uploads excluded)."
+            )
+        )
+
+    def handle(self, *args, **options):
+        if options["workers"] < 1 or options["upload_workers"] < 1 or options["chunk_size"] < 1:
+            raise CommandError("--workers, --upload-workers and --chunk-size must be at least 1.")
+
+        certificates = self._filtered_queryset(options)
+        renderer_name = options["renderer"] or getattr(settings, "LMS_CERTIFICATE_RENDERER", "weasyprint")
+        if not CERTIFICATE_RENDERERS[renderer_name].available():
+            raise CommandError(f"Certificate renderer '{renderer_name}' is not available in this environment.")
+
+        domain = Site.objects.get_current().domain
+        protocol = "http" if settings.DEBUG else "https"
+
+        if options["dry_run"]:
+            self._dry_run(certificates, renderer_name, domain, protocol, options["workers"])
+            return
+
+        state = self._load_state(options)
+        certificate_ids = list(
+            certificates.filter(pk__gt=state["last_id"]).order_by("pk").values_list("pk", flat=True)
+        )
+        if not certificate_ids:
+            self.stdout.write(self.style.SUCCESS("Nothing left to regenerate."))
+            return
+
+        chunk_size = options["chunk_size"]
+        jobs = [
+            (certificate_ids[i:i + chunk_size], renderer_name, domain, protocol, options["upload_workers"])
+            for i in range(0, len(certificate_ids), chunk_size)
+        ]
+        self.stdout.write(
+            f"Regenerating {len(certificate_ids)} certificate(s) in {len(jobs)} chunk(s) "
+            f"with {options['workers']} worker(s)..."
+        )
+
+        # Forked workers must not inherit the parent's open database connections.
+        db.connections.close_all()
+        started = time.perf_counter()
+        with multiprocessing.get_context("fork").Pool(processes=options["workers"]) as pool:
+            # imap keeps results in submission order, so last_id is always a safe resume point.
+            for (chunk_ids, *_), (regenerated, failures) in zip(jobs, pool.imap(_regenerate_chunk_star, jobs)):
+                state["last_id"] = chunk_ids[-1]
+                state["regenerated"] += len(regenerated)
+                state["failed"].update({str(pk): error for pk, error in failures.items()})
+                self._save_state(options["state_file"], state)
+
+                elapsed = time.perf_counter() - started
+                self.stdout.write(
+                    f"  up to #{state['last_id']}: {state['regenerated']} regenerated, "
+                    f"{len(state['failed'])} failed ({elapsed:.0f}s)"
+                )
+
+        for pk, error in state["failed"].items():
+            self.stderr.write(f"Certificate #{pk}: {error}")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Certificate regeneration finished. {state['regenerated']} regenerated, "
+                f"{len(state['failed'])} failed. Checkpoint: {options['state_file']}"
+            )
+        )
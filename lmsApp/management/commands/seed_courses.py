@@ -9,6 +9,7 @@ from lmsApp.models import (
     ExternalTrainingResource,
     InstructorTraining,
 )
+from lmsApp.batching import defer_course_updates
 
 User = get_user_model()
 
@@ -1406,77 +1407,80 @@ class Command(BaseCommand):
                 )
             )
 
-            # ---- Modules ---------------------------------------------------
-            first_module_obj = None
-            for module_index, module_info in enumerate(course_info["modules"], 1):
-                module = Module.objects.create(
-                    course=course,
-                    title=module_info["title"],
-                    description=module_info["description"],
-                    order=module_index,
-                )
-                if module_index == 1:
-                    first_module_obj = module
-                self.stdout.write(f"  Module {module_index}: {module.title}")
-
-                # ---- Lessons -----------------------------------------------
-                for lesson_index, lesson_info in enumerate(module_info["lessons"], 1):
-                    lesson = Lesson.objects.create(
-                        module=module,
-                        title=lesson_info["title"],
-                        description=lesson_info["description"],
-                        order=lesson_index,
+            # Duration, progress counters and the structure cache are
+            # recomputed once for the whole course when the block exits.
+            with defer_course_updates():
+                # ---- Modules ---------------------------------------------------
+                first_module_obj = None
+                for module_index, module_info in enumerate(course_info["modules"], 1):
+                    module = Module.objects.create(
+                        course=course,
+                        title=module_info["title"],
+                        description=module_info["description"],
+                        order=module_index,
                     )
-                    self.stdout.write(f"    Lesson {lesson_index}: {lesson.title}")
+                    if module_index == 1:
+                        first_module_obj = module
+                    self.stdout.write(f"  Module {module_index}: {module.title}")
 
-                    # ---- Content -------------------------------------------
-                    for content_info in lesson_info["content"]:
-                        content_kwargs = {
-                            "lesson": lesson,
-                            "title": content_info["title"],
-                            "content_type": content_info["content_type"],
-                            "order": content_info.get("order", 1),
-                            "duration": content_info.get("duration", 0),
-                        }
-                        if "text_content" in content_info:
-                            content_kwargs["text_content"] = content_info["text_content"]
-                        if "video_url" in content_info:
-                            content_kwargs["video_url"] = content_info["video_url"]
-                        if "file" in content_info:
-                            content_kwargs["file"] = content_info["file"]
-
-                        Content.objects.create(**content_kwargs)
-                        self.stdout.write(
-                            f"      + [{content_info['content_type'].upper()}] {content_info['title']} "
-                            f"({content_info.get('duration', 0)} min)"
+                    # ---- Lessons -----------------------------------------------
+                    for lesson_index, lesson_info in enumerate(module_info["lessons"], 1):
+                        lesson = Lesson.objects.create(
+                            module=module,
+                            title=lesson_info["title"],
+                            description=lesson_info["description"],
+                            order=lesson_index,
                         )
+                        self.stdout.write(f"    Lesson {lesson_index}: {lesson.title}")
 
-            # ---- NEW: Final course quiz -------------------------------------
-            _create_quiz_with_questions(
-                quiz_type='final',
-                title=f"{course.title} Final Assessment",
-                description=f"<p>Final assessment for {course.title}.</p>",
-                pass_percentage=70,
-                max_attempts=3,
-                created_by=instructor_user,
-                question_bank=_final_quiz_question_bank(course.title),
-                course=course,
-            )
-            self.stdout.write(f"  + Final quiz created for '{course.title}'")
+                        # ---- Content -------------------------------------------
+                        for content_info in lesson_info["content"]:
+                            content_kwargs = {
+                                "lesson": lesson,
+                                "title": content_info["title"],
+                                "content_type": content_info["content_type"],
+                                "order": content_info.get("order", 1),
+                                "duration": content_info.get("duration", 0),
+                            }
+                            if "text_content" in content_info:
+                                content_kwargs["text_content"] = content_info["text_content"]
+                            if "video_url" in content_info:
+                                content_kwargs["video_url"] = content_info["video_url"]
+                            if "file" in content_info:
+                                content_kwargs["file"] = content_info["file"]
 
-            # ---- NEW: Module-level knowledge check on the FIRST module ------
-            if first_module_obj:
+                            Content.objects.create(**content_kwargs)
+                            self.stdout.write(
+                                f"      + [{content_info['content_type'].upper()}] {content_info['title']} "
+                                f"({content_info.get('duration', 0)} min)"
+                            )
+
+                # ---- NEW: Final course quiz -------------------------------------
                 _create_quiz_with_questions(
-                    quiz_type='module_check',
-                    title=f"{first_module_obj.title} Knowledge Check",
-                    description=f"<p>Quick knowledge check for {first_module_obj.title}.</p>",
+                    quiz_type='final',
+                    title=f"{course.title} Final Assessment",
+                    description=f"<p>Final assessment for {course.title}.</p>",
                     pass_percentage=70,
                     max_attempts=3,
                     created_by=instructor_user,
-                    question_bank=_module_quiz_question_bank(first_module_obj.title),
-                    module=first_module_obj,
+                    question_bank=_final_quiz_question_bank(course.title),
+                    course=course,
                 )
-                self.stdout.write(f"  + Knowledge check created for module '{first_module_obj.title}'")
+                self.stdout.write(f"  + Final quiz created for '{course.title}'")
+
+                # ---- NEW: Module-level knowledge check on the FIRST module ------
+                if first_module_obj:
+                    _create_quiz_with_questions(
+                        quiz_type='module_check',
+                        title=f"{first_module_obj.title} Knowledge Check",
+                        description=f"<p>Quick knowledge check for {first_module_obj.title}.</p>",
+                        pass_percentage=70,
+                        max_attempts=3,
+                        created_by=instructor_user,
+                        question_bank=_module_quiz_question_bank(first_module_obj.title),
+                        module=first_module_obj,
+                    )
+                    self.stdout.write(f"  + Knowledge check created for module '{first_module_obj.title}'")
 
             self.stdout.write("")  # blank line between courses
 
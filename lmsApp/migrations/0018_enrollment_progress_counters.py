@@ -0,0 +1,33 @@
+# Generated by Django 5.2.4 on 2026-10-17 09:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0017_alter_quiz_description'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='enrollment',
+            name='completed_content_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='final_quiz_passed',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='last_activity_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='enrollment',
+            name='total_content_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 5.2.4 on 2026-10-17 12:05
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0020_outboundemail'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='notification_frequency',
+            field=models.CharField(choices=[('immediate', 'Immediately'), ('daily', 'Daily digest'), ('weekly', 'Weekly digest')], default='immediate', help_text='How course alerts, assignments, reminders and follow-ups are emailed.', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='PendingNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('course_alert', 'Course Alert'), ('assignment', 'Course Assignment'), ('reminder', 'Deadline Reminder'), ('followup', 'Follow-up')], max_length=20)),
+                ('subject', models.CharField(max_length=500)),
+                ('message', models.TextField(blank=True)),
+                ('url', models.URLField(blank=True, max_length=500)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('digested_at', models.DateTimeField(blank=True, null=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='pending_notifications', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['created_at'],
+                'indexes': [models.Index(fields=['digested_at', 'user'], name='pending_notif_digest_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.4 on 2026-10-17 13:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0022_notification'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['completed', 'due_date'], name='enrollment_due_window_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='enrollment',
+            index=models.Index(fields=['completed', 'completed_at'], name='enrollment_done_window_idx'),
+        ),
+    ]
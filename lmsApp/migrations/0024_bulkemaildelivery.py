@@ -0,0 +1,25 @@
+# Generated by Django 5.2.4 on 2026-10-17 13:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0023_enrollment_reminder_window_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BulkEmailDelivery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('campaign', models.CharField(max_length=200)),
+                ('recipient', models.CharField(max_length=255)),
+                ('delivered_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('campaign', 'recipient'), name='unique_bulk_email_delivery')],
+            },
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.4 on 2026-10-17 14:20
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0024_bulkemaildelivery'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='certificate',
+            name='status',
+            field=models.CharField(choices=[('generating', 'Generating'), ('ready', 'Ready'), ('failed', 'Failed')], default='ready', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='generation_error',
+            field=models.TextField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='certificate',
+            name='status_updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2026-10-17 17:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0026_converteddocument_content_file_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='content',
+            name='content_type',
+            field=models.CharField(choices=[('video', 'Video'), ('pdf', 'PDF Document'), ('text', 'Text/Notes'), ('slide', 'Slide Presentation'), ('document', 'Office Document (Word/Excel)'), ('image', 'Image/Diagram (extracted)'), ('diagram', 'Generated Diagram (Mermaid)')], max_length=20),
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.4 on 2026-10-17 19:10
+
+from django.db import migrations
+from django.db.models import Count
+
+
+def backfill_progress_counters(apps, schema_editor):
+    """
+    Fills the counters added in 0018 for enrollments that existed before them,
+    mirroring Course.refresh_enrollment_progress with the historical models.
+    """
+    Course = apps.get_model('lmsApp', 'Course')
+    Content = apps.get_model('lmsApp', 'Content')
+    Enrollment = apps.get_model('lmsApp', 'Enrollment')
+    StudentContentProgress = apps.get_model('lmsApp', 'StudentContentProgress')
+    StudentQuizAttempt = apps.get_model('lmsApp', 'StudentQuizAttempt')
+
+    for course_id in Course.objects.values_list('id', flat=True).iterator():
+        total_contents = Content.objects.filter(lesson__module__course_id=course_id).count()
+        completed_by_student = dict(
+            StudentContentProgress.objects.filter(
+                content__lesson__module__course_id=course_id, completed=True
+            ).values('student_id').annotate(total=Count('id')).values_list('student_id', 'total')
+        )
+        passed_students = set(
+            StudentQuizAttempt.objects.filter(
+                quiz__course_id=course_id, passed=True
+            ).values_list('student_id', flat=True).distinct()
+        )
+
+        changed = []
+        for enrollment in Enrollment.objects.filter(course_id=course_id).only(
+            'id', 'student_id', 'total_content_count', 'completed_content_count', 'final_quiz_passed'
+        ):
+            enrollment.total_content_count = total_contents
+            enrollment.completed_content_count = completed_by_student.get(enrollment.student_id, 0)
+            enrollment.final_quiz_passed = enrollment.student_id in passed_students
+            changed.append(enrollment)
+
+        if changed:
+            Enrollment.objects.bulk_update(
+                changed,
+                ['total_content_count', 'completed_content_count', 'final_quiz_passed'],
+                batch_size=500,
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('lmsApp', '0027_alter_content_content_type'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill_progress_counters, migrations.RunPython.noop),
+    ]
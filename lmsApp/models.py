@@ -4,7 +4,8 @@ from django.utils import timezone
 from django.utils.text import slugify
 import uuid
 from django.urls import reverse
-from django.db.models import Sum
+from django.db.models import Sum, Count, F
+from django.db.models.functions import Greatest
 from django.core.validators import MinValueValidator, MaxValueValidator
 import random
 import string
@@ -14,6 +15,7 @@ from django.db.models import Q
 from datetime import timedelta
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.db import transaction
 
 
 
@@ -80,6 +82,15 @@ class User(AbstractUser):
         help_text=_('Required for staff/admin, optional for others. Can be same as email.'),
     )
     department = models.CharField(max_length=100, blank=True, null=True)
+    NOTIFICATION_FREQUENCY_CHOICES = [
+        ('immediate', 'Immediately'),
+        ('daily', 'Daily digest'),
+        ('weekly', 'Weekly digest'),
+    ]
+    notification_frequency = models.CharField(
+        max_length=20, choices=NOTIFICATION_FREQUENCY_CHOICES, default='immediate',
+        help_text="How course alerts, assignments, reminders and follow-ups are emailed."
+    )
     
     email = models.EmailField(_('email address'), unique=True)
     USERNAME_FIELD = 'email'
@@ -180,6 +191,47 @@ class Course(models.Model):
         self.duration = total_duration
         self.save(update_fields=['duration'])
 
+    def refresh_enrollment_progress(self):
+        """
+        Rebuilds the stored progress counters of every enrollment in this course
+        from the underlying content progress and quiz attempts.
+        """
+        total_contents = Content.objects.filter(lesson__module__course=self).count()
+        completed_by_student = dict(
+            StudentContentProgress.objects.filter(
+                content__lesson__module__course=self, completed=True
+            ).values('student_id').annotate(total=Count('id')).values_list('student_id', 'total')
+        )
+        passed_students = set(
+            StudentQuizAttempt.objects.filter(
+                quiz__course=self, passed=True
+            ).values_list('student_id', flat=True).distinct()
+        )
+
+        changed = []
+        for enrollment in self.enrollments.only(
+            'id', 'student_id', 'total_content_count', 'completed_content_count', 'final_quiz_passed'
+        ):
+            completed_contents = completed_by_student.get(enrollment.student_id, 0)
+            quiz_passed = enrollment.student_id in passed_students
+            if (
+                enrollment.total_content_count != total_contents
+                or enrollment.completed_content_count != completed_contents
+                or enrollment.final_quiz_passed != quiz_passed
+            ):
+                enrollment.total_content_count = total_contents
+                enrollment.completed_content_count = completed_contents
+                enrollment.final_quiz_passed = quiz_passed
+                changed.append(enrollment)
+
+        if changed:
+            Enrollment.objects.bulk_update(
+                changed,
+                ['total_content_count', 'completed_content_count', 'final_quiz_passed'],
+                batch_size=500,
+            )
+        return len(changed)
+
 class Module(models.Model):
     """
     Represents a module or chapter within a course.
@@ -272,6 +324,7 @@ class Content(models.Model):
         ('pdf', 'PDF Document'),
         ('text', 'Text/Notes'),
         ('slide', 'Slide Presentation'),
+        ('document', 'Office Document (Word/Excel)'),
         ('image', 'Image/Diagram (extracted)'),
         ('diagram', 'Generated Diagram (Mermaid)'),
     )
@@ -305,6 +358,9 @@ class Content(models.Model):
         default=0, 
         help_text="Total estimated duration of the content in minutes."
     )
+    # sha256 of `file`, recorded for the file name it was computed from; keys ConvertedDocument.
+    file_hash = models.CharField(max_length=64, blank=True, db_index=True)
+    file_hash_name = models.CharField(max_length=255, blank=True)
 
     def __str__(self):
         return f"{self.lesson.title} - {self.title} ({self.get_content_type_display()})"
@@ -326,15 +382,27 @@ class Content(models.Model):
             completed=True
         ).exists()
     
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-        if self.lesson and self.lesson.module and self.lesson.module.course:
-            self.lesson.module.course.update_duration()
+class ConvertedDocument(models.Model):
+    """
+    The PDF rendition of an uploaded office document (e.g. a slide deck),
+    stored once per source content hash. Every view of the content, and any
+    re-upload of the same file, reuses it.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    source_hash = models.CharField(max_length=64, unique=True)
+    pdf_file = models.FileField(upload_to='converted_pdfs/', blank=True, null=True)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Converted document {self.source_hash[:12]} ({self.status})"
 
-    def delete(self, *args, **kwargs):
-        course = self.lesson.module.course
-        super().delete(*args, **kwargs)
-        course.update_duration()
 
 class Enrollment(models.Model):
     """
@@ -369,9 +437,21 @@ class Enrollment(models.Model):
         max_length=20, choices=ASSIGNMENT_REASON_CHOICES, default='self'
     )
 
+    # Materialized progress, kept in step by StudentContentProgress.save,
+    # StudentQuizAttempt.save and course-structure signals.
+    completed_content_count = models.PositiveIntegerField(default=0)
+    total_content_count = models.PositiveIntegerField(default=0)
+    final_quiz_passed = models.BooleanField(default=False)
+    last_activity_at = models.DateTimeField(null=True, blank=True)
+
     class Meta:
         unique_together = ('student', 'course')
         ordering = ['-enrolled_at']
+        indexes = [
+            # Date-window scans for the reminder rules in lmsApp/reminders.py
+            models.Index(fields=['completed', 'due_date'], name='enrollment_due_window_idx'),
+            models.Index(fields=['completed', 'completed_at'], name='enrollment_done_window_idx'),
+        ]
 
     def __str__(self):
         student_name = self.student.get_full_name() or self.student.email
@@ -386,38 +466,77 @@ class Enrollment(models.Model):
             return None
         return (self.due_date.date() - timezone.now().date()).days
 
+    @property
+    def content_percentage(self):
+        """Share of the course's content completed, from the stored progress counters."""
+        total_contents = self.total_content_count
+        if total_contents == 0:
+            return 0
+        return (min(self.completed_content_count, total_contents) / total_contents) * 100
+
     @property
     def progress_percentage(self):
         """
-        Calculates overall progress percentage.
+        Calculates overall progress percentage from the stored progress counters.
         If course has a quiz: content = 80%, quiz = 20%.
         If no quiz: content = 100%.
         """
-        total_contents = Content.objects.filter(
-            lesson__module__course=self.course
-        ).count()
-
-        if total_contents == 0:
-            content_percentage = 0
-        else:
-            completed_contents = StudentContentProgress.objects.filter(
-                student=self.student,
-                content__lesson__module__course=self.course,
-                completed=True
-            ).count()
-            content_percentage = (completed_contents / total_contents) * 100
+        content_percentage = self.content_percentage
 
         if hasattr(self.course, 'quiz'):
-            has_passed_quiz = StudentQuizAttempt.objects.filter(
-                student=self.student,
-                quiz=self.course.quiz,
-                passed=True
-            ).exists()
-            quiz_percentage = 100 if has_passed_quiz else 0
+            quiz_percentage = 100 if self.final_quiz_passed else 0
             return round((content_percentage * 0.8) + (quiz_percentage * 0.2))
 
         return round(content_percentage)
 
+    def refresh_progress_counters(self, save=True):
+        """
+        Recomputes the stored progress counters for this enrollment from scratch.
+        """
+        self.total_content_count = Content.objects.filter(
+            lesson__module__course_id=self.course_id
+        ).count()
+        self.completed_content_count = StudentContentProgress.objects.filter(
+            student_id=self.student_id,
+            content__lesson__module__course_id=self.course_id,
+            completed=True
+        ).count()
+        self.final_quiz_passed = StudentQuizAttempt.objects.filter(
+            student_id=self.student_id,
+            quiz__course_id=self.course_id,
+            passed=True
+        ).exists()
+        if save and self.pk:
+            self.save(update_fields=['total_content_count', 'completed_content_count', 'final_quiz_passed'])
+
+    def record_content_progress(self, delta):
+        """
+        Applies a +1/-1 change in completed contents to the stored counter and
+        stamps the last activity time.
+        """
+        now = timezone.now()
+        updates = {'last_activity_at': now}
+        if delta > 0:
+            updates['completed_content_count'] = F('completed_content_count') + delta
+        elif delta < 0:
+            updates['completed_content_count'] = Greatest(F('completed_content_count') + delta, 0)
+        Enrollment.objects.filter(pk=self.pk).update(**updates)
+
+        self.last_activity_at = now
+        if delta:
+            # Re-read the counter so concurrent completions can't hide the final flip.
+            self.refresh_from_db(fields=['completed_content_count'])
+
+    def record_quiz_attempt(self, passed):
+        """Records a final-quiz attempt against the stored progress."""
+        now = timezone.now()
+        updates = {'last_activity_at': now}
+        if passed:
+            updates['final_quiz_passed'] = True
+            self.final_quiz_passed = True
+        Enrollment.objects.filter(pk=self.pk).update(**updates)
+        self.last_activity_at = now
+
     @property
     def is_content_completed(self):
         all_modules = self.course.modules.all()
@@ -428,6 +547,11 @@ class Enrollment(models.Model):
                 return False
         return True
 
+    @property
+    def all_content_completed(self):
+        """Same answer as is_content_completed, read from the stored progress counters."""
+        return self.completed_content_count >= self.total_content_count
+
     @property
     def is_quiz_passed(self):
         """
@@ -446,39 +570,90 @@ class Enrollment(models.Model):
 
     def _sync_completion_status(self):
         """
-        Synchronizes the 'completed' status of the enrollment based on
-        content completion (all modules/lessons) and course-level quiz passing status.
+        Incrementally synchronizes the 'completed' status of the enrollment from the
+        stored progress counters. Only writes when the state actually flips.
+        """
+        should_be_completed = (
+            self.all_content_completed
+            and self._is_final_quiz_requirement_met()
+        )
+        self._apply_completion_status(should_be_completed)
+
+    def recompute_completion_status(self):
         """
-        should_be_completed = self.is_content_completed and self.is_quiz_passed
+        Repair path: rebuilds the progress counters from scratch and re-derives
+        the 'completed' status by walking every module, lesson and content.
+        """
+        self.refresh_progress_counters()
+        self._apply_completion_status(self.is_content_completed and self.is_quiz_passed)
+
+    def _is_final_quiz_requirement_met(self):
+        if self.final_quiz_passed:
+            return True
+        return not Quiz.objects.filter(course_id=self.course_id).exists()
 
+    def _apply_completion_status(self, should_be_completed):
         if should_be_completed and not self.completed:
             self.completed = True
             self.completed_at = timezone.now()
-            self.save(update_fields=['completed', 'completed_at'])
-            self._award_competencies()
+            with transaction.atomic():
+                self.save(update_fields=['completed', 'completed_at'])
+                self._record_completion_event()
         elif not should_be_completed and self.completed:
             self.completed = False
             self.completed_at = None
             self.save(update_fields=['completed', 'completed_at'])
 
+    def _record_completion_event(self):
+        """
+        Records the completion durably in the current transaction; competencies and
+        HR notifications are handled by the Celery consumer once it commits.
+        """
+        from .tasks import process_course_completion_event
+
+        event = CourseCompletionEvent.objects.create(enrollment=self)
+        transaction.on_commit(lambda: process_course_completion_event.delay(event.pk))
+        return event
+
     def _award_competencies(self):
-        for course_competency in self.course.course_competencies.select_related('competency'):
-            record, created = EmployeeCompetency.objects.get_or_create(
-                user=self.student,
-                competency=course_competency.competency,
-                defaults={
-                    'proficiency_level': course_competency.proficiency_level,
-                    'source_course': self.course,
-                },
+        course_competencies = list(self.course.course_competencies.all())
+        if not course_competencies:
+            return
+
+        existing = {
+            record.competency_id: record
+            for record in EmployeeCompetency.objects.filter(
+                user_id=self.student_id,
+                competency_id__in=[cc.competency_id for cc in course_competencies],
             )
-            if not created and course_competency.proficiency_level > record.proficiency_level:
+        }
+        now = timezone.now()
+        to_create, to_update = [], []
+        for course_competency in course_competencies:
+            record = existing.get(course_competency.competency_id)
+            if record is None:
+                to_create.append(EmployeeCompetency(
+                    user_id=self.student_id,
+                    competency_id=course_competency.competency_id,
+                    proficiency_level=course_competency.proficiency_level,
+                    source_course_id=self.course_id,
+                ))
+            elif course_competency.proficiency_level > record.proficiency_level:
                 record.proficiency_level = course_competency.proficiency_level
-                record.source_course = self.course
-                record.save(update_fields=['proficiency_level', 'source_course', 'achieved_at'])
+                record.source_course_id = self.course_id
+                record.achieved_at = now
+                to_update.append(record)
+
+        if to_create:
+            EmployeeCompetency.objects.bulk_create(to_create, ignore_conflicts=True)
+        if to_update:
+            EmployeeCompetency.objects.bulk_update(to_update, ['proficiency_level', 'source_course', 'achieved_at'])
 
     def save(self, *args, **kwargs):
         if not self.pk and not self.due_date:
             self.due_date = timezone.now() + timedelta(days=30)
+        if not self.pk:
+            self.refresh_progress_counters(save=False)
         super().save(*args, **kwargs)
 
     @property
@@ -516,20 +691,30 @@ class StudentContentProgress(models.Model):
             self.completed_at = timezone.now()
         elif not self.completed and self.completed_at:
             self.completed_at = None
-        
-        super().save(*args, **kwargs) 
-
-        enrollment = Enrollment.objects.filter(
-            student=self.student,
-            course=self.content.lesson.module.course
-        ).first()
 
-        if enrollment:
-            was_completed = enrollment.completed
-            enrollment._sync_completion_status()
+        with transaction.atomic():
+            if self._state.adding:
+                super().save(*args, **kwargs)
+                delta = int(self.completed)
+            else:
+                # The flip is claimed with a conditional UPDATE, not compared against
+                # the state this instance loaded: of two concurrent saves from stale
+                # copies (double click, two tabs) only one matches and moves the counter.
+                flipped = StudentContentProgress.objects.filter(
+                    pk=self.pk, completed=not self.completed
+                ).update(completed=self.completed, completed_at=self.completed_at)
+                super().save(*args, **kwargs)
+                delta = (1 if self.completed else -1) if flipped else 0
+
+            enrollment = Enrollment.objects.filter(
+                student=self.student,
+                course=self.content.lesson.module.course
+            ).first()
 
-            if not was_completed and enrollment.completed:
-                pass
+            if enrollment:
+                enrollment.record_content_progress(delta)
+                if delta:
+                    enrollment._sync_completion_status()
 
     def __str__(self):
         status = "Completed" if self.completed else "Incomplete"
@@ -656,7 +841,9 @@ class StudentQuizAttempt(models.Model):
                     super().save(update_fields=['enrollment'])
  
         if self.enrollment and self.quiz.quiz_type == 'final':
-            self.enrollment._sync_completion_status()
+            self.enrollment.record_quiz_attempt(self.passed)
+            if self.passed:
+                self.enrollment._sync_completion_status()
 
 
     def __str__(self):
@@ -691,6 +878,14 @@ class Certificate(models.Model):
     issue_date = models.DateField(auto_now_add=True)
     certificate_id = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     pdf_file = models.FileField(upload_to='certificates/', blank=True, null=True)
+    STATUS_CHOICES = [
+        ('generating', 'Generating'),
+        ('ready', 'Ready'),
+        ('failed', 'Failed'),
+    ]
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='ready')
+    generation_error = models.TextField(blank=True, null=True)
+    status_updated_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         unique_together = ('student', 'course')
@@ -1107,4 +1302,195 @@ class EmployeeCompetency(models.Model):
         verbose_name_plural = "Employee Competencies"
  
     def __str__(self):
-        return f"{self.user.get_full_name() or self.user.email} — {self.competency.name} (Level {self.proficiency_level})"
\ No newline at end of file
+        return f"{self.user.get_full_name() or self.user.email} — {self.competency.name} (Level {self.proficiency_level})"
+
+
+class CourseCompletionEvent(models.Model):
+    """
+    A durable "course completed" event, written in the same transaction as the
+    enrollment flip and drained by a Celery consumer (competencies, HR email).
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('processed', 'Processed'),
+        ('failed', 'Failed'),
+    ]
+    enrollment = models.ForeignKey(Enrollment, on_delete=models.CASCADE, related_name='completion_events')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    error_message = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'created_at'], name='completion_event_status_idx')]
+
+    def __str__(self):
+        return f"Completion of {self.enrollment} ({self.get_status_display()})"
+
+    def mark_processed(self):
+        self.status = 'processed'
+        self.processed_at = timezone.now()
+        self.error_message = None
+        self.save(update_fields=['status', 'processed_at', 'error_message'])
+
+    def record_failure(self, error, final=False):
+        self.attempts += 1
+        self.error_message = str(error)[:5000]
+        if final:
+            self.status = 'failed'
+        self.save(update_fields=['attempts', 'error_message', 'status'])
+
+
+class OutboundEmail(models.Model):
+    """
+    Outbox row for a rendered email. Views enqueue these in their own
+    transaction; Celery workers deliver them in batches with retry/backoff
+    and dead-letter them after max_attempts.
+    """
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('sending', 'Sending'),
+        ('sent', 'Sent'),
+        ('dead', 'Dead-lettered'),
+    ]
+    template_name = models.CharField(max_length=255, blank=True)
+    subject = models.CharField(max_length=500)
+    recipients = models.JSONField(default=list)
+    html_body = models.TextField()
+    attachments = models.JSONField(
+        default=list, blank=True,
+        help_text="List of {storage_name, filename, mimetype} read from default storage at send time."
+    )
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    attempts = models.PositiveIntegerField(default=0)
+    max_attempts = models.PositiveIntegerField(default=6)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='outbound_email_due_idx')]
+
+    def __str__(self):
+        return f"{self.subject} -> {', '.join(self.recipients)} ({self.get_status_display()})"
+
+    def build_message(self):
+        from django.core.files.storage import default_storage
+        from django.core.mail import EmailMessage
+
+        from LMS.graph_email_backend import GRAPH_INLINE_ATTACHMENT_LIMIT
+
+        message = EmailMessage(self.subject, self.html_body, settings.EMAIL_SENDER, self.recipients)
+        message.content_subtype = "html"
+        # Large files are left in storage and streamed by the mail backend (Graph upload session).
+        message.storage_attachments = []
+        for attachment in self.attachments:
+            size = default_storage.size(attachment['storage_name'])
+            if size > GRAPH_INLINE_ATTACHMENT_LIMIT:
+                message.storage_attachments.append({**attachment, 'size': size})
+                continue
+            with default_storage.open(attachment['storage_name'], 'rb') as f:
+                message.attach(attachment['filename'], f.read(), attachment.get('mimetype', 'application/octet-stream'))
+        return message
+
+    def mark_sent(self):
+        self.status = 'sent'
+        self.sent_at = timezone.now()
+        self.locked_at = None
+        self.last_error = None
+        self.save(update_fields=['status', 'sent_at', 'locked_at', 'last_error'])
+
+    def reschedule(self, delay_seconds):
+        """Puts the message back in the queue without counting an attempt (e.g. the transport is throttled)."""
+        self.status = 'pending'
+        self.locked_at = None
+        self.next_attempt_at = timezone.now() + timedelta(seconds=delay_seconds)
+        self.save(update_fields=['status', 'locked_at', 'next_attempt_at'])
+
+    def mark_failed(self, error):
+        """Schedules a retry with exponential backoff, or dead-letters the message."""
+        self.attempts += 1
+        self.last_error = str(error)[:5000]
+        self.locked_at = None
+        if self.attempts >= self.max_attempts:
+            self.status = 'dead'
+        else:
+            self.status = 'pending'
+            self.next_attempt_at = timezone.now() + timedelta(minutes=min(2 ** self.attempts, 60))
+        self.save(update_fields=['attempts', 'last_error', 'locked_at', 'status', 'next_attempt_at'])
+
+
+class PendingNotification(models.Model):
+    """
+    A notification held back for a user on a daily/weekly digest. The digest task
+    collapses a user's pending rows into one email and stamps digested_at.
+    """
+    KIND_CHOICES = [
+        ('course_alert', 'Course Alert'),
+        ('assignment', 'Course Assignment'),
+        ('reminder', 'Deadline Reminder'),
+        ('followup', 'Follow-up'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='pending_notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES)
+    subject = models.CharField(max_length=500)
+    message = models.TextField(blank=True)
+    url = models.URLField(max_length=500, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    digested_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [models.Index(fields=['digested_at', 'user'], name='pending_notif_digest_idx')]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} for {self.user}: {self.subject}"
+
+
+class Notification(models.Model):
+    """In-app notification shown in the user's inbox and counted by the header badge."""
+    KIND_CHOICES = [
+        ('course_alert', 'Course Alert'),
+        ('assignment', 'Course Assignment'),
+        ('reminder', 'Deadline Reminder'),
+        ('certificate', 'Certificate'),
+        ('ticket', 'Support Ticket'),
+        ('general', 'General'),
+    ]
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='notifications')
+    kind = models.CharField(max_length=20, choices=KIND_CHOICES, default='general')
+    title = models.CharField(max_length=255)
+    message = models.TextField(blank=True)
+    url = models.CharField(max_length=500, blank=True)
+    is_read = models.BooleanField(default=False)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['user', 'is_read', '-created_at'], name='notification_inbox_idx')]
+
+    def __str__(self):
+        return f"{self.title} ({self.user})"
+
+
+class BulkEmailDelivery(models.Model):
+    """
+    One row per recipient a fan-out campaign has already delivered to, so a
+    retried chunk skips them instead of sending duplicates.
+    """
+    campaign = models.CharField(max_length=200)
+    recipient = models.CharField(max_length=255)
+    delivered_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['campaign', 'recipient'], name='unique_bulk_email_delivery'),
+        ]
+
+    def __str__(self):
+        return f"{self.campaign} -> {self.recipient}"
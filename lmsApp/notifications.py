@@ -0,0 +1,61 @@
+from __future__ import annotations
+from collections import Counter
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .models import Notification
+
+UNREAD_COUNT_KEY = "unread_notifications:{user_id}"
+UNREAD_COUNT_TIMEOUT = 60 * 60 * 24
+
+
+def get_unread_count(user_id):
+    """Unread badge count; one COUNT query on a cold cache, then served from the cache."""
+    key = UNREAD_COUNT_KEY.format(user_id=user_id)
+    count = cache.get(key)
+    if count is None:
+        count = Notification.objects.filter(user_id=user_id, is_read=False).count()
+        cache.set(key, count, UNREAD_COUNT_TIMEOUT)
+    return count
+
+
+def _adjust_unread_counts(counts):
+    for user_id, delta in counts.items():
+        key = UNREAD_COUNT_KEY.format(user_id=user_id)
+        try:
+            cache.incr(key, delta)
+        except ValueError:
+            pass  # not cached yet; the next read counts from the database
+
+
+def notify_many(kind, entries):
+    """
+    Writes in-app notifications with one bulk_create and bumps each recipient's
+    cached unread count once the transaction commits.
+    entries: iterable of (user_id, title, message, url).
+    """
+    notifications = Notification.objects.bulk_create([
+        Notification(user_id=user_id, kind=kind, title=title[:255], message=message, url=url)
+        for user_id, title, message, url in entries
+    ])
+    counts = Counter(n.user_id for n in notifications)
+    if counts:
+        transaction.on_commit(lambda: _adjust_unread_counts(counts))
+    return notifications
+
+
+def notify(user_id, kind, title, message="", url=""):
+    return notify_many(kind, [(user_id, title, message, url)])[0]
+
+
+def mark_read(user_id, notification_ids=None):
+    """Marks the given (or all) unread notifications read and drops the cached count."""
+    queryset = Notification.objects.filter(user_id=user_id, is_read=False)
+    if notification_ids is not None:
+        queryset = queryset.filter(id__in=notification_ids)
+    updated = queryset.update(is_read=True)
+    if updated:
+        key = UNREAD_COUNT_KEY.format(user_id=user_id)
+        transaction.on_commit(lambda: cache.delete(key))
+    return updated
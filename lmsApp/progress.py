@@ -0,0 +1,307 @@
+from __future__ import annotations
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+
+from django.core.cache import cache
+from django.db.models import Count, FilteredRelation, Q
+
+from .course_structure import get_course_structure, get_course_structure_version
+from .models import Content, Quiz, StudentContentProgress, StudentQuizAttempt
+
+PROGRESS_VERSION_KEY = "learner_progress_version:{student_id}"
+MODULE_GATE_KEY = "module_gate:{student_id}:{course_id}:{module_id}:p{progress_version}:s{structure_version}"
+MODULE_GATE_TIMEOUT = 60 * 60
+
+
+def get_learner_progress_version(student_id):
+    key = PROGRESS_VERSION_KEY.format(student_id=student_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, int(time.time() * 1000), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_learner_progress_version(student_id):
+    key = PROGRESS_VERSION_KEY.format(student_id=student_id)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, int(time.time() * 1000), None)
+
+
+def is_module_unlocked_for_student(module, student):
+    """
+    A module is unlocked once every content in the earlier modules of its course
+    is completed. Answered with one aggregate query and memoized per
+    (student, course, progress version, structure version).
+    """
+    key = MODULE_GATE_KEY.format(
+        student_id=student.pk,
+        course_id=module.course_id,
+        module_id=module.pk,
+        progress_version=get_learner_progress_version(student.pk),
+        structure_version=get_course_structure_version(module.course_id),
+    )
+    unlocked = cache.get(key)
+    if unlocked is None:
+        counts = (
+            Content.objects.filter(
+                lesson__module__course_id=module.course_id,
+                lesson__module__order__lt=module.order,
+            )
+            .annotate(own_progress=FilteredRelation(
+                'student_progress',
+                condition=Q(student_progress__student=student, student_progress__completed=True),
+            ))
+            .aggregate(total=Count('id'), completed=Count('own_progress'))
+        )
+        unlocked = counts['completed'] >= counts['total']
+        cache.set(key, unlocked, MODULE_GATE_TIMEOUT)
+    return unlocked
+
+
+@dataclass
+class EnrollmentProgress:
+    enrollment_id: int
+    completed_contents: int
+    total_contents: int
+    has_quiz: bool = False
+    quiz_attempted: bool = False
+    quiz_passed: bool = False
+    # module_id -> (completed_contents, total_contents); only filled when requested.
+    modules: dict = field(default_factory=dict)
+
+    @property
+    def content_percentage(self):
+        if not self.total_contents:
+            return 0
+        return (min(self.completed_contents, self.total_contents) / self.total_contents) * 100
+
+    @property
+    def percentage(self):
+        """Same weighting as Enrollment.progress_percentage: content 80% / quiz 20% when a final quiz exists."""
+        if self.has_quiz:
+            quiz_percentage = 100 if self.quiz_passed else 0
+            return round((self.content_percentage * 0.8) + (quiz_percentage * 0.2))
+        return round(self.content_percentage)
+
+    @property
+    def is_content_completed(self):
+        return self.completed_contents >= self.total_contents
+
+    @property
+    def assessment_status(self):
+        if not self.has_quiz:
+            return "No Quiz"
+        if not self.quiz_attempted:
+            return "Not Attempted"
+        return "Passed" if self.quiz_passed else "Failed"
+
+    def module_percentage(self, module_id):
+        completed, total = self.modules.get(module_id, (0, 0))
+        return (completed / total) * 100 if total else 0
+
+
+class EnrollmentProgressService:
+    """
+    Computes progress for many enrollments at once with a fixed number of
+    grouped queries, regardless of how many enrollments are passed in.
+    """
+
+    @staticmethod
+    def for_enrollments(enrollments, include_modules=False) -> dict:
+        """
+        Returns {enrollment_id: EnrollmentProgress} for a queryset or list of enrollments.
+        With include_modules=True, per-module completed/total counts are filled in as well.
+        """
+        enrollments = list(enrollments)
+        if not enrollments:
+            return {}
+
+        course_ids = {e.course_id for e in enrollments}
+        student_ids = {e.student_id for e in enrollments}
+
+        # Per-course (and optionally per-module) content totals.
+        course_totals = defaultdict(int)
+        module_totals = defaultdict(dict)
+        content_totals = (
+            Content.objects.filter(lesson__module__course_id__in=course_ids)
+            .values('lesson__module__course_id', 'lesson__module_id')
+            .annotate(total=Count('id'))
+        )
+        for row in content_totals:
+            course_id = row['lesson__module__course_id']
+            course_totals[course_id] += row['total']
+            module_totals[course_id][row['lesson__module_id']] = row['total']
+
+        # Completed contents grouped by (student, course, module).
+        course_completed = defaultdict(int)
+        module_completed = defaultdict(dict)
+        completed_rows = (
+            StudentContentProgress.objects.filter(
+                completed=True,
+                student_id__in=student_ids,
+                content__lesson__module__course_id__in=course_ids,
+            )
+            .values('student_id', 'content__lesson__module__course_id', 'content__lesson__module_id')
+            .annotate(total=Count('id'))
+        )
+        for row in completed_rows:
+            key = (row['student_id'], row['content__lesson__module__course_id'])
+            course_completed[key] += row['total']
+            module_completed[key][row['content__lesson__module_id']] = row['total']
+
+        # Final-quiz status grouped by (student, course).
+        quiz_courses = set(
+            Quiz.objects.filter(course_id__in=course_ids).values_list('course_id', flat=True)
+        )
+        quiz_status = {}
+        if quiz_courses:
+            attempt_rows = (
+                StudentQuizAttempt.objects.filter(
+                    student_id__in=student_ids, quiz__course_id__in=quiz_courses
+                )
+                .values('student_id', 'quiz__course_id')
+                .annotate(passed_count=Count('id', filter=Q(passed=True)))
+            )
+            for row in attempt_rows:
+                quiz_status[(row['student_id'], row['quiz__course_id'])] = row['passed_count'] > 0
+
+        results = {}
+        for enrollment in enrollments:
+            key = (enrollment.student_id, enrollment.course_id)
+            progress = EnrollmentProgress(
+                enrollment_id=enrollment.pk,
+                completed_contents=course_completed.get(key, 0),
+                total_contents=course_totals.get(enrollment.course_id, 0),
+                has_quiz=enrollment.course_id in quiz_courses,
+                quiz_attempted=key in quiz_status,
+                quiz_passed=quiz_status.get(key, False),
+            )
+            if include_modules:
+                completed_by_module = module_completed.get(key, {})
+                progress.modules = {
+                    module_id: (completed_by_module.get(module_id, 0), total)
+                    for module_id, total in module_totals.get(enrollment.course_id, {}).items()
+                }
+            results[enrollment.pk] = progress
+        return results
+
+
+@dataclass
+class LearnerOutline:
+    """
+    A course's Module -> Lesson -> Content tree annotated with one learner's
+    completion and sequential-access state. The tree comes from the cached
+    course structure; progress costs two queries (completed content ids and
+    passed quiz ids) and everything else is computed in memory.
+    """
+    modules: list  # list of module dicts, in the shape course_detail.html expects
+    total_lessons_count: int = 0
+    total_contents_count: int = 0
+    completed_content_ids: set = field(default_factory=set)
+    passed_quiz_ids: set = field(default_factory=set)
+
+    @classmethod
+    def build(cls, course, user, full_access=False, track_progress=True) -> "LearnerOutline":
+        """
+        full_access:    instructors/staff see every module and lesson unlocked.
+        track_progress: True for an enrolled student; otherwise no progress is loaded.
+        """
+        structure = get_course_structure(course)
+
+        completed_content_ids = set()
+        passed_quiz_ids = set()
+        if track_progress:
+            completed_content_ids = set(
+                StudentContentProgress.objects.filter(
+                    student=user, completed=True, content__lesson__module__course=course
+                ).values_list('content_id', flat=True)
+            )
+            passed_quiz_ids = set(
+                StudentQuizAttempt.objects.filter(
+                    Q(quiz__course=course) | Q(quiz__module__course=course),
+                    student=user, passed=True,
+                ).values_list('quiz_id', flat=True).distinct()
+            )
+
+        outline = cls(
+            modules=[],
+            completed_content_ids=completed_content_ids,
+            passed_quiz_ids=passed_quiz_ids,
+        )
+        previous_module_lessons_completed = True
+
+        for module in structure['modules']:
+            module_accessible = full_access or (track_progress and previous_module_lessons_completed)
+
+            lessons_data = []
+            # Track sequential lesson access within the accessible module
+            previous_lesson_completed = True
+            for lesson in module['lessons']:
+                outline.total_lessons_count += 1
+
+                contents_data = []
+                for content_item in lesson['contents']:
+                    outline.total_contents_count += 1
+                    contents_data.append({
+                        **content_item,
+                        'is_completed': content_item['id'] in completed_content_ids,
+                    })
+
+                # A lesson with no content is considered completed for progression
+                lesson_is_completed = track_progress and all(c['is_completed'] for c in contents_data)
+                lessons_data.append({
+                    'id': lesson['id'],
+                    'title': lesson['title'],
+                    'description': lesson['description'],
+                    'order': lesson['order'],
+                    'contents': contents_data,
+                    'is_completed': lesson_is_completed,
+                    'is_accessible': full_access or (track_progress and module_accessible and previous_lesson_completed),
+                })
+                previous_lesson_completed = lesson_is_completed
+
+            module_quiz = module['quiz']
+            quiz_passed = module_quiz is not None and module_quiz['id'] in passed_quiz_ids
+            lessons_completed = False
+            is_completed = False
+            if track_progress and module_accessible:
+                lessons_completed = all(lesson['is_completed'] for lesson in lessons_data)
+                is_completed = lessons_completed and (module_quiz is None or quiz_passed)
+
+            outline.modules.append({
+                'id': module['id'],
+                'title': module['title'],
+                'description': module['description'],
+                'order': module['order'],
+                'lessons': lessons_data,
+                'is_accessible': module_accessible,
+                'is_completed': is_completed,
+                'quiz': module_quiz,
+                'quiz_passed': quiz_passed,
+                'lessons_completed': lessons_completed,
+            })
+            previous_module_lessons_completed = lessons_completed
+
+        return outline
+
+    def get_module(self, module_id):
+        for module in self.modules:
+            if module['id'] == module_id:
+                return module
+        return None
+
+    def is_module_accessible(self, module_id):
+        module = self.get_module(module_id)
+        return bool(module and module['is_accessible'])
+
+    def are_module_lessons_completed(self, module_id):
+        """All lessons of the module completed, regardless of whether the module is unlocked yet."""
+        module = self.get_module(module_id)
+        return bool(module) and all(lesson['is_completed'] for lesson in module['lessons'])
+
+    def has_passed_quiz(self, quiz_id):
+        return quiz_id in self.passed_quiz_ids
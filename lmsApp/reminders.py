@@ -0,0 +1,161 @@
+from __future__ import annotations
+from dataclasses import dataclass, field
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.utils import timezone
+
+from .models import Enrollment
+from .notifications import notify_many
+from .utils import send_bulk_templated_email, queue_digest_notifications
+
+
+@dataclass(frozen=True)
+class ReminderRule:
+    """
+    "Enrollments whose <date_field> falls <window> days from today and whose
+    <flag> is still False get <template_name>, then <flag> is set."
+
+    window is an inclusive (first_day, last_day) offset from today; negative
+    offsets look back (e.g. completed 58-62 days ago is (-62, -58)).
+    subject/summary are str.format templates receiving `title` and `enrollment`.
+    """
+    name: str
+    date_field: str
+    window: tuple
+    flag: str
+    template_name: str
+    subject: str
+    summary: str
+    kind: str
+    filters: dict = field(default_factory=dict)
+    context: dict = field(default_factory=dict)
+    in_app: bool = False
+
+    def queryset(self, today):
+        # A half-open datetime range (not __date) so the (completed, date) indexes apply.
+        first_day = today + timedelta(days=self.window[0])
+        last_day = today + timedelta(days=self.window[1])
+        return (
+            Enrollment.objects.filter(
+                **self.filters,
+                **{
+                    self.flag: False,
+                    f"{self.date_field}__gte": datetime.combine(first_day, time.min, tzinfo=dt_timezone.utc),
+                    f"{self.date_field}__lt": datetime.combine(last_day + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+                },
+            )
+            .select_related('student', 'course')
+            .only(
+                'id', 'student', 'course', 'due_date', 'completed_at', self.flag,
+                'student__id', 'student__email', 'student__first_name', 'student__last_name',
+                'student__notification_frequency',
+                'course__id', 'course__title', 'course__slug',
+            )
+            .order_by('pk')
+        )
+
+
+REMINDER_RULES = [
+    ReminderRule(
+        name='deadline_7day',
+        date_field='due_date', window=(7, 7), flag='reminder_7_sent',
+        filters={'completed': False},
+        template_name='emails/deadline_reminder_7day.html',
+        subject='Reminder: "{title}" is due in 7 days',
+        summary='Due on {enrollment.due_date:%B %d, %Y}.',
+        kind='reminder', in_app=True,
+    ),
+    ReminderRule(
+        name='deadline_3day',
+        date_field='due_date', window=(3, 3), flag='reminder_3_sent',
+        filters={'completed': False},
+        template_name='emails/deadline_reminder_3day.html',
+        subject='Final reminder: "{title}" is due in 3 days',
+        summary='Due on {enrollment.due_date:%B %d, %Y}.',
+        kind='reminder', in_app=True,
+    ),
+    ReminderRule(
+        name='followup_2mo',
+        date_field='completed_at', window=(-62, -58), flag='followup_2mo_sent',
+        filters={'completed': True},
+        template_name='emails/post_completion_followup.html',
+        subject='Checking in — how has "{title}" helped you?',
+        summary='It has been 2 months since you completed this course.',
+        kind='followup', context={'milestone': '2 months'},
+    ),
+    ReminderRule(
+        name='followup_3mo',
+        date_field='completed_at', window=(-92, -88), flag='followup_3mo_sent',
+        filters={'completed': True},
+        template_name='emails/post_completion_followup.html',
+        subject='Checking in — how has "{title}" helped you?',
+        summary='It has been 3 months since you completed this course.',
+        kind='followup', context={'milestone': '3 months'},
+    ),
+]
+
+
+def get_rules(*names):
+    return [rule for rule in REMINDER_RULES if rule.name in names]
+
+
+def run_reminder_rule(rule, domain, protocol, today=None, chunk_size=500):
+    """
+    Streams the rule's matches with iterator() and, per chunk: writes in-app
+    notifications, holds digest users' copies, bulk-sends the rest and flips the
+    flag with one UPDATE. Returns the number of enrollments handled.
+    """
+    today = today or timezone.now().date()
+    shared_context = {**rule.context, 'protocol': protocol, 'domain': domain}
+    matches = rule.queryset(today).iterator(chunk_size=chunk_size)
+    handled = 0
+
+    while True:
+        chunk = list(islice(matches, chunk_size))
+        if not chunk:
+            break
+
+        entries = []
+        immediate = []
+        digest = []
+        for enrollment in chunk:
+            course = enrollment.course
+            url = course.get_absolute_url()
+            entries.append((
+                enrollment,
+                rule.subject.format(title=course.title, enrollment=enrollment),
+                rule.summary.format(title=course.title, enrollment=enrollment),
+                url,
+            ))
+            if enrollment.student.notification_frequency == 'immediate':
+                immediate.append(entries[-1])
+            else:
+                digest.append(entries[-1])
+
+        if rule.in_app:
+            notify_many(rule.kind, ((e.student_id, subject, summary, url) for e, subject, summary, url in entries))
+        queue_digest_notifications(rule.kind, (
+            (e.student, subject, summary, f"{protocol}://{domain}{url}") for e, subject, summary, url in digest
+        ))
+        send_bulk_templated_email(
+            rule.template_name,
+            (
+                (
+                    subject,
+                    [e.student.email],
+                    {
+                        'student_name': e.student.get_full_name() or e.student.email,
+                        'course_title': e.course.title,
+                        'due_date': e.due_date,
+                        'course_url': f"{protocol}://{domain}{url}",
+                    },
+                )
+                for e, subject, summary, url in immediate
+            ),
+            shared_context,
+        )
+        Enrollment.objects.filter(pk__in=[e.pk for e in chunk]).update(**{rule.flag: True})
+        handled += len(chunk)
+
+    return handled
@@ -22,6 +22,7 @@ from tenacity import (
 from pydantic import ValidationError
  
 from .models import Course, Module, Lesson, Content, Quiz, Question, Option
+from .batching import defer_course_updates
 from .schemas import (
     CourseOutlineSchema,
     LessonSchema,
@@ -409,7 +410,7 @@ class PDFCourseExtractorService:
  
         chunk_size = max(1, len(extraction.pages) // max(1, len(outline.modules)))
  
-        with transaction.atomic():
+        with transaction.atomic(), defer_course_updates():
             course = Course.objects.create(
                 title=outline.title,
                 description=outline.description,
@@ -668,7 +669,7 @@ class ExternalResourceCourseGeneratorService:
         questions_per_module = max(2, math.ceil(target_questions / max(1, len(outline.modules))))
         brief = cls._resource_brief(resource)
  
-        with transaction.atomic():
+        with transaction.atomic(), defer_course_updates():
             course = Course.objects.create(
                 title=outline.title, description=outline.description, category=outline.category,
                 instructor=instructor, is_published=False, content_origin='external_resource_curated',
@@ -837,7 +838,7 @@ class ExternalResourceCourseGeneratorService:
         target_questions = max(min_questions, len(resources) * 2 * QUESTIONS_PER_LESSON)
         questions_per_module = max(2, math.ceil(target_questions / len(resources)))
  
-        with transaction.atomic():
+        with transaction.atomic(), defer_course_updates():
             course = Course.objects.create(
                 title=title, description=description, category='professional',
                 instructor=instructor, is_published=False, content_origin='external_resource_curated',
@@ -1,11 +1,19 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_save, post_delete, pre_save
 from django.dispatch import receiver
 from .models import *
 from django.db.models import Sum
+from django.db import transaction
+from django.conf import settings
 from .utils import *
+from .course_structure import bump_course_structure_version
+from .progress import bump_learner_progress_version
+from .batching import mark_course_dirty, mark_lesson_dirty
 
 @receiver([post_save, post_delete], sender=Content)
 def update_course_duration(sender, instance, **kwargs):
+    # Inside defer_course_updates() the duration is recomputed once per course at commit.
+    if mark_lesson_dirty(instance.lesson_id):
+        return
     try:
         course = instance.lesson.module.course
         total_duration = Content.objects.filter(
@@ -18,6 +26,104 @@ def update_course_duration(sender, instance, **kwargs):
     except Exception:
         pass
 
+@receiver([post_save, post_delete], sender=Content)
+def refresh_progress_on_content_change(sender, instance, **kwargs):
+    # Plain edits leave the content count alone; only additions and removals move the totals.
+    if kwargs.get('created') is False:
+        return
+    if mark_lesson_dirty(instance.lesson_id):
+        return
+    course = Course.objects.filter(modules__lessons=instance.lesson_id).first()
+    if course:
+        course.refresh_enrollment_progress()
+
+def _final_quiz_course_id(quiz_type, course_id):
+    return course_id if quiz_type == 'final' else None
+
+@receiver(pre_save, sender=Quiz)
+def remember_final_quiz_course(sender, instance, **kwargs):
+    previous = Quiz.objects.filter(pk=instance.pk).values_list('quiz_type', 'course_id').first() if instance.pk else None
+    instance._previous_final_course_id = _final_quiz_course_id(*previous) if previous else None
+
+@receiver([post_save, post_delete], sender=Quiz)
+def refresh_progress_on_final_quiz_change(sender, instance, **kwargs):
+    # Only adding or removing a course's final quiz (or moving it) changes progress;
+    # edits to the title, pass mark or questions leave the counters alone.
+    current = _final_quiz_course_id(instance.quiz_type, instance.course_id)
+    if kwargs.get('signal') is post_delete:
+        affected = {current}
+    else:
+        previous = getattr(instance, '_previous_final_course_id', None)
+        if not kwargs.get('created') and previous == current:
+            return
+        affected = {previous, current}
+
+    for course_id in affected - {None}:
+        if mark_course_dirty(course_id):
+            continue
+        course = Course.objects.filter(pk=course_id).first()
+        if course:
+            course.refresh_enrollment_progress()
+
+
+def _bump_structure_on_commit(course_id):
+    if mark_course_dirty(course_id):
+        return
+    if course_id:
+        transaction.on_commit(lambda: bump_course_structure_version(course_id))
+
+@receiver([post_save, post_delete], sender=Course)
+def invalidate_structure_on_course_change(sender, instance, **kwargs):
+    _bump_structure_on_commit(instance.pk)
+
+@receiver([post_save, post_delete], sender=Module)
+def invalidate_structure_on_module_change(sender, instance, **kwargs):
+    _bump_structure_on_commit(instance.course_id)
+
+@receiver([post_save, post_delete], sender=Lesson)
+def invalidate_structure_on_lesson_change(sender, instance, **kwargs):
+    _bump_structure_on_commit(
+        Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    )
+
+@receiver([post_save, post_delete], sender=Content)
+def invalidate_structure_on_content_change(sender, instance, **kwargs):
+    if mark_lesson_dirty(instance.lesson_id):
+        return
+    _bump_structure_on_commit(
+        Course.objects.filter(modules__lessons=instance.lesson_id).values_list('id', flat=True).first()
+    )
+
+@receiver([post_save, post_delete], sender=Quiz)
+def invalidate_structure_on_quiz_change(sender, instance, **kwargs):
+    course_id = instance.course_id
+    if not course_id and instance.module_id:
+        course_id = Module.objects.filter(pk=instance.module_id).values_list('course_id', flat=True).first()
+    _bump_structure_on_commit(course_id)
+
+@receiver([post_save, post_delete], sender=StudentContentProgress)
+def invalidate_learner_progress_version(sender, instance, **kwargs):
+    student_id = instance.student_id
+    transaction.on_commit(lambda: bump_learner_progress_version(student_id))
+
+def _schedule_course_update_notification(course_id, action_type):
+    """
+    Debounces course alerts: the first save in a window schedules one Celery
+    fan-out after LMS_COURSE_NOTIFICATION_DEBOUNCE_SECONDS; later saves in the
+    same window only upgrade the pending action to "newly published".
+    """
+    from django.core.cache import cache
+    from .tasks import COURSE_NOTIFICATION_PENDING_KEY, notify_students_of_course_update
+
+    debounce = getattr(settings, 'LMS_COURSE_NOTIFICATION_DEBOUNCE_SECONDS', 600)
+    key = COURSE_NOTIFICATION_PENDING_KEY.format(course_id=course_id)
+
+    if cache.add(key, action_type, debounce * 2):
+        transaction.on_commit(
+            lambda: notify_students_of_course_update.apply_async(args=[course_id], countdown=debounce)
+        )
+    elif action_type == "newly published":
+        cache.set(key, action_type, debounce * 2)
 
 @receiver(post_save, sender=Course)
 def notify_students_on_course_update(sender, instance, created, **kwargs):
@@ -28,18 +134,19 @@ def notify_students_on_course_update(sender, instance, created, **kwargs):
 
     if not instance.is_published:
         return
-    
-    action_type = "newly published" if created else "updated"
 
-    course_tags = list(instance.tags.values_list('name', flat=True))
-    if not course_tags:
-        return
+    action_type = "newly published" if created else "updated"
+    _schedule_course_update_notification(instance.pk, action_type)
 
-    matching_students = User.objects.filter(
-        is_student=True,
-        is_active=True,
-        department__in=course_tags
-    ).distinct()
+@receiver(post_save, sender=Content)
+def convert_uploaded_document(sender, instance, **kwargs):
+    """Converts a newly uploaded slide deck in the background so the first view is already fast."""
+    from .conversions import CONVERTIBLE_CONTENT_TYPES
+    from .tasks import convert_content_document
 
-    if matching_students.exists():
-        send_course_notification(instance, matching_students, action_type)
+    if instance.content_type not in CONVERTIBLE_CONTENT_TYPES or not instance.file:
+        return
+    if instance.file_hash_name == instance.file.name:
+        return
+    content_id = instance.pk
+    transaction.on_commit(lambda: convert_content_document.delay(content_id))
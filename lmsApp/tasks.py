@@ -1,13 +1,24 @@
 import logging
 from celery import shared_task
+from django.core.cache import cache
+from django.db import transaction
 from django.utils import timezone
 from .models import *
 from django.urls import reverse
 from django.contrib.sites.models import Site
 from django.conf import settings
 from datetime import timedelta
-from .utils import send_templated_email
+from .utils import (
+    send_templated_email, send_bulk_templated_email, send_course_notification, queue_templated_email,
+    split_by_notification_frequency, queue_digest_notifications,
+)
+from LMS.graph_email_backend import GraphSendError, GraphThrottledError
 from .services import *
+from .notifications import notify, notify_many
+from .conversions import CONVERSION_LOCK_KEY, LIBREOFFICE_TIMEOUT, get_converted_document
+from .certificates import render_certificate_pdf, store_certificate_pdf, certificate_file_name, certificate_url
+from .reminders import get_rules, run_reminder_rule
+from .fanout import fan_out, new_campaign_id, pending_recipients, record_delivered
 from .models import ExternalTrainingResource
 import requests
 
@@ -266,98 +277,39 @@ def process_course_import_job(self, job_id: int):
 @shared_task(bind=True, max_retries=3)
 def send_deadline_reminders(self):
     domain, protocol = _site_and_protocol()
-    sent_7, sent_3 = 0, 0
- 
-    incomplete_enrollments = Enrollment.objects.filter(
-        completed=False, due_date__isnull=False
-    ).select_related('student', 'course')
- 
-    for enrollment in incomplete_enrollments:
-        days_left = (enrollment.due_date.date() - timezone.now().date()).days
- 
-        if days_left == 7 and not enrollment.reminder_7_sent:
-            send_templated_email(
-                'emails/deadline_reminder_7day.html',
-                f'Reminder: "{enrollment.course.title}" is due in 7 days',
-                [enrollment.student.email],
-                {
-                    'student_name': enrollment.student.get_full_name() or enrollment.student.email,
-                    'course_title': enrollment.course.title,
-                    'due_date': enrollment.due_date,
-                    'course_url': f"{protocol}://{domain}{enrollment.course.get_absolute_url()}",
-                }
-            )
-            enrollment.reminder_7_sent = True
-            enrollment.save(update_fields=['reminder_7_sent'])
-            sent_7 += 1
- 
-        elif days_left == 3 and not enrollment.reminder_3_sent:
-            send_templated_email(
-                'emails/deadline_reminder_3day.html',
-                f'Final reminder: "{enrollment.course.title}" is due in 3 days',
-                [enrollment.student.email],
-                {
-                    'student_name': enrollment.student.get_full_name() or enrollment.student.email,
-                    'course_title': enrollment.course.title,
-                    'due_date': enrollment.due_date,
-                    'course_url': f"{protocol}://{domain}{enrollment.course.get_absolute_url()}",
-                }
-            )
-            enrollment.reminder_3_sent = True
-            enrollment.save(update_fields=['reminder_3_sent'])
-            sent_3 += 1
- 
+    sent_7, sent_3 = (
+        run_reminder_rule(rule, domain, protocol)
+        for rule in get_rules('deadline_7day', 'deadline_3day')
+    )
     return f"Sent {sent_7} 7-day reminders and {sent_3} 3-day reminders."
 
 
 @shared_task(bind=True, max_retries=3)
 def send_post_completion_followups(self):
     domain, protocol = _site_and_protocol()
-    today = timezone.now().date()
-    sent_2mo, sent_3mo = 0, 0
- 
-    completed_enrollments = Enrollment.objects.filter(
-        completed=True, completed_at__isnull=False
-    ).select_related('student', 'course')
- 
-    for enrollment in completed_enrollments:
-        days_since_completion = (today - enrollment.completed_at.date()).days
- 
-        if 58 <= days_since_completion <= 62 and not enrollment.followup_2mo_sent:
-            send_templated_email(
-                'emails/post_completion_followup.html',
-                f'Checking in — how has "{enrollment.course.title}" helped you?',
-                [enrollment.student.email],
-                {
-                    'student_name': enrollment.student.get_full_name() or enrollment.student.email,
-                    'course_title': enrollment.course.title,
-                    'milestone': '2 months',
-                    'protocol': protocol, 'domain': domain,
-                }
-            )
-            enrollment.followup_2mo_sent = True
-            enrollment.save(update_fields=['followup_2mo_sent'])
-            sent_2mo += 1
- 
-        elif 88 <= days_since_completion <= 92 and not enrollment.followup_3mo_sent:
-            send_templated_email(
-                'emails/post_completion_followup.html',
-                f'Checking in — how has "{enrollment.course.title}" helped you?',
-                [enrollment.student.email],
-                {
-                    'student_name': enrollment.student.get_full_name() or enrollment.student.email,
-                    'course_title': enrollment.course.title,
-                    'milestone': '3 months',
-                    'protocol': protocol, 'domain': domain,
-                }
-            )
-            enrollment.followup_3mo_sent = True
-            enrollment.save(update_fields=['followup_3mo_sent'])
-            sent_3mo += 1
- 
+    sent_2mo, sent_3mo = (
+        run_reminder_rule(rule, domain, protocol)
+        for rule in get_rules('followup_2mo', 'followup_3mo')
+    )
     return f"Sent {sent_2mo} 2-month and {sent_3mo} 3-month follow-ups."
 
 
+def _retry_undelivered_chunk(task, campaign, recipients):
+    """
+    Retries a fan-out chunk while any of its recipients is still undelivered;
+    the retry skips the ones already recorded. Gives up quietly after max_retries
+    so a chord callback still runs.
+    """
+    remaining = pending_recipients(campaign, recipients)
+    if not remaining:
+        return
+    if task.request.retries >= task.max_retries:
+        logger.error("Fan-out %s gave up on %s recipient(s) after %s retries.",
+                     campaign, len(remaining), task.request.retries)
+        return
+    raise task.retry(countdown=60 * (2 ** task.request.retries))
+
+
 @shared_task(bind=True, max_retries=3)
 def send_monthly_platform_report(self):
     from django.db.models import Count, Q
@@ -387,57 +339,489 @@ def send_monthly_platform_report(self):
     if not recipients:
         return "No HR/Admin recipients found — report not sent."
  
-    send_templated_email(
-        'emails/monthly_platform_report.html',
-        f"Platform Usage Report — {period_start.strftime('%B %Y')}",
-        recipients,
-        {
-            'period_start': period_start,
-            'period_end': period_end,
-            'new_enrollments': new_enrollments,
-            'completions_this_period': completions_this_period,
-            'certificates_issued': certificates_issued,
-            'total_active_students': total_active_students,
-            'top_courses': course_stats,
-            'dashboard_url': f"{protocol}://{domain}{reverse('audit_logs')}",
-        }
+    report = {
+        'period_start': period_start.isoformat(),
+        'period_end': period_end.isoformat(),
+        'new_enrollments': new_enrollments,
+        'completions_this_period': completions_this_period,
+        'certificates_issued': certificates_issued,
+        'total_active_students': total_active_students,
+        'top_courses': [
+            {'title': c.title, 'enrollments_this_period': c.enrollments_this_period} for c in course_stats
+        ],
+        'dashboard_url': f"{protocol}://{domain}{reverse('audit_logs')}",
+    }
+ 
+    # One campaign per period: a re-run of the beat job never re-sends to the same recipient.
+    fan_out(
+        send_monthly_report_chunk, f"monthly_report:{period_end.isoformat()}", recipients, report,
+        callback=log_monthly_report.si(recipients, report['period_start'], report['period_end']),
     )
  
+    return f"Monthly report queued for {len(recipients)} recipients."
+
+
+@shared_task(bind=True, max_retries=3)
+def send_monthly_report_chunk(self, campaign, recipients, report):
+    from django.utils.dateparse import parse_date
+
+    pending = pending_recipients(campaign, recipients)
+    period_start = parse_date(report['period_start'])
+    context = {**report, 'period_start': period_start, 'period_end': parse_date(report['period_end'])}
+    subject = f"Platform Usage Report — {period_start.strftime('%B %Y')}"
+
+    sent = send_bulk_templated_email(
+        'emails/monthly_platform_report.html',
+        ((subject, [email], {}, email) for email in pending),
+        context,
+        on_accepted=lambda keys: record_delivered(campaign, keys),
+    )
+    _retry_undelivered_chunk(self, campaign, recipients)
+    return f"Sent monthly report to {sent} recipient(s)."
+
+
+@shared_task
+def log_monthly_report(recipients, period_start, period_end):
     ReportLog.objects.create(
         report_type='monthly_usage',
         recipient_emails=', '.join(recipients),
         period_start=period_start,
         period_end=period_end,
     )
- 
-    return f"Monthly report sent to {len(recipients)} recipients."
+    return f"Logged monthly report for {len(recipients)} recipients."
 
 
 @shared_task(bind=True, max_retries=3)
-def send_bulk_assignment_emails(self, course_id, student_ids, assigner_id, due_date_iso):
+def send_bulk_assignment_emails(self, campaign, student_ids, course_id, assigner_id, due_date_iso):
+    """One fan-out chunk of a bulk assignment; see lmsApp.fanout.fan_out."""
     from django.utils.dateparse import parse_datetime
  
     domain, protocol = _site_and_protocol()
     course = Course.objects.get(id=course_id)
     assigner = User.objects.get(id=assigner_id)
     due_date = parse_datetime(due_date_iso)
-    students = User.objects.filter(id__in=student_ids)
+    pending_ids = pending_recipients(campaign, student_ids)
+    students = User.objects.filter(id__in=pending_ids).only('email', 'first_name', 'last_name', 'notification_frequency')
+    subject = f'You have been assigned: {course.title}'
+    course_url = f"{protocol}://{domain}{course.get_absolute_url()}"
+
+    assignment_note = f"Assigned by {assigner.get_full_name() or assigner.email}"
+    if due_date:
+        assignment_note += f", due {due_date:%B %d, %Y}"
+
+    students, digest_students = split_by_notification_frequency(students)
+    queue_digest_notifications('assignment', (
+        (student, subject, assignment_note, course_url)
+        for student in digest_students
+    ))
+    record_delivered(campaign, [student.id for student in digest_students])
  
-    for student in students:
-        send_templated_email(
-            'emails/bulk_assignment_notification.html',
-            f'You have been assigned: {course.title}',
+    sent = send_bulk_templated_email(
+        'emails/bulk_assignment_notification.html',
+        (
+            (
+                subject,
+                [student.email],
+                {'student_name': student.get_full_name() or student.email},
+                student.id,
+            )
+            for student in students
+        ),
+        {
+            'course_title': course.title,
+            'assigned_by': assigner.get_full_name() or assigner.email,
+            'due_date': due_date,
+            'course_url': course_url,
+            'protocol': protocol,
+            'domain': domain,
+        },
+        on_accepted=lambda keys: record_delivered(campaign, keys),
+    )
+    _retry_undelivered_chunk(self, campaign, student_ids)
+ 
+    return (
+        f"Sent {sent} bulk-assignment emails for course '{course.title}'; "
+        f"{len(digest_students)} held for digest."
+    )
+
+
+@shared_task(bind=True, max_retries=3)
+def send_notification_digests(self, frequency):
+    """
+    Collapses each user's pending notifications into one digest email.
+    The daily run also flushes rows left behind by users who switched back to immediate.
+    Rows are stamped per user only once their digest is accepted, so a retry
+    or a failed chunk never drops or duplicates a digest.
+    """
+    from itertools import groupby
+
+    domain, protocol = _site_and_protocol()
+    frequencies = [frequency, 'immediate'] if frequency == 'daily' else [frequency]
+    pending = list(
+        PendingNotification.objects.filter(
+            digested_at__isnull=True,
+            user__is_active=True,
+            user__notification_frequency__in=frequencies,
+        ).select_related('user').order_by('user_id', 'created_at')
+    )
+    if not pending:
+        return f"No pending notifications for the {frequency} digest."
+
+    label = 'weekly' if frequency == 'weekly' else 'daily'
+    users = 0
+
+    def digest_messages():
+        nonlocal users
+        for _, group in groupby(pending, key=lambda n: n.user_id):
+            notifications = list(group)
+            user = notifications[0].user
+            users += 1
+            yield (
+                f"Your {label} learning digest: {len(notifications)} update(s)",
+                [user.email],
+                {
+                    'student_name': user.get_full_name() or user.email,
+                    'notifications': notifications,
+                },
+                tuple(n.pk for n in notifications),
+            )
+
+    def mark_digested(keys):
+        PendingNotification.objects.filter(
+            pk__in=[pk for notification_ids in keys for pk in notification_ids],
+            digested_at__isnull=True,
+        ).update(digested_at=timezone.now())
+
+    sent = send_bulk_templated_email(
+        'emails/notification_digest.html',
+        digest_messages(),
+        {'digest_label': label, 'protocol': protocol, 'domain': domain},
+        on_accepted=mark_digested,
+    )
+
+    return f"Sent {sent} {label} digest(s) covering {len(pending)} notification(s) for {users} user(s)."
+
+
+def _send_hr_completion_email(enrollment, domain, protocol):
+    hr_emails = [
+        email for email in
+        User.objects.filter(is_hr=True, is_active=True).values_list('email', flat=True)
+        if email
+    ]
+    if not hr_emails:
+        return False
+
+    course = enrollment.course
+    student = enrollment.student
+    return send_templated_email(
+        'emails/hr_completion_notification.html',
+        f"ACTION REQUIRED: Course Completion for Appraisal - {course.title}",
+        hr_emails,
+        {
+            'student_name': student.get_full_name() or student.email,
+            'course_title': course.title,
+            'completion_date': enrollment.completed_at.strftime('%Y-%m-%d'),
+            'enrollment_type': 'Self-Enrolled' if enrollment.assignment_reason == 'self' else 'Assigned',
+            'dashboard_url': f"{protocol}://{domain}{reverse('hr_appraisal_dashboard')}",
+            'protocol': protocol, 'domain': domain,
+        }
+    )
+
+
+@shared_task(bind=True, max_retries=5, default_retry_delay=60)
+def process_course_completion_event(self, event_id):
+    """
+    Consumer for CourseCompletionEvent: awards competencies in bulk and notifies HR.
+    There is no rollup to refresh here: the enrollment's completion counters are
+    written in the same transaction as the event, and dashboards read those
+    columns directly, so nothing cached is derived from a completion.
+    """
+    event = (
+        CourseCompletionEvent.objects
+        .select_related('enrollment__student', 'enrollment__course')
+        .filter(pk=event_id, status='pending')
+        .first()
+    )
+    if not event:
+        return f"Completion event #{event_id} already handled."
+
+    enrollment = event.enrollment
+    if not enrollment.completed:
+        # Flipped back (e.g. new content added) before we got to it.
+        event.mark_processed()
+        return f"Enrollment #{enrollment.pk} is no longer completed; skipped."
+
+    try:
+        enrollment._award_competencies()
+        domain, protocol = _site_and_protocol()
+        _send_hr_completion_email(enrollment, domain, protocol)
+        event.mark_processed()
+    except Exception as e:
+        final = self.request.retries >= self.max_retries
+        event.record_failure(e, final=final)
+        logger.exception(f"Failed processing completion event #{event_id}")
+        if final:
+            raise
+        raise self.retry(exc=e, countdown=60 * (2 ** self.request.retries))
+
+    return f"Processed completion event #{event_id}."
+
+
+@shared_task
+def dispatch_pending_completion_events():
+    """
+    Safety net for events whose on_commit dispatch never reached the broker.
+    """
+    stale_before = timezone.now() - timedelta(minutes=5)
+    event_ids = list(
+        CourseCompletionEvent.objects.filter(status='pending', attempts=0, created_at__lt=stale_before)
+        .values_list('id', flat=True)[:500]
+    )
+    for event_id in event_ids:
+        process_course_completion_event.delay(event_id)
+    return f"Re-dispatched {len(event_ids)} pending completion event(s)."
+
+
+@shared_task(bind=True, max_retries=3)
+def generate_certificate_pdf(self, certificate_id, domain=None, protocol=None):
+    """
+    Renders and stores the PDF for a Certificate created in 'generating' state,
+    then notifies the student and queues the completion email with it attached.
+    """
+    certificate = (
+        Certificate.objects
+        .select_related('student', 'course__instructor')
+        .filter(pk=certificate_id)
+        .first()
+    )
+    if not certificate or certificate.status != 'generating':
+        return f"Certificate #{certificate_id} needs no generation."
+
+    if not domain or not protocol:
+        domain, protocol = _site_and_protocol()
+
+    try:
+        pdf_bytes = render_certificate_pdf(certificate, domain, protocol)
+    except Exception as e:
+        final = self.request.retries >= self.max_retries
+        logger.exception(f"Failed rendering certificate #{certificate_id}")
+        if final:
+            certificate.status = 'failed'
+            certificate.generation_error = str(e)
+            certificate.status_updated_at = timezone.now()
+            certificate.save(update_fields=['status', 'generation_error', 'status_updated_at'])
+            raise
+        raise self.retry(exc=e, countdown=30 * (2 ** self.request.retries))
+
+    with transaction.atomic():
+        # A duplicate dispatch may have rendered in parallel; only one stores and emails.
+        locked = Certificate.objects.select_for_update().filter(pk=certificate_id, status='generating').exists()
+        if not locked:
+            return f"Certificate #{certificate_id} was generated by another worker."
+        store_certificate_pdf(certificate, pdf_bytes)
+
+        student = certificate.student
+        course = certificate.course
+        notify(
+            student.id, 'certificate',
+            f'Your certificate for "{course.title}" is ready',
+            url=reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id}),
+        )
+        # The outbox worker reads the saved PDF from storage at send time
+        queue_templated_email(
+            'emails/course_completion.html',
+            f"Congratulations! You've Completed {course.title}!",
             [student.email],
             {
                 'student_name': student.get_full_name() or student.email,
                 'course_title': course.title,
-                'assigned_by': assigner.get_full_name() or assigner.email,
-                'due_date': due_date,
-                'course_url': f"{protocol}://{domain}{course.get_absolute_url()}",
-            }
+                'completion_date': certificate.issue_date,
+                'certificate_url': certificate_url(certificate, domain, protocol),
+                'current_year': timezone.now().year,
+            },
+            attachments=[{
+                'storage_name': certificate.pdf_file.name,
+                'filename': certificate_file_name(certificate),
+                'mimetype': 'application/pdf',
+            }]
         )
- 
-    return f"Sent {students.count()} bulk-assignment emails for course '{course.title}'."
+
+    return f"Generated certificate #{certificate_id}."
+
+
+@shared_task(
+    bind=True, max_retries=2, default_retry_delay=60,
+    soft_time_limit=LIBREOFFICE_TIMEOUT + 60, time_limit=LIBREOFFICE_TIMEOUT + 90,
+)
+def convert_content_document(self, content_id):
+    """
+    Hashes a content's uploaded file and makes sure its PDF rendition exists.
+    Routed to the 'conversions' queue, whose workers each keep a warm LibreOffice.
+    """
+    content = Content.objects.filter(pk=content_id).first()
+    if not content or not content.file:
+        return f"Content #{content_id} has no file to convert."
+
+    document = get_converted_document(content)
+    if document:
+        return f"Content #{content_id} converted: {document.pdf_file.name}"
+    if cache.get(CONVERSION_LOCK_KEY.format(source_hash=content.file_hash)):
+        # Another worker or a viewer is converting this exact file; check back once it's done.
+        raise self.retry()
+    return f"Content #{content_id} could not be converted."
+
+
+@shared_task
+def dispatch_pending_certificates():
+    """
+    Safety net for certificates whose on_commit dispatch never reached the broker.
+    """
+    stale_before = timezone.now() - timedelta(minutes=10)
+    certificate_ids = list(
+        Certificate.objects.filter(status='generating', status_updated_at__lt=stale_before)
+        .values_list('id', flat=True)[:200]
+    )
+    for certificate_id in certificate_ids:
+        generate_certificate_pdf.delay(certificate_id)
+    return f"Re-dispatched {len(certificate_ids)} pending certificate(s)."
+
+
+OUTBOUND_EMAIL_STALE_LOCK = timedelta(minutes=15)
+
+
+def _record_outbound_failure(outbound, error):
+    outbound.mark_failed(error)
+    if outbound.status == 'dead':
+        logger.error("Outbound email #%s dead-lettered after %s attempts: %s", outbound.pk, outbound.attempts, error)
+    else:
+        logger.warning("Outbound email #%s failed (attempt %s): %s", outbound.pk, outbound.attempts, error)
+
+
+@shared_task
+def deliver_outbound_emails(batch_size=None):
+    """
+    Claims due outbox rows (SKIP LOCKED, so concurrent workers never share a row)
+    and hands them to the mail backend in one send_messages() call, so the Graph
+    backend can pack them into $batch requests. The backend's GraphSendError /
+    GraphThrottledError say which messages failed or went unsent; those rows are
+    retried with exponential backoff (dead-lettered after max_attempts) or put
+    back for the throttle window, and every other row is marked sent.
+    """
+    from django.core.mail import get_connection
+    from django.db import transaction
+
+    batch_size = batch_size or getattr(settings, 'LMS_OUTBOX_BATCH_SIZE', 50)
+    now = timezone.now()
+
+    # Rows left in 'sending' by a worker that died mid-batch go back to the queue.
+    OutboundEmail.objects.filter(status='sending', locked_at__lt=now - OUTBOUND_EMAIL_STALE_LOCK).update(
+        status='pending', locked_at=None
+    )
+
+    with transaction.atomic():
+        batch = list(
+            OutboundEmail.objects.select_for_update(skip_locked=True)
+            .filter(status='pending', next_attempt_at__lte=now)
+            .order_by('next_attempt_at')[:batch_size]
+        )
+        OutboundEmail.objects.filter(pk__in=[e.pk for e in batch]).update(status='sending', locked_at=now)
+
+    if not batch:
+        return "No outbound emails due."
+
+    failed = 0
+    messages, outbound_by_message = [], {}
+    for outbound in batch:
+        try:
+            message = outbound.build_message()
+        except Exception as e:
+            # e.g. an attachment missing from storage: only this row is affected.
+            _record_outbound_failure(outbound, e)
+            failed += 1
+            continue
+        messages.append(message)
+        outbound_by_message[id(message)] = outbound
+
+    unsent, rejected = [], []
+    error = retry_after = None
+    throttled = False
+    if messages:
+        connection = get_connection()
+        try:
+            connection.send_messages(messages)
+        except GraphThrottledError as e:
+            # Graph's back-off is global, so another batch right away would be throttled too.
+            logger.warning("Outbound email delivery throttled; retrying in %ss.", e.retry_after)
+            unsent, rejected, error, retry_after = e.unsent, e.failed, e, e.retry_after
+            throttled = True
+        except GraphSendError as e:
+            rejected, error = e.failed, e
+        except Exception as e:
+            # The backend failed as a whole (token, connection): nothing in this batch is known sent.
+            logger.exception("Outbound email connection failed: %s", e)
+            rejected, error = messages, e
+
+    for message in unsent:
+        outbound_by_message.pop(id(message)).reschedule(retry_after)
+    for message in rejected:
+        _record_outbound_failure(outbound_by_message.pop(id(message)), error)
+        failed += 1
+    for outbound in outbound_by_message.values():
+        outbound.mark_sent()
+
+    if len(batch) == batch_size and not throttled:
+        deliver_outbound_emails.delay(batch_size)
+    return f"Sent {len(outbound_by_message)} outbound email(s), {failed} failed."
+
+
+COURSE_NOTIFICATION_PENDING_KEY = "course_update_notification_pending:{course_id}"
+
+
+@shared_task
+def notify_students_of_course_update(course_id):
+    """
+    Runs once per debounce window for a course: resolves the students whose
+    department matches a course tag at send time and fans them out in chunks.
+    """
+    from django.core.cache import cache
+
+    action_type = cache.get(COURSE_NOTIFICATION_PENDING_KEY.format(course_id=course_id)) or "updated"
+    cache.delete(COURSE_NOTIFICATION_PENDING_KEY.format(course_id=course_id))
+
+    course = Course.objects.filter(pk=course_id, is_published=True).first()
+    if not course:
+        return f"Course #{course_id} is missing or unpublished; no notification sent."
+
+    course_tags = list(course.tags.values_list('name', flat=True))
+    if not course_tags:
+        return f"Course '{course.title}' has no tags; no notification sent."
+
+    student_ids = list(
+        User.objects.filter(is_student=True, is_active=True, department__in=course_tags)
+        .values_list('id', flat=True).distinct()
+    )
+    fan_out(
+        send_course_notification_chunk, new_campaign_id('course_alert', course_id),
+        student_ids, course_id, action_type,
+    )
+
+    return f"Queued course notification for {len(student_ids)} student(s) of '{course.title}'."
+
+
+@shared_task(bind=True, max_retries=3)
+def send_course_notification_chunk(self, campaign, student_ids, course_id, action_type):
+    course = Course.objects.select_related('instructor').get(pk=course_id)
+    if not self.request.retries:
+        notify_many('course_alert', (
+            (student_id, f"New Course Alert: {course.title} is now {action_type}!", "", course.get_absolute_url())
+            for student_id in student_ids
+        ))
+    students = User.objects.filter(id__in=pending_recipients(campaign, student_ids))
+    sent = send_course_notification(
+        course, students, action_type, on_accepted=lambda keys: record_delivered(campaign, keys)
+    )
+    _retry_undelivered_chunk(self, campaign, student_ids)
+    return f"Sent {sent} course notification(s) for '{course.title}'."
 
 
 @shared_task(bind=True, max_retries=3)
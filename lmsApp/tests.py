@@ -1,3 +1,619 @@
-from django.test import TestCase
+import json
+import threading
+import time
+from datetime import date, datetime, time as dt_time, timedelta, timezone as dt_timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
 
-# Create your tests here.
+import requests
+from django.core import mail
+from django.core.cache import cache
+from django.core.mail import EmailMessage
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from LMS.graph_email_backend import (
+    GRAPH_INLINE_ATTACHMENT_LIMIT, THROTTLED_UNTIL_KEY, UPLOAD_CHUNK_SIZE,
+    GraphEmailBackend, GraphSendError, GraphThrottledError,
+)
+from .conversions import request_converted_document
+from .fanout import fan_out, pending_recipients, record_delivered
+from .models import (
+    BulkEmailDelivery, Content, ConvertedDocument, Course, CourseCompletionEvent, Enrollment, Lesson,
+    Module, Notification, OutboundEmail, PendingNotification, Quiz, StudentContentProgress, StudentQuizAttempt, User,
+)
+from .reminders import get_rules, run_reminder_rule
+from .tasks import deliver_outbound_emails, send_course_notification_chunk, send_notification_digests
+
+SENDER = "lms@example.com"
+
+
+class StubGraphServer:
+    """
+    A local stand-in for graph.microsoft.com. Every request is recorded as
+    (method, path, headers, body) and answered by respond(method, path, headers, body),
+    which returns (status, headers, json_payload_or_None).
+    """
+
+    def __init__(self, respond):
+        self.respond = respond
+        self.requests = []
+        self._lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def handle_any(self):
+                body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                with stub._lock:
+                    stub.requests.append((self.command, self.path, self.headers, body))
+                status, headers, payload = stub.respond(self.command, self.path, self.headers, body)
+                data = json.dumps(payload).encode() if payload is not None else b""
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = handle_any
+
+            def log_message(self, format, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def root_url(self):
+        return f"http://127.0.0.1:{self.server.server_port}"
+
+    def start(self):
+        self.thread.start()
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def requests_to(self, suffix, method=None):
+        return [
+            request for request in self.requests
+            if request[1].split("?")[0].endswith(suffix) and (method is None or request[0] == method)
+        ]
+
+
+class GraphBackendTestCase(SimpleTestCase):
+    """Points GraphEmailBackend at a StubGraphServer, with a private cache and no send budget."""
+
+    def setUp(self):
+        self.server = StubGraphServer(self.respond)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+        overrides = override_settings(
+            CACHES={"default": {
+                "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+                "LOCATION": "graph-backend-tests",
+            }},
+            GRAPH_API_BASE_URL=f"{self.server.root_url}/v1.0",
+            EMAIL_SENDER=SENDER,
+            GRAPH_EMAIL_USE_BATCH=True,
+            GRAPH_EMAIL_RATE_PER_MINUTE=0,
+            GRAPH_THROTTLE_MAX_WAIT=5,
+            GRAPH_THROTTLE_MAX_RETRIES=2,
+        )
+        overrides.enable()
+        self.addCleanup(overrides.disable)
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def respond(self, method, path, headers, body):
+        return 404, {}, {"error": {"code": "NotFound", "message": path}}
+
+    def backend(self):
+        return GraphEmailBackend(access_token="test-token", session=requests.Session())
+
+    def messages(self, count):
+        return [
+            EmailMessage(f"Subject {i}", "<p>Body</p>", SENDER, [f"student{i}@example.com"])
+            for i in range(count)
+        ]
+
+
+class GraphBatchTests(GraphBackendTestCase):
+    failing_recipient = None
+
+    def respond(self, method, path, headers, body):
+        if path.endswith("/$batch"):
+            items = json.loads(body)["requests"]
+            return 200, {}, {"responses": [
+                {"id": item["id"], "status": self.item_status(item), "body": None} for item in items
+            ]}
+        if path.endswith("/sendMail"):
+            return 202, {}, None
+        return super().respond(method, path, headers, body)
+
+    def item_status(self, item):
+        recipient = item["body"]["message"]["toRecipients"][0]["emailAddress"]["address"]
+        return 400 if recipient == self.failing_recipient else 202
+
+    def batches(self):
+        return [json.loads(body)["requests"] for _, _, _, body in self.server.requests_to("/$batch")]
+
+    def test_messages_are_grouped_twenty_per_batch(self):
+        sent = self.backend().send_messages(self.messages(45))
+
+        self.assertEqual(sent, 45)
+        batches = self.batches()
+        self.assertEqual(sorted(len(batch) for batch in batches), [5, 20, 20])
+        self.assertEqual(sorted(int(item["id"]) for batch in batches for item in batch), list(range(45)))
+        for batch in batches:
+            for item in batch:
+                self.assertEqual(item["method"], "POST")
+                self.assertEqual(item["url"], "/users/lms%40example.com/sendMail")
+        self.assertEqual(self.server.requests_to("/sendMail"), [])
+        for _, _, headers, _ in self.server.requests:
+            self.assertEqual(headers.get("Authorization"), "Bearer test-token")
+
+    def test_single_message_is_posted_without_batch(self):
+        sent = self.backend().send_messages(self.messages(1))
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(self.server.requests_to("/sendMail")), 1)
+        self.assertEqual(self.batches(), [])
+
+    def test_failed_batch_item_is_reported_without_resending_the_rest(self):
+        self.failing_recipient = "student3@example.com"
+
+        with self.assertRaises(GraphSendError) as raised:
+            self.backend().send_messages(self.messages(5))
+
+        self.assertEqual([message.to for message in raised.exception.failed], [["student3@example.com"]])
+        self.assertEqual(len(self.batches()), 1)
+
+
+class GraphThrottlingTests(GraphBackendTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.send_mail_responses = []
+        self.throttled_batch_ids = set()
+
+    def respond(self, method, path, headers, body):
+        if path.endswith("/sendMail"):
+            if self.send_mail_responses:
+                return self.send_mail_responses.pop(0)
+            return 202, {}, None
+        if path.endswith("/$batch"):
+            throttled, self.throttled_batch_ids = self.throttled_batch_ids, set()
+            return 200, {}, {"responses": [
+                {"id": item["id"], "status": 429, "headers": {"Retry-After": "1"}}
+                if item["id"] in throttled else {"id": item["id"], "status": 202}
+                for item in json.loads(body)["requests"]
+            ]}
+        return super().respond(method, path, headers, body)
+
+    def test_retry_after_is_honoured_before_resending(self):
+        self.send_mail_responses = [(429, {"Retry-After": "1"}, {"error": {"code": "ApplicationThrottled"}})]
+
+        started = time.monotonic()
+        sent = self.backend().send_messages(self.messages(1))
+
+        self.assertEqual(sent, 1)
+        self.assertEqual(len(self.server.requests_to("/sendMail")), 2)
+        self.assertGreaterEqual(time.monotonic() - started, 0.9)
+
+    def test_long_back_off_raises_unsent_messages_and_is_shared(self):
+        self.send_mail_responses = [(429, {"Retry-After": "120"}, {"error": {"code": "ApplicationThrottled"}})]
+        messages = self.messages(1)
+
+        with self.assertRaises(GraphThrottledError) as raised:
+            self.backend().send_messages(messages)
+
+        self.assertEqual(raised.exception.unsent, messages)
+        self.assertGreaterEqual(raised.exception.retry_after, 119)
+        self.assertGreater(cache.get(THROTTLED_UNTIL_KEY), time.time() + 100)
+        self.assertEqual(len(self.server.requests), 1)
+
+        # A second backend (another worker) honours the same back-off without calling Graph.
+        with self.assertRaises(GraphThrottledError):
+            self.backend().send_messages(self.messages(1))
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_throttled_batch_item_is_resent_on_its_own(self):
+        self.throttled_batch_ids = {"1"}
+
+        sent = self.backend().send_messages(self.messages(3))
+
+        self.assertEqual(sent, 3)
+        self.assertEqual(len(self.server.requests_to("/$batch")), 1)
+        [(_, _, _, body)] = self.server.requests_to("/sendMail")
+        resent_to = json.loads(body)["message"]["toRecipients"][0]["emailAddress"]["address"]
+        self.assertEqual(resent_to, "student1@example.com")
+
+
+class GraphUploadSessionTests(GraphBackendTestCase):
+    send_status = 202
+
+    def respond(self, method, path, headers, body):
+        if method == "POST" and path.endswith("/users/lms%40example.com/messages"):
+            return 201, {}, {"id": "draft-1"}
+        if path.endswith("/messages/draft-1/attachments/createUploadSession"):
+            return 201, {}, {"uploadUrl": f"{self.server.root_url}/upload/draft-1"}
+        if method == "PUT" and path == "/upload/draft-1":
+            last_byte, total = headers["Content-Range"].split(" ")[1].split("-")[1].split("/")
+            return (201 if int(last_byte) + 1 == int(total) else 200), {}, {}
+        if path.endswith("/messages/draft-1/send"):
+            return self.send_status, {}, None
+        if method == "DELETE" and path.endswith("/messages/draft-1"):
+            return 204, {}, None
+        return super().respond(method, path, headers, body)
+
+    def large_message(self, size):
+        data = (bytes(range(256)) * (size // 256 + 1))[:size]
+        message = self.messages(1)[0]
+        message.attach("handbook.pdf", data, "application/pdf")
+        return message, data
+
+    def test_large_attachment_is_streamed_through_an_upload_session(self):
+        size = GRAPH_INLINE_ATTACHMENT_LIMIT + 512 * 1024
+        message, data = self.large_message(size)
+
+        sent = self.backend().send_messages([message])
+
+        self.assertEqual(sent, 1)
+        [(_, _, _, draft_body)] = self.server.requests_to("/users/lms%40example.com/messages", method="POST")
+        self.assertEqual(json.loads(draft_body)["attachments"], [])
+
+        [(_, _, _, session_body)] = self.server.requests_to("/createUploadSession")
+        attachment_item = json.loads(session_body)["AttachmentItem"]
+        self.assertEqual((attachment_item["name"], attachment_item["size"]), ("handbook.pdf", size))
+
+        puts = self.server.requests_to("/upload/draft-1", method="PUT")
+        self.assertEqual(
+            [headers["Content-Range"] for _, _, headers, _ in puts],
+            [f"bytes 0-{UPLOAD_CHUNK_SIZE - 1}/{size}", f"bytes {UPLOAD_CHUNK_SIZE}-{size - 1}/{size}"],
+        )
+        self.assertEqual(b"".join(body for _, _, _, body in puts), data)
+        # The upload URL is pre-authorised; the bearer token must not be sent to it.
+        for _, _, headers, _ in puts:
+            self.assertIsNone(headers.get("Authorization"))
+
+        self.assertEqual(len(self.server.requests_to("/messages/draft-1/send")), 1)
+        self.assertEqual(self.server.requests_to("/sendMail"), [])
+        self.assertEqual(self.server.requests_to("/$batch"), [])
+
+    def test_failed_send_discards_the_draft(self):
+        self.send_status = 500
+        message, _ = self.large_message(GRAPH_INLINE_ATTACHMENT_LIMIT + 1)
+
+        with self.assertRaises(GraphSendError):
+            self.backend().send_messages([message])
+
+        self.assertEqual(len(self.server.requests_to("/messages/draft-1", method="DELETE")), 1)
+
+
+class CourseTestMixin:
+    """A course with one module, one lesson and three text contents."""
+
+    def create_course(self, title="Workplace Safety", contents=3):
+        instructor = User.objects.filter(is_instructor=True).first() or User.objects.create_user(
+            email="instructor@example.com", first_name="Ada", last_name="Instructor",
+            is_instructor=True, is_student=False,
+        )
+        course = Course.objects.create(title=title, description="Course description", instructor=instructor)
+        module = Module.objects.create(course=course, title="Module 1", order=1)
+        lesson = Lesson.objects.create(module=module, title="Lesson 1", order=1)
+        for order in range(contents):
+            Content.objects.create(
+                lesson=lesson, title=f"Part {order + 1}", content_type="text",
+                text_content="Reading material.", order=order,
+            )
+        return course
+
+    def create_student(self, email="student@example.com", **extra_fields):
+        return User.objects.create_user(email=email, first_name="Sam", last_name="Student", **extra_fields)
+
+
+class EnrollmentProgressCounterTests(CourseTestMixin, TestCase):
+
+    def setUp(self):
+        self.course = self.create_course()
+        self.contents = list(Content.objects.filter(lesson__module__course=self.course).order_by("order"))
+        self.student = self.create_student()
+        self.enrollment = Enrollment.objects.create(student=self.student, course=self.course)
+
+    def complete(self, content, completed=True):
+        progress, _ = StudentContentProgress.objects.get_or_create(student=self.student, content=content)
+        progress.completed = completed
+        progress.save()
+
+    def test_new_enrollment_counts_existing_content(self):
+        self.assertEqual(self.enrollment.total_content_count, 3)
+        self.assertEqual(self.enrollment.completed_content_count, 0)
+
+    def test_completion_moves_the_counter_once(self):
+        self.complete(self.contents[0])
+        self.complete(self.contents[0])  # re-saving a completed item is not a second completion
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_content_count, 1)
+        self.assertIsNotNone(self.enrollment.last_activity_at)
+
+        self.complete(self.contents[0], completed=False)
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_content_count, 0)
+
+    def test_concurrent_saves_from_stale_copies_count_once(self):
+        progress = StudentContentProgress.objects.create(student=self.student, content=self.contents[0])
+        first = StudentContentProgress.objects.get(pk=progress.pk)
+        second = StudentContentProgress.objects.get(pk=progress.pk)
+
+        first.completed = second.completed = True
+        first.save()
+        second.save()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_content_count, 1)
+
+        first.completed = second.completed = False
+        first.save()
+        second.save()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.completed_content_count, 0)
+
+    def test_adding_and_removing_content_updates_totals(self):
+        content = Content.objects.create(
+            lesson=self.contents[0].lesson, title="Part 4", content_type="text", text_content="More.", order=3,
+        )
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.total_content_count, 4)
+
+        content.delete()
+        self.enrollment.refresh_from_db()
+        self.assertEqual(self.enrollment.total_content_count, 3)
+
+    def test_completing_all_content_completes_the_enrollment(self):
+        for content in self.contents:
+            self.complete(content)
+
+        self.enrollment.refresh_from_db()
+        self.assertTrue(self.enrollment.all_content_completed)
+        self.assertTrue(self.enrollment.completed)
+        self.assertIsNotNone(self.enrollment.completed_at)
+        self.assertEqual(self.enrollment.progress_percentage, 100)
+        self.assertEqual(CourseCompletionEvent.objects.filter(enrollment=self.enrollment).count(), 1)
+
+    def test_final_quiz_pass_is_stored_and_completes_the_enrollment(self):
+        quiz = Quiz.objects.create(
+            quiz_type="final", course=self.course, title="Final assessment", created_by=self.course.instructor,
+        )
+        for content in self.contents:
+            self.complete(content)
+        self.enrollment.refresh_from_db()
+        self.assertFalse(self.enrollment.completed)
+        self.assertEqual(self.enrollment.content_percentage, 100)
+        self.assertEqual(self.enrollment.progress_percentage, 80)
+
+        StudentQuizAttempt.objects.create(student=self.student, quiz=quiz, score=85)
+
+        self.enrollment.refresh_from_db()
+        self.assertTrue(self.enrollment.final_quiz_passed)
+        self.assertTrue(self.enrollment.completed)
+        self.assertEqual(self.enrollment.progress_percentage, 100)
+
+    def test_only_final_quiz_changes_trigger_a_recount(self):
+        with mock.patch.object(Course, "refresh_enrollment_progress") as refresh:
+            quiz = Quiz.objects.create(
+                quiz_type="final", course=self.course, title="Final assessment", created_by=self.course.instructor,
+            )
+            self.assertEqual(refresh.call_count, 1)
+
+            quiz.title = "Final assessment (v2)"
+            quiz.pass_percentage = 80
+            quiz.save()
+            self.assertEqual(refresh.call_count, 1)
+
+            quiz.delete()
+            self.assertEqual(refresh.call_count, 2)
+
+    def test_refresh_enrollment_progress_repairs_drifted_counters(self):
+        self.complete(self.contents[0])
+        Enrollment.objects.filter(pk=self.enrollment.pk).update(completed_content_count=7, total_content_count=0)
+
+        self.assertEqual(self.course.refresh_enrollment_progress(), 1)
+
+        self.enrollment.refresh_from_db()
+        self.assertEqual(
+            (self.enrollment.completed_content_count, self.enrollment.total_content_count), (1, 3)
+        )
+        self.assertEqual(self.course.refresh_enrollment_progress(), 0)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class FanOutTests(CourseTestMixin, TestCase):
+
+    def setUp(self):
+        self.course = self.create_course(contents=1)
+        self.students = [self.create_student(email=f"student{i}@example.com") for i in range(3)]
+        self.digest_student = self.create_student(email="digest@example.com", notification_frequency="daily")
+
+    def test_recipients_are_split_into_fixed_size_chunks(self):
+        with mock.patch("lmsApp.fanout.group") as group:
+            fan_out(send_course_notification_chunk, "campaign", list(range(250)), self.course.pk, "updated", chunk_size=100)
+
+        signatures = group.call_args.args[0]
+        self.assertEqual([len(signature.args[1]) for signature in signatures], [100, 100, 50])
+        for signature in signatures:
+            self.assertEqual(signature.args[0], "campaign")
+            self.assertEqual(tuple(signature.args[2:]), (self.course.pk, "updated"))
+        group.return_value.apply_async.assert_called_once_with()
+
+    def test_no_recipients_queues_nothing(self):
+        with mock.patch("lmsApp.fanout.group") as group:
+            self.assertIsNone(fan_out(send_course_notification_chunk, "campaign", [], self.course.pk, "updated"))
+        group.assert_not_called()
+
+    def test_pending_recipients_skips_recorded_deliveries(self):
+        record_delivered("campaign-a", [1, 2])
+        record_delivered("campaign-a", [2])  # recording twice is harmless
+
+        self.assertEqual(pending_recipients("campaign-a", [1, 2, 3]), [3])
+        self.assertEqual(pending_recipients("campaign-b", [1, 2, 3]), [1, 2, 3])
+        self.assertEqual(BulkEmailDelivery.objects.filter(campaign="campaign-a").count(), 2)
+
+    def test_chunk_delivers_each_student_once(self):
+        student_ids = [student.pk for student in self.students] + [self.digest_student.pk]
+
+        send_course_notification_chunk.apply(args=["course_alert:test", student_ids, self.course.pk, "updated"]).get()
+
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), [s.email for s in self.students])
+        self.assertEqual(PendingNotification.objects.filter(user=self.digest_student).count(), 1)
+        self.assertEqual(pending_recipients("course_alert:test", student_ids), [])
+
+        # A redelivered chunk (e.g. after a worker crash) sends nothing new.
+        send_course_notification_chunk.apply(args=["course_alert:test", student_ids, self.course.pk, "updated"]).get()
+        self.assertEqual(len(mail.outbox), 3)
+        self.assertEqual(PendingNotification.objects.filter(user=self.digest_student).count(), 1)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class NotificationDigestTests(CourseTestMixin, TestCase):
+
+    def setUp(self):
+        self.course = self.create_course(contents=1)
+        self.daily = self.create_student(email="daily@example.com", notification_frequency="daily")
+        self.weekly = self.create_student(email="weekly@example.com", notification_frequency="weekly")
+
+    def hold(self, user, subject):
+        return PendingNotification.objects.create(user=user, kind="course_alert", subject=subject)
+
+    def test_daily_digest_collapses_pending_rows_into_one_email(self):
+        first, second = self.hold(self.daily, "First"), self.hold(self.daily, "Second")
+        weekly = self.hold(self.weekly, "Weekly only")
+
+        send_notification_digests.apply(args=["daily"]).get()
+
+        self.assertEqual([message.to for message in mail.outbox], [["daily@example.com"]])
+        for notification in (first, second, weekly):
+            notification.refresh_from_db()
+        self.assertIsNotNone(first.digested_at)
+        self.assertIsNotNone(second.digested_at)
+        self.assertIsNone(weekly.digested_at)
+
+        # Nothing left for a second run (or a retried one) to send.
+        send_notification_digests.apply(args=["daily"]).get()
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class ReminderRuleTests(CourseTestMixin, TestCase):
+    today = date(2026, 3, 10)
+
+    def setUp(self):
+        self.course = self.create_course(contents=1)
+        self.students = 0
+
+    def at(self, days, hour=12, minute=0):
+        return datetime.combine(self.today + timedelta(days=days), dt_time(hour, minute), tzinfo=dt_timezone.utc)
+
+    def enroll(self, frequency="immediate", **fields):
+        self.students += 1
+        student = self.create_student(email=f"learner{self.students}@example.com", notification_frequency=frequency)
+        return Enrollment.objects.create(student=student, course=self.course, **fields)
+
+    def matches(self, rule_name):
+        [rule] = get_rules(rule_name)
+        return set(rule.queryset(self.today).values_list("pk", flat=True))
+
+    def test_deadline_rules_select_only_their_day(self):
+        due_in_7 = self.enroll(due_date=self.at(7))
+        due_in_3 = self.enroll(due_date=self.at(3))
+        self.enroll(due_date=self.at(5))
+        self.enroll(due_date=self.at(7), completed=True, completed_at=self.at(-1))
+        self.enroll(due_date=self.at(7), reminder_7_sent=True)
+
+        self.assertEqual(self.matches("deadline_7day"), {due_in_7.pk})
+        self.assertEqual(self.matches("deadline_3day"), {due_in_3.pk})
+
+    def test_window_covers_the_whole_utc_day(self):
+        start_of_day = self.enroll(due_date=self.at(7, hour=0))
+        end_of_day = self.enroll(due_date=self.at(7, hour=23, minute=59))
+        self.enroll(due_date=self.at(8, hour=0))
+        self.enroll(due_date=self.at(6, hour=23, minute=59))
+
+        self.assertEqual(self.matches("deadline_7day"), {start_of_day.pk, end_of_day.pk})
+
+    def test_followup_rules_select_completions_in_their_window(self):
+        two_months = self.enroll(completed=True, completed_at=self.at(-60))
+        three_months = self.enroll(completed=True, completed_at=self.at(-90))
+        self.enroll(completed=True, completed_at=self.at(-75))
+        self.enroll(completed=True, completed_at=self.at(-60), followup_2mo_sent=True)
+
+        self.assertEqual(self.matches("followup_2mo"), {two_months.pk})
+        self.assertEqual(self.matches("followup_3mo"), {three_months.pk})
+
+    def test_run_emails_holds_digests_and_flips_the_flag(self):
+        immediate = self.enroll(due_date=self.at(7))
+        digest = self.enroll(frequency="daily", due_date=self.at(7))
+        [rule] = get_rules("deadline_7day")
+
+        handled = run_reminder_rule(rule, "lms.example.com", "https", today=self.today)
+
+        self.assertEqual(handled, 2)
+        self.assertEqual([message.to for message in mail.outbox], [[immediate.student.email]])
+        self.assertEqual(PendingNotification.objects.filter(user=digest.student, kind="reminder").count(), 1)
+        self.assertEqual(Notification.objects.filter(kind="reminder").count(), 2)
+        self.assertEqual(
+            set(Enrollment.objects.filter(reminder_7_sent=True).values_list("pk", flat=True)),
+            {immediate.pk, digest.pk},
+        )
+        self.assertEqual(run_reminder_rule(rule, "lms.example.com", "https", today=self.today), 0)
+
+
+class ConversionRequestTests(CourseTestMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        course = self.create_course(contents=1)
+        # .update() skips the upload signal, so nothing is dispatched before the test does.
+        Content.objects.filter(lesson__module__course=course).update(content_type="slide", file="lesson_files/deck.pptx")
+        self.content = Content.objects.get(lesson__module__course=course)
+
+    def test_unhashed_upload_is_hashed_by_the_worker_not_the_request(self):
+        with mock.patch("lmsApp.conversions.file_sha256") as file_sha256, \
+                mock.patch("lmsApp.tasks.convert_content_document.delay") as delay:
+            self.assertEqual(request_converted_document(self.content), ("preparing", None))
+            self.assertEqual(request_converted_document(self.content), ("preparing", None))
+
+        file_sha256.assert_not_called()
+        delay.assert_called_once_with(self.content.pk)
+
+    def test_hashed_upload_returns_its_ready_rendition(self):
+        self.content.file_hash, self.content.file_hash_name = "a" * 64, self.content.file.name
+        document = ConvertedDocument.objects.create(source_hash="a" * 64, status="ready")
+
+        with mock.patch("lmsApp.tasks.convert_content_document.delay") as delay:
+            self.assertEqual(request_converted_document(self.content), ("ready", document))
+        delay.assert_not_called()
+
+
+class OutboundEmailDeliveryTests(TestCase):
+    def test_one_backend_call_and_per_row_outcomes(self):
+        rows = [
+            OutboundEmail.objects.create(
+                subject=f"Subject {i}", html_body="<p>Body</p>", recipients=[f"student{i}@example.com"],
+            )
+            for i in range(3)
+        ]
+
+        def send_messages(messages):
+            raise GraphThrottledError("throttled", 30, unsent=[messages[1]], failed=[messages[2]])
+
+        connection = mock.Mock(send_messages=mock.Mock(side_effect=send_messages))
+        with mock.patch("django.core.mail.get_connection", return_value=connection):
+            deliver_outbound_emails.apply().get()
+
+        connection.send_messages.assert_called_once()
+        sent, throttled, failed = [OutboundEmail.objects.get(pk=row.pk) for row in rows]
+        self.assertEqual(sent.status, "sent")
+        self.assertEqual((throttled.status, throttled.attempts), ("pending", 0))
+        self.assertEqual((failed.status, failed.attempts), ("pending", 1))
+        self.assertGreater(throttled.next_attempt_at, rows[1].next_attempt_at)
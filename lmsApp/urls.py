@@ -6,6 +6,9 @@ urlpatterns = [
     path('logout/', views.user_logout, name='logout'),
     path('', views.dashboard, name='dashboard'),
     path('preferences/', views.preference_setup_view, name='preference_setup'),
+    path('preferences/notifications/', views.notification_preferences_view, name='notification_preferences'),
+    path('notifications/', views.notification_inbox, name='notification_inbox'),
+    path('notifications/<int:notification_id>/open/', views.notification_open, name='notification_open'),
 
     path('training-record/', views.training_record, name='training_record'),
     path('training-record/<int:user_id>/', views.training_record, name='training_record_for_user'),
@@ -42,6 +45,7 @@ urlpatterns = [
     # --- Certificate Functionality ---
     path('courses/<slug:course_slug>/issue-certificate/', views.issue_certificate, name='issue_certificate'),
     path('certificates/<uuid:certificate_id>/view/', views.view_certificate, name='view_certificate'),
+    path('certificates/<uuid:certificate_id>/status/', views.certificate_status, name='certificate_status'),
     path('certificates/', views.certificate_catalog, name='certificate_catalog'),
 
     # --- Module Management (Instructor) ---
@@ -59,6 +63,8 @@ urlpatterns = [
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/edit/', views.content_update, name='content_update'),
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/delete/', views.content_delete, name='content_delete'),
     path('courses/<slug:course_slug>/modules/<int:module_id>/lessons/<int:lesson_id>/contents/<int:content_id>/', views.content_detail, name='content_detail'),
+    path('contents/<int:content_id>/file/', views.content_file, name='content_file'),
+    path('contents/<int:content_id>/conversion/', views.content_conversion_status, name='content_conversion_status'),
 
     # --- Instructor Quiz Management ---
     path('instructor/quizzes/', views.quiz_list_instructor, name='quiz_list_instructor'),
@@ -104,6 +110,7 @@ urlpatterns = [
     path('instructor-training/review/', views.admin_training_review, name='admin_training_review'),
     path('my-trainings/', views.my_assigned_trainings, name='my_assigned_trainings'),
     path('my-trainings/<int:training_id>/update/', views.update_training_status, name='update_training_status'),
+    path('instructor-training/<int:training_id>/proof/', views.training_proof, name='training_proof'),
 
     path('instructor/curate-from-external/', views.create_course_from_external_resources, name='create_course_from_external_resources'),
     path('instructor/curate-from-external/<int:job_id>/progress/', views.external_resource_import_progress, name='external_resource_import_progress'),
@@ -114,4 +121,5 @@ urlpatterns = [
     path('student/external-training/<int:resource_id>/complete/', views.external_training_mark_complete, name='external_training_mark_complete'),
     path('external-training/', views.external_training_manage, name='external_training_manage'),
     path('external-training/<int:completion_id>/verify/', views.external_training_verify, name='external_training_verify'),
+    path('external-training/<int:completion_id>/proof/', views.external_training_proof, name='external_training_proof'),
 ]
\ No newline at end of file
@@ -1,18 +1,26 @@
 from django.core.mail import EmailMessage
-from django.template.loader import render_to_string
+from django.template.loader import render_to_string, get_template
+from django.core.mail import get_connection
 from django.conf import settings
-from datetime import datetime
+from django.db import transaction
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from datetime import datetime, timedelta
+import uuid
+from django.utils import timezone
 from django.contrib.sites.shortcuts import get_current_site
-import traceback
 from .models import *
 from django.contrib.sites.shortcuts import get_current_site
 from django.http import HttpRequest
 from django.urls import reverse
 from urllib.parse import urljoin
+from LMS.graph_email_backend import GraphSendError, GraphThrottledError
+import logging
 
+logger = logging.getLogger(__name__)
 
-def send_templated_email(template_name, subject, recipient_list, context, attachments=None):
 
+def prepare_email_context(context):
     context['current_year'] = datetime.now().year
     if 'protocol' not in context or 'domain' not in context:
         try:
@@ -23,8 +31,16 @@ def send_templated_email(template_name, subject, recipient_list, context, attach
         except Exception:
             context['protocol'] = 'http'
             context['domain'] = 'localhost'
+    return context
+
+
+def render_templated_email(template_name, context):
+    return render_to_string(template_name, prepare_email_context(context))
+
+
+def send_templated_email(template_name, subject, recipient_list, context, attachments=None):
 
-    html_content = render_to_string(template_name, context)
+    html_content = render_templated_email(template_name, context)
     email = EmailMessage(
         subject,
         html_content,
@@ -40,12 +56,148 @@ def send_templated_email(template_name, subject, recipient_list, context, attach
     try:
         email.send()
         return True
-    except Exception as e:
-        print(f"Error sending email: {e}")
-        traceback.print_exc()
+    except GraphThrottledError as e:
+        # Not lost: the outbox delivers it once Graph's back-off has passed.
+        for message in e.unsent:
+            requeue_unsent_email(message, e.retry_after, template_name=template_name)
+        return True
+    except Exception:
+        logger.exception(f"Error sending email ({template_name}) to {len(recipient_list)} recipient(s)")
         return False
     
 
+BULK_EMAIL_CHUNK_SIZE = 100
+
+
+def _deliver_bulk_chunk(connection, email_messages, template_name):
+    """Returns the messages accepted: sent, or re-queued to the outbox when throttled."""
+    try:
+        connection.send_messages(email_messages)
+        return email_messages
+    except GraphThrottledError as e:
+        for message in e.unsent:
+            requeue_unsent_email(message, e.retry_after, template_name=template_name)
+        return [m for m in email_messages if m not in e.failed]
+    except GraphSendError as e:
+        logger.error(f"Error sending bulk email ({template_name}): {e}")
+        return [m for m in email_messages if m not in e.failed]
+    except Exception:
+        logger.exception(f"Error sending bulk email ({template_name})")
+        return []
+
+
+def send_bulk_templated_email(template_name, messages, shared_context=None, on_accepted=None):
+    """
+    Sends one template to many recipients. The template is loaded and the shared
+    context (year, site, course fields, ...) is built once; each item of
+    `messages` is (subject, recipient_list, per_recipient_context) and only that
+    part is merged in per render. Messages are handed to the transport in chunks
+    over one connection. Returns the number of messages accepted (sent, or
+    re-queued to the outbox when throttled).
+
+    Items may carry a fourth element, a delivery key; on_accepted(keys) is then
+    called after each transport chunk with the keys of the accepted messages.
+    """
+    template = get_template(template_name)
+    shared_context = prepare_email_context(dict(shared_context or {}))
+
+    accepted = 0
+    chunk = []
+    skipped_keys = []
+
+    def deliver(chunk):
+        delivered = _deliver_bulk_chunk(connection, chunk, template_name)
+        if on_accepted and delivered:
+            on_accepted([m.delivery_key for m in delivered])
+        return len(delivered)
+
+    connection = get_connection()
+    try:
+        connection.open()
+        for subject, recipient_list, context, *key in messages:
+            recipient_list = [r for r in recipient_list if r]
+            if not recipient_list:
+                skipped_keys.extend(key)  # nothing to deliver counts as done
+                continue
+            email = EmailMessage(
+                subject,
+                template.render({**shared_context, **context}),
+                settings.EMAIL_SENDER,
+                recipient_list,
+                connection=connection,
+            )
+            email.content_subtype = "html"
+            email.delivery_key = key[0] if key else None
+            chunk.append(email)
+            if len(chunk) >= BULK_EMAIL_CHUNK_SIZE:
+                accepted += deliver(chunk)
+                chunk = []
+        if chunk:
+            accepted += deliver(chunk)
+    finally:
+        connection.close()
+    if on_accepted and skipped_keys:
+        on_accepted(skipped_keys)
+    return accepted
+
+
+def split_by_notification_frequency(users):
+    """Returns (immediate, digest) lists according to each user's notification_frequency."""
+    immediate, digest = [], []
+    for user in users:
+        (immediate if user.notification_frequency == 'immediate' else digest).append(user)
+    return immediate, digest
+
+
+def queue_digest_notifications(kind, entries):
+    """Holds notifications for digest users. entries: iterable of (user, subject, message, url)."""
+    return PendingNotification.objects.bulk_create([
+        PendingNotification(user=user, kind=kind, subject=subject, message=message, url=url)
+        for user, subject, message, url in entries
+    ])
+
+
+def requeue_unsent_email(message, retry_after, template_name=""):
+    """Moves an EmailMessage the transport could not send into the outbox, due after retry_after seconds."""
+    stored_attachments = []
+    for filename, content, mimetype in message.attachments:
+        if isinstance(content, str):
+            content = content.encode("utf-8")
+        storage_name = default_storage.save(f"outbox_attachments/{uuid.uuid4().hex}/{filename}", ContentFile(content))
+        stored_attachments.append({'storage_name': storage_name, 'filename': filename, 'mimetype': mimetype})
+    for attachment in getattr(message, 'storage_attachments', []):
+        stored_attachments.append({key: attachment[key] for key in ('storage_name', 'filename', 'mimetype')})
+
+    return OutboundEmail.objects.create(
+        template_name=template_name,
+        subject=message.subject,
+        recipients=list(message.to),
+        html_body=message.body,
+        attachments=stored_attachments,
+        next_attempt_at=timezone.now() + timedelta(seconds=retry_after),
+    )
+
+
+def queue_templated_email(template_name, subject, recipient_list, context, attachments=None):
+    """
+    Renders the template now and stores the message in the outbox as part of the
+    caller's transaction; a Celery worker delivers it once the transaction commits.
+    attachments are files already in default storage:
+    [{'storage_name': ..., 'filename': ..., 'mimetype': ...}].
+    """
+    from .tasks import deliver_outbound_emails
+
+    outbound = OutboundEmail.objects.create(
+        template_name=template_name,
+        subject=subject,
+        recipients=[r for r in recipient_list if r],
+        html_body=render_templated_email(template_name, context),
+        attachments=attachments or [],
+    )
+    transaction.on_commit(lambda: deliver_outbound_emails.delay())
+    return outbound
+
+
 def build_absolute_url(request=None, url_path=""):
 
     if request:
@@ -68,45 +220,49 @@ def build_absolute_url(request=None, url_path=""):
 
 
 
-def send_course_notification(course, matching_students, action_type, request=None):
+def send_course_notification(course, matching_students, action_type, request=None, on_accepted=None):
     """
-    Sends a personalized email notification to matching students using send_templated_email.
+    Sends a personalized email notification to each matching student using send_bulk_templated_email.
+    Returns the number of messages sent. on_accepted(student_ids) is called for
+    students emailed or held for their digest.
     """
-    recipient_list = list(matching_students.values_list('email', flat=True).distinct())
-    if not recipient_list:
-        return
-
     url_path = reverse('course_detail', args=[course.slug])
     course_url = build_absolute_url(request, url_path)
 
     subject = f"New Course Alert: {course.title} is now {action_type}!"
 
-    for student in matching_students:
-        subject = f"New Course Alert: {course.title} is now {action_type}!"
-        student_name = student.get_full_name() or student.first_name or student.email.split('@')[0]
-        
-        try:
-            if hasattr(course, 'instructor') and callable(getattr(course.instructor, 'get_full_name', None)):
-                instructor_name = course.instructor.get_full_name()
-            else:
-                instructor_name = 'The LMS Team'
-        except Exception:
-            instructor_name = 'The LMS Team'
+    try:
+        instructor_name = course.instructor.get_full_name() or 'The LMS Team'
+    except Exception:
+        instructor_name = 'The LMS Team'
 
-    context = {
+    shared_context = {
         'course_title': course.title,
-        'student_name': student_name,
         'instructor_name': instructor_name,
         'action_type': action_type,
         'course_description': course.description,
         'course_url': course_url,
     }
+    if request is not None:
+        shared_context['request'] = request
 
-    send_templated_email(
-        template_name='emails/new_course_notification.html',
-        subject=subject,
-        recipient_list=[student.email],
-        context=context
+    immediate_students, digest_students = split_by_notification_frequency(matching_students)
+    queue_digest_notifications('course_alert', (
+        (student, subject, f"{course.title} is now {action_type}.", course_url) for student in digest_students
+    ))
+    if on_accepted and digest_students:
+        on_accepted([student.id for student in digest_students])
+
+    def student_messages():
+        for student in immediate_students:
+            if not student.email:
+                yield subject, [], {}, student.id
+                continue
+            student_name = student.get_full_name() or student.first_name or student.email.split('@')[0]
+            yield subject, [student.email], {'student_name': student_name}, student.id
+
+    return send_bulk_templated_email(
+        'emails/new_course_notification.html', student_messages(), shared_context, on_accepted=on_accepted
     )
 
 
@@ -4,7 +4,7 @@ from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
 from django.views.decorators.http import require_POST
 from django.db import transaction
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, Http404
 from django.template.loader import render_to_string, get_template
 from django.db.models import Q, Max, Count, Subquery, OuterRef, DecimalField
 from django.db.models.functions import Coalesce
@@ -16,12 +16,12 @@ from google import genai
 from google.genai import types
 from io import BytesIO
 from .services import PDFCourseExtractorService, PDFExtractionError
-try:
-    import weasyprint
-    WEASYPRINT_AVAILABLE = True
-except OSError:
-    WEASYPRINT_AVAILABLE = False
-    print("WARNING: WeasyPrint system libraries not available.")
+from .progress import EnrollmentProgressService, LearnerOutline, is_module_unlocked_for_student
+from .notifications import notify, notify_many, mark_read
+from .fanout import fan_out, new_campaign_id
+from .certificates import certificate_renderer_available
+from .downloads import serve_field_file
+from .conversions import request_converted_document
 from django.conf import settings
 import re
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
@@ -49,180 +49,6 @@ if sys.platform.startswith('win'):
     except ImportError:
         pass
 
-CONVERTED_PDF_DIR = 'converted_pdfs'
-CONVERTED_PDF_PATH = os.path.join(settings.MEDIA_ROOT, CONVERTED_PDF_DIR)
-
-LIBREOFFICE_PATH = (
-    r"C:\Program Files\LibreOffice\program\soffice.exe"
-    if sys.platform.startswith('win')
-    else 'libreoffice'
-)
-
-USE_AZURE = getattr(settings, 'USE_AZURE_STORAGE', False) and not settings.DEBUG
-
-# -------------------------------------------------------------------
-# Helpers
-# -------------------------------------------------------------------
-def _run_libreoffice(input_path: str, output_dir: str) -> str:
-    """
-    Run LibreOffice headless conversion.
-    Returns the absolute path of the generated PDF.
-    Raises on any failure.
-    """
-    if sys.platform.startswith('win') and not os.path.exists(LIBREOFFICE_PATH):
-        raise FileNotFoundError(
-            f"LibreOffice not found at: {LIBREOFFICE_PATH}\n"
-            "Download from https://www.libreoffice.org/download/download-libreoffice/"
-        )
-
-    command = [
-        LIBREOFFICE_PATH,
-        '--headless',
-        '--convert-to', 'pdf',
-        '--outdir', output_dir,
-        input_path,
-    ]
-
-    result = subprocess.run(command, capture_output=True, text=True, timeout=120)
-
-    if result.returncode != 0:
-        raise RuntimeError(
-            f"LibreOffice exited with code {result.returncode}.\n"
-            f"STDOUT: {result.stdout}\nSTDERR: {result.stderr}"
-        )
-
-    base_name = os.path.basename(input_path).rsplit('.', 1)[0]
-    pdf_path = os.path.join(output_dir, base_name + '.pdf')
-
-    if not os.path.exists(pdf_path):
-        raise FileNotFoundError(
-            f"LibreOffice ran but PDF not found at: {pdf_path}\nSTDOUT: {result.stdout}"
-        )
-
-    return pdf_path
-
-# --- Cross-Platform PPTX to PDF Conversion ---
-
-def convert_pptx_to_pdf(content_file_field, request=None):
-    """
-    Convert a PPTX FileField to PDF.
-
-    - Local (DEBUG=True):  reads from disk, writes PDF to MEDIA_ROOT/converted_pdfs/,
-                           returns a local media URL.
-    - Production (Azure):  downloads blob to a temp file, converts, uploads PDF back
-                           to Azure Blob under converted_pdfs/, returns the blob URL.
-
-    Returns the URL string on success, or None on failure.
-    """
-    unique_suffix = f"{os.getpid()}_{os.urandom(4).hex()}"
-
-    # ------------------------------------------------------------------
-    # PRODUCTION PATH — Azure Blob Storage
-    # ------------------------------------------------------------------
-    if USE_AZURE:
-        tmp_pptx = None
-        tmp_pdf_dir = None
-        try:
-            # 1. Download the PPTX from blob to a local temp file
-            tmp_pptx = tempfile.NamedTemporaryFile(suffix='.pptx', delete=False)
-            with content_file_field.open('rb') as blob_file:
-                tmp_pptx.write(blob_file.read())
-            tmp_pptx.flush()
-            tmp_pptx.close()
-
-            # 2. Convert using LibreOffice into a temp output directory
-            tmp_pdf_dir = tempfile.mkdtemp()
-            pdf_local_path = _run_libreoffice(tmp_pptx.name, tmp_pdf_dir)
-
-            # 3. Upload the resulting PDF back to Azure Blob
-            base_name = os.path.basename(content_file_field.name).rsplit('.', 1)[0]
-            blob_pdf_name = f"{CONVERTED_PDF_DIR}/{base_name}_{unique_suffix}.pdf"
-
-            with open(pdf_local_path, 'rb') as pdf_file:
-                pdf_content = ContentFile(pdf_file.read(), name=blob_pdf_name)
-
-            # Use the default storage backend (AzureStorage) to save
-            from django.core.files.storage import default_storage
-            saved_path = default_storage.save(blob_pdf_name, pdf_content)
-            pdf_url = default_storage.url(saved_path)
-
-            logger.info(f"Azure conversion successful. Blob URL: {pdf_url}")
-            return pdf_url
-
-        except FileNotFoundError as e:
-            logger.error(f"LibreOffice Not Found: {e}")
-            if request:
-                messages.error(request, f"LibreOffice is not installed or not found. {e}")
-
-        except subprocess.TimeoutExpired:
-            logger.error("Conversion timed out after 120 seconds.")
-            if request:
-                messages.error(request, "Presentation conversion timed out. Try a smaller file.")
-
-        except Exception as e:
-            logger.error(f"Azure conversion error:\n{traceback.format_exc()}")
-            if request:
-                messages.error(request, f"Conversion failed: {e}")
-
-        finally:
-            # clean up local temp files
-            if tmp_pptx and os.path.exists(tmp_pptx.name):
-                os.unlink(tmp_pptx.name)
-            if tmp_pdf_dir and os.path.isdir(tmp_pdf_dir):
-                import shutil
-                shutil.rmtree(tmp_pdf_dir, ignore_errors=True)
-
-        return None
-
-    # ------------------------------------------------------------------
-    # LOCAL PATH — Filesystem Storage
-    # ------------------------------------------------------------------
-    else:
-        pptx_file_path = content_file_field.path  # safe locally
-
-        if not os.path.exists(pptx_file_path):
-            logger.error(f"File not found: {pptx_file_path}")
-            if request:
-                messages.error(request, "Presentation file not found on server.")
-            return None
-
-        os.makedirs(CONVERTED_PDF_PATH, exist_ok=True)
-
-        base_name = os.path.basename(pptx_file_path).rsplit('.', 1)[0]
-        pdf_filename = f"{base_name}_{unique_suffix}.pdf"
-        pdf_file_path_abs = os.path.join(CONVERTED_PDF_PATH, pdf_filename)
-
-        try:
-            raw_pdf_path = _run_libreoffice(pptx_file_path, CONVERTED_PDF_PATH)
-
-            # Rename to unique name to avoid collisions
-            os.rename(raw_pdf_path, pdf_file_path_abs)
-
-            # Build a relative media URL
-            relative = os.path.join(CONVERTED_PDF_DIR, pdf_filename).replace('\\', '/')
-            pdf_url = settings.MEDIA_URL + relative
-
-            logger.info(f"Local conversion successful: {pdf_file_path_abs}")
-            return pdf_url
-
-        except FileNotFoundError as e:
-            logger.error(f"LibreOffice Not Found: {e}")
-            if request:
-                messages.error(request, f"LibreOffice is not installed or not found. {e}")
-
-        except subprocess.TimeoutExpired:
-            logger.error("Conversion timed out after 120 seconds.")
-            if request:
-                messages.error(request, "Presentation conversion timed out. Try a smaller file.")
-
-        except Exception as e:
-            logger.error(f"Local conversion error:\n{traceback.format_exc()}")
-            if request:
-                messages.error(request, f"Conversion failed: {e}")
-
-        return None
-    
-
 
 def send_enrollment_email_to_instructor(request, enrollment):
     """
@@ -251,7 +77,7 @@ def send_enrollment_email_to_instructor(request, enrollment):
             'dashboard_url': f"{protocol}://{domain}{reverse('dashboard')}",
         }
         
-        send_templated_email(
+        queue_templated_email(
             'emails/student_enrolled.html',
             email_subject,
             [instructor.email],
@@ -259,36 +85,6 @@ def send_enrollment_email_to_instructor(request, enrollment):
         )
 
 
-def send_completion_email_to_hr(request, enrollment):
-    """
-    Sends an email notification to all active HR users upon a student's course completion.
-    """
-    if enrollment.completed:
-        # Get all active users marked as HR
-        hr_users = User.objects.filter(is_hr=True, is_active=True).values_list('email', flat=True)
-        hr_emails = [email for email in hr_users if email]
-
-        if hr_emails:
-            course = enrollment.course
-            student = enrollment.student
-            
-            email_subject = f"ACTION REQUIRED: Course Completion for Appraisal - {course.title}"
-            email_context = {
-                'student_name': student.get_full_name() or student.email,
-                'course_title': course.title,
-                'completion_date': enrollment.completed_at.strftime('%Y-%m-%d'),
-                'enrollment_type': 'Self-Enrolled' if enrollment.enrolled_at == enrollment.completed_at else 'Assigned',
-                'dashboard_url': request.build_absolute_uri(reverse('hr_appraisal_dashboard')),
-            }
-            
-            send_templated_email(
-                'emails/hr_completion_notification.html',
-                email_subject,
-                hr_emails,
-                email_context
-            )
-
-
 def strip_html_tags(text):
     if not text:
         return ""
@@ -320,6 +116,43 @@ def preference_setup_view(request):
     return render(request, 'accounts/preference_setup.html', {'form': form, 'page_title': 'Setup Your Profile'})
 
 
+@login_required
+def notification_preferences_view(request):
+    """
+    Lets a user choose immediate emails or a daily/weekly digest.
+    """
+    if request.method == 'POST':
+        form = NotificationPreferenceForm(request.POST, instance=request.user)
+        if form.is_valid():
+            form.save()
+            messages.success(request, "Your notification preferences have been saved.")
+            return redirect('notification_preferences')
+        messages.error(request, "Please select a valid option.")
+    else:
+        form = NotificationPreferenceForm(instance=request.user)
+
+    return render(request, 'accounts/notification_preferences.html', {'form': form, 'page_title': 'Notification Preferences'})
+
+
+@login_required
+def notification_inbox(request):
+    if request.method == 'POST' and request.POST.get('action') == 'mark_all_read':
+        mark_read(request.user.pk)
+        return redirect('notification_inbox')
+
+    notifications = Notification.objects.filter(user=request.user)
+    page_obj = Paginator(notifications, 20).get_page(request.GET.get('page'))
+    return render(request, 'notifications/inbox.html', {'page_obj': page_obj})
+
+
+@login_required
+def notification_open(request, notification_id):
+    notification = get_object_or_404(Notification, id=notification_id, user=request.user)
+    if not notification.is_read:
+        mark_read(request.user.pk, [notification.id])
+    return redirect(notification.url or 'notification_inbox')
+
+
 # --- Helper functions for role-based access control ---
 
 def is_admin(user):
@@ -344,13 +177,19 @@ def is_instructor_or_admin(user):
     return user.is_authenticated and (user.is_instructor or user.is_staff)
 
 def _is_module_accessible_to_student(module, student):
-    earlier_modules = Module.objects.filter(
-        course=module.course, order__lt=module.order
-    ).order_by('order')
-    for earlier_module in earlier_modules:
-        if not earlier_module.is_lessons_completed_by_student(student):
-            return False
-    return True
+    return is_module_unlocked_for_student(module, student)
+
+def _content_access(user, course, module):
+    """Returns (can_view, module_locked) for a content page or file in the given module."""
+    if not user.is_authenticated:
+        return False, False
+    if (user.is_instructor and course.instructor == user) or user.is_staff:
+        return True, False
+    if user.is_student and course.is_published and Enrollment.objects.filter(student=user, course=course).exists():
+        if _is_module_accessible_to_student(module, user):
+            return True, False
+        return False, True
+    return False, False
 
 
 # --- Authentication and Dashboard Views ---
@@ -839,96 +678,14 @@ def course_detail(request, slug):
             messages.error(request, "This course is not yet published or you are not enrolled.")
             return redirect('dashboard')
 
-    modules_queryset = Module.objects.filter(course=course).order_by('order').prefetch_related(
-        Prefetch('lessons', queryset=Lesson.objects.order_by('order').prefetch_related(
-            Prefetch('contents', queryset=Content.objects.order_by('order')),
-        ))
+    full_access = (
+        (request.user.is_instructor and course.instructor == request.user)
+        or request.user.is_staff
+    )
+    track_progress = request.user.is_student and is_enrolled
+    outline = LearnerOutline.build(
+        course, request.user, full_access=full_access, track_progress=track_progress
     )
-
-    modules_data = []
-    previous_module_lessons_completed = True
-    total_lessons_count = 0
-    total_contents_count = 0
-
-    for module in modules_queryset:
-        module_accessible = False
-
-        if request.user.is_instructor and course.instructor == request.user:
-            module_accessible = True
-        elif request.user.is_staff:
-            module_accessible = True
-        elif request.user.is_student and is_enrolled:
-            if previous_module_lessons_completed:
-                module_accessible = True
-
-        current_module_is_completed = False
-        current_module_lessons_completed = False
-        if request.user.is_student and is_enrolled and module_accessible:
-            current_module_lessons_completed = module.is_lessons_completed_by_student(request.user)
-            current_module_is_completed = module.is_completed_by_student(request.user)
-
-        lessons_data = []
-        # Track sequential lesson access within the accessible module
-        previous_lesson_completed = True
-
-        for lesson in module.lessons.all():
-            total_lessons_count += 1
-            lesson_accessible = False
-
-            if request.user.is_instructor and course.instructor == request.user:
-                lesson_accessible = True
-            elif request.user.is_staff:
-                lesson_accessible = True
-            elif request.user.is_student and is_enrolled and module_accessible:
-                if previous_lesson_completed:
-                    lesson_accessible = True
-
-            lesson_is_completed = False
-            if request.user.is_student and is_enrolled:
-                lesson_is_completed = lesson.is_completed_by_student(request.user)
-
-            contents_data = []
-            for content_item in lesson.contents.all():
-                total_contents_count += 1
-                content_is_completed = False
-                if request.user.is_student and is_enrolled:
-                    content_is_completed = content_item.is_completed_by_student(request.user)
-
-                contents_data.append({
-                    'id': content_item.id,
-                    'title': content_item.title,
-                    'content_type': content_item.content_type,
-                    'is_completed': content_is_completed,
-                    'get_content_type_display': content_item.get_content_type_display(),
-                })
-
-            lessons_data.append({
-                'id': lesson.id,
-                'title': lesson.title,
-                'description': lesson.description,
-                'order': lesson.order,
-                'contents': contents_data,
-                'is_completed': lesson_is_completed,
-                'is_accessible': lesson_accessible,
-            })
-
-            # Update status for next lesson in sequence
-            previous_lesson_completed = lesson_is_completed
-
-        modules_data.append({
-            'id': module.id,
-            'title': module.title,
-            'description': module.description,
-            'order': module.order,
-            'lessons': lessons_data,
-            'is_accessible': module_accessible,
-            'is_completed': current_module_is_completed,
-            'quiz': getattr(module, 'quiz', None),
-            'quiz_passed': getattr(module, 'quiz_passed', False),
-            'lessons_completed': current_module_lessons_completed,
-        })
-
-        previous_module_lessons_completed = current_module_lessons_completed
 
     # Check for quiz status
     has_passed_final_quiz = False
@@ -937,11 +694,7 @@ def course_detail(request, slug):
     if hasattr(course, 'quiz'):
         course_quiz = course.quiz
         if request.user.is_student and is_enrolled:
-            has_passed_final_quiz = StudentQuizAttempt.objects.filter(
-                student=request.user,
-                quiz=course_quiz,
-                passed=True
-            ).exists()
+            has_passed_final_quiz = outline.has_passed_quiz(course_quiz.id)
 
             if course_quiz.max_attempts:
                 total_attempts = StudentQuizAttempt.objects.filter(
@@ -960,9 +713,9 @@ def course_detail(request, slug):
 
     context = {
         'course': course,
-        'modules': modules_data,
-        'total_lessons_count': total_lessons_count,
-        'total_contents_count': total_contents_count,
+        'modules': outline.modules,
+        'total_lessons_count': outline.total_lessons_count,
+        'total_contents_count': outline.total_contents_count,
         'is_enrolled': is_enrolled,
         'enrollment': enrollment,
         'course_quiz': course_quiz,
@@ -1266,19 +1019,7 @@ def content_detail(request, course_slug, module_id, lesson_id, content_id):
             content=content
         )
 
-    can_view_content_page = False
-    module_locked = False
- 
-    if request.user.is_authenticated:
-        if request.user.is_instructor and course.instructor == request.user:
-            can_view_content_page = True
-        elif request.user.is_staff:
-            can_view_content_page = True
-        elif request.user.is_student and course.is_published and Enrollment.objects.filter(student=request.user, course=course).exists():
-            if _is_module_accessible_to_student(module, request.user):
-                can_view_content_page = True
-            else:
-                module_locked = True
+    can_view_content_page, module_locked = _content_access(request.user, course, module)
  
     if not can_view_content_page:
         if module_locked:
@@ -1289,40 +1030,30 @@ def content_detail(request, course_slug, module_id, lesson_id, content_id):
     
     # --- CONTENT DISPLAY LOGIC ---
     content_file_url = None
+    conversion_status = None
     slide_images = [] 
 
     if content.file:
 
         if content.content_type == 'pdf':
-            file_url = content.file.url
-            if file_url.startswith('http'):
-                content_file_url = file_url
-            else:
-                content_file_url = request.build_absolute_uri(quote(file_url))
-
-        elif content.content_type == 'slide':
-            # Pass the FileField itself — convert_pptx_to_pdf handles both backends
-            pdf_url = convert_pptx_to_pdf(content.file, request)
-            if pdf_url:
-                # Azure returns a full https:// URL; local returns a /media/... path
-                if pdf_url.startswith('http'):
-                    content_file_url = pdf_url
-                else:
-                    content_file_url = request.build_absolute_uri(quote(pdf_url))
-            else:
+            content_file_url = request.build_absolute_uri(reverse('content_file', kwargs={'content_id': content.id}))
+
+        elif content.content_type in ('slide', 'document'):
+            # Converted once per file hash by the conversion workers (on upload, or on first view)
+            file_url = reverse('content_file', kwargs={'content_id': content.id})
+            conversion_status, _ = request_converted_document(content)
+            if conversion_status == 'ready':
+                content_file_url = request.build_absolute_uri(f"{file_url}?variant=pdf")
+            elif conversion_status == 'failed':
                 messages.warning(
                     request,
-                    "Server failed to render the presentation for inline viewing. "
-                    "Please download the original file."
+                    "The document could not be prepared for inline viewing. "
+                    "Please download the original file instead."
                 )
-                content_file_url = request.build_absolute_uri(quote(content.file.url))
+                content_file_url = request.build_absolute_uri(file_url)
 
         elif content.content_type == 'video' and not content.video_url:
-            file_url = content.file.url
-            if file_url.startswith('http'):
-                content_file_url = file_url
-            else:
-                content_file_url = request.build_absolute_uri(quote(file_url))
+            content_file_url = request.build_absolute_uri(reverse('content_file', kwargs={'content_id': content.id}))
 
     quiz_obj = None
     if content.content_type == 'quiz':
@@ -1339,12 +1070,53 @@ def content_detail(request, course_slug, module_id, lesson_id, content_id):
         'student_progress': student_progress,
         'GEMINI_API_KEY': settings.GEMINI_API_KEY,
         'content_file_url': content_file_url,
+        'conversion_status': conversion_status,
         'slide_images': slide_images,
         'quiz_obj': quiz_obj,
     }
     return render(request, 'content_detail.html', context)
 
 
+@login_required
+def content_conversion_status(request, content_id):
+    """Polled by the content page while a slide deck or document is being converted to PDF."""
+    content = get_object_or_404(
+        Content.objects.select_related('lesson__module__course'), id=content_id
+    )
+    module = content.lesson.module
+    can_view, _ = _content_access(request.user, module.course, module)
+    if not can_view or content.content_type not in ('slide', 'document') or not content.file:
+        raise Http404("Content not found.")
+
+    status, _ = request_converted_document(content)
+    return JsonResponse({'status': status})
+
+
+@login_required
+def content_file(request, content_id):
+    """
+    Serves a content's uploaded file to anyone allowed to view the content page;
+    ?variant=pdf serves the stored PDF rendition of a converted slide deck or document instead.
+    """
+    content = get_object_or_404(
+        Content.objects.select_related('lesson__module__course__instructor'), id=content_id
+    )
+    module = content.lesson.module
+    can_view, _ = _content_access(request.user, module.course, module)
+    if not can_view:
+        raise Http404("Content not found.")
+
+    if request.GET.get('variant') == 'pdf':
+        status, document = request_converted_document(content)
+        if status != 'ready':
+            raise Http404("No converted document.")
+        base_name = os.path.splitext(os.path.basename(content.file.name))[0]
+        return serve_field_file(
+            request, document.pdf_file, filename=f"{base_name}.pdf", content_type='application/pdf'
+        )
+    return serve_field_file(request, content.file)
+
+
 @login_required
 @user_passes_test(is_student)
 def enroll_course(request, slug):
@@ -1400,7 +1172,7 @@ def enroll_course(request, slug):
                 'domain': domain,
                 'current_year': current_year,
             }
-            send_templated_email(
+            queue_templated_email(
                 'emails/enrollment_confirmation.html',
                 email_subject,
                 [student.email],
@@ -1447,8 +1219,6 @@ def mark_content_completed(request, course_slug, module_id, lesson_id, content_i
     except Enrollment.DoesNotExist:
         return JsonResponse({"success": False, "error": "Not enrolled."}, status=403)
 
-    was_completed_before = enrollment.completed
-
     try:
         with transaction.atomic():
             progress, created = StudentContentProgress.objects.get_or_create(
@@ -1469,10 +1239,8 @@ def mark_content_completed(request, course_slug, module_id, lesson_id, content_i
             else:
                 status_message = "marked as complete."
 
-            enrollment._sync_completion_status()
-
-            if not was_completed_before and enrollment.completed:
-                transaction.on_commit(lambda: send_completion_email_to_hr(request, enrollment))
+            # StudentContentProgress.save syncs completion on the flip; a completed
+            # enrollment records a CourseCompletionEvent for the Celery consumer.
 
     except Exception as e:
         print(f"Error updating content progress: {e}")
@@ -1493,7 +1261,7 @@ def quiz_take(request, course_slug):
         messages.error(request, "This quiz is not currently available.")
         return redirect('course_detail', slug=course.slug)
 
-    if not enrollment.is_content_completed:
+    if not enrollment.all_content_completed:
         messages.error(request, "You must complete all course content before taking this assessment.")
         return redirect('course_detail', slug=course.slug)
 
@@ -1602,7 +1370,7 @@ def quiz_submit(request, course_slug):
         messages.error(request, "You are not authorized to submit this quiz.")
         return redirect('course_detail', slug=course.slug)
 
-    if not enrollment.is_content_completed:
+    if not enrollment.all_content_completed:
         messages.error(request, "You must complete all course content before submitting this assessment.")
         return redirect('course_detail', slug=course.slug)
 
@@ -1753,17 +1521,19 @@ def quiz_result(request, course_slug, attempt_id):
 
 @login_required
 @user_passes_test(is_student)
+@require_POST
 def issue_certificate(request, course_slug):
     """
     Allows a student to claim/issue a certificate for a completed course.
-    Generates, saves, and sends the PDF certificate as an ATTACHMENT via email.
+    Creates the certificate in 'generating' state and hands rendering, storage
+    and the emailed PDF to a background task; the certificate page polls until it is ready.
     """
     course = get_object_or_404(Course, slug=course_slug)
     student = request.user
 
     enrollment = get_object_or_404(Enrollment, student=student, course=course)
 
-    if not WEASYPRINT_AVAILABLE:
+    if not certificate_renderer_available():
         messages.error(request, "Certificate generation is currently unavailable. Please contact support.")
         return redirect('dashboard')
 
@@ -1773,109 +1543,51 @@ def issue_certificate(request, course_slug):
             return JsonResponse({'success': False, 'error': 'Course not completed.'}, status=400)
         return redirect('dashboard')
 
-    if Certificate.objects.filter(student=student, course=course).exists():
+    current_site = get_current_site(request)
+    protocol = 'https' if request.is_secure() else 'http'
+    domain = current_site.domain
+
+    certificate = Certificate.objects.filter(student=student, course=course).first()
+    if certificate and certificate.status != 'failed':
         messages.info(request, "You have already claimed a certificate for this course.")
-        certificate = Certificate.objects.get(student=student, course=course)
-        
         if is_ajax(request):
             return JsonResponse({'success': True, 'message': 'Certificate already claimed.', 'redirect_url': str(reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id}))})
         return redirect('view_certificate', certificate_id=certificate.certificate_id)
 
     try:
         with transaction.atomic():
-            certificate = Certificate.objects.create(
-                student=student,
-                course=course,
-            )
-            
-            # --- Get necessary global variables ---
-            current_site = get_current_site(request)
-            protocol = 'https' if request.is_secure() else 'http'
-            domain = current_site.domain
-            current_year = timezone.now().year
-
-            # --- PDF GENERATION ---
-            template_path = 'student/certificate_template.html'
-            context = {
-                'certificate': certificate,
-                'student_name': student.get_full_name() or student.email, 
-                'course_title': course.title,
-                'instructor_name': course.instructor.get_full_name() or course.instructor.email, 
-                'issue_date': certificate.issue_date,
-                'certificate_id': certificate.certificate_id,
-                'request': request, 
-                'protocol': protocol, 
-                'domain': domain, 
-                'current_year': current_year, 
-            }
-            template = get_template(template_path)
-            html_string = template.render(context)
-            
-            result_file = BytesIO()
-            
-            # 1. Create the HTML object, using request.build_absolute_uri() as the base_url
-            html_object = weasyprint.HTML(
-                string=html_string, 
-                base_url=request.build_absolute_uri()
-            )
-
-            # 2. Write the PDF output to the BytesIO buffer
-            html_object.write_pdf(result_file)
-
-            # 3. Handle result file and save
-            result_file.seek(0)
-            safe_course_title = re.sub(r'[^A-Za-z0-9_-]', '_', course.title)
-
-            file_name = f"{safe_course_title}.pdf"
-            certificate.pdf_file.save(file_name, result_file)
-            certificate.save()
-            
-            
-            # --- Send Course Completion Email with PDF Attachment ---
-            messages.success(request, f'Congratulations! Your certificate for "{course.title}" has been issued and sent to your email.')
-            
-            email_subject = f"Congratulations! You've Completed {course.title}!"
-            email_context = {
-                'student_name': student.get_full_name() or student.email,
-                'course_title': course.title,
-                'completion_date': certificate.issue_date,
-                'certificate_url': f"{protocol}://{domain}{reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id})}",
-                'current_year': current_year,
-            }
-            
-            # Open the saved file from storage/disk for reading
-            with certificate.pdf_file.open('rb') as f:
-                pdf_attachment = (
-                    file_name,
-                    f.read(),
-                    'application/pdf'
-                )
-
-                send_templated_email(
-                    'emails/course_completion.html',
-                    email_subject,
-                    [student.email],
-                    email_context,
-                    attachments=[pdf_attachment]
+            if certificate:
+                # Retry a generation that previously gave up.
+                certificate.status = 'generating'
+                certificate.generation_error = None
+                certificate.status_updated_at = timezone.now()
+                certificate.save(update_fields=['status', 'generation_error', 'status_updated_at'])
+            else:
+                certificate = Certificate.objects.create(
+                    student=student,
+                    course=course,
+                    status='generating',
                 )
-
-            if is_ajax(request):
-                return JsonResponse({
-                    'success': True, 
-                    'message': 'Certificate issued!', 
-                    'redirect_url': str(reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id}))
-                })
-            return redirect('view_certificate', certificate_id=certificate.certificate_id)
-            
+            certificate_pk = certificate.pk
+            transaction.on_commit(
+                lambda: generate_certificate_pdf.delay(certificate_pk, domain=domain, protocol=protocol)
+            )
     except Exception as e:
+        logger.exception(f"Failed to issue certificate for {student.email} / {course.slug}")
         messages.error(request, f'Failed to issue certificate: {e}')
-        import traceback 
-        traceback.print_exc() 
-        
         if is_ajax(request):
             return JsonResponse({'success': False, 'error': f'Failed to issue certificate: {e}'}, status=500)
         return redirect('dashboard')
 
+    messages.success(request, f'Congratulations! Your certificate for "{course.title}" is being generated and will be emailed to you shortly.')
+    if is_ajax(request):
+        return JsonResponse({
+            'success': True,
+            'message': 'Certificate is being generated.',
+            'redirect_url': str(reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id}))
+        })
+    return redirect('view_certificate', certificate_id=certificate.certificate_id)
+
 
 @login_required
 @user_passes_test(is_student)
@@ -1888,22 +1600,20 @@ def view_certificate(request, certificate_id):
     
     # --- Check for download flag ---
     if request.GET.get('download') == 'true':
-        if certificate.pdf_file and certificate.pdf_file.name:
-            try:
-                if certificate.pdf_file.storage.exists(certificate.pdf_file.name):
-                    with certificate.pdf_file.open('rb') as pdf:
-                        response = HttpResponse(pdf.read(), content_type='application/pdf')
-                        response['Content-Disposition'] = f'attachment; filename="certificate_{certificate.certificate_id}.pdf"'
-                        return response
-                else:
-                    messages.error(request, "PDF file not found. Please try generating it again.")
-                    return redirect('course_detail', slug=certificate.course.slug)
-            except Exception as e:
-                messages.error(request, f"Error serving PDF: {e}.")
-                return redirect('course_detail', slug=certificate.course.slug)
-        else:
+        if certificate.status != 'ready':
+            messages.info(request, "Your certificate PDF is still being generated. Please try again shortly.")
+            return redirect('view_certificate', certificate_id=certificate.certificate_id)
+        if not (certificate.pdf_file and certificate.pdf_file.name):
             messages.error(request, "No PDF file found for this certificate.")
             return redirect('course_detail', slug=certificate.course.slug)
+        try:
+            return serve_field_file(
+                request, certificate.pdf_file, as_attachment=True,
+                filename=f"certificate_{certificate.certificate_id}.pdf", content_type='application/pdf',
+            )
+        except Http404:
+            messages.error(request, "PDF file not found. Please try generating it again.")
+            return redirect('course_detail', slug=certificate.course.slug)
 
     # --- Render HTML Page ---
     # Get domain and protocol for email links
@@ -1926,6 +1636,18 @@ def view_certificate(request, certificate_id):
     return render(request, 'student/certificate_template.html', context)
 
 
+@login_required
+@user_passes_test(is_student)
+def certificate_status(request, certificate_id):
+    """Polled by the certificate page while the PDF is being generated."""
+    certificate = get_object_or_404(Certificate, certificate_id=certificate_id, student=request.user)
+    return JsonResponse({
+        'status': certificate.status,
+        'download_url': f"{reverse('view_certificate', kwargs={'certificate_id': certificate.certificate_id})}?download=true"
+        if certificate.status == 'ready' else None,
+    })
+
+
 @login_required
 @user_passes_test(is_student)
 def certificate_catalog(request):
@@ -2013,37 +1735,50 @@ def audit_logs(request):
     assessments_data = [assessments_passed, assessments_failed, assessments_not_attempted]
 
     all_enrollments = (
-        Enrollment.objects.select_related('course', 'student', 'course__instructor')
+        Enrollment.objects.select_related('course', 'student', 'course__instructor', 'course__quiz')
         .annotate(
             rating_value=rating_subquery,    
             review_comment=comment_subquery  
         )
         .order_by('-enrolled_at')
     )
+    all_enrollments = list(all_enrollments)
+    # Progress and quiz passes come from the enrollment's stored counters; only
+    # "attempted but not passed" needs the attempts table, in one query.
+    final_quiz_attempts = set(
+        StudentQuizAttempt.objects.filter(quiz__course_id__in={e.course_id for e in all_enrollments})
+        .values_list('student_id', 'quiz__course_id')
+        .distinct()
+    )
+    certificates_map = {
+        (cert.student_id, cert.course_id): cert
+        for cert in Certificate.objects.filter(
+            course_id__in={e.course_id for e in all_enrollments}
+        )
+    }
 
     detailed_logs = []
     for enrollment in all_enrollments:
+        certificate = certificates_map.get((enrollment.student_id, enrollment.course_id))
+
         certificate_status = "N/A"
         certificate_link = "#"
-        if getattr(enrollment, "has_certificate", False):
+        if certificate:
             certificate_status = "Issued"
-            if getattr(enrollment, "certificate_obj", None):
-                certificate_link = enrollment.certificate_obj.get_absolute_url()
-        elif getattr(enrollment, "can_claim_certificate", False):
+            certificate_link = certificate.get_absolute_url()
+        elif enrollment.completed and enrollment.has_completed_survey:
             certificate_status = "Eligible (Claimable)"
         elif enrollment.completed:
             certificate_status = "Completed (No Certificate)"
 
-        assessment_status = "No Quiz"
-        if hasattr(enrollment.course, 'quiz'):
-            has_attempts = StudentQuizAttempt.objects.filter(
-                student=enrollment.student,
-                quiz=enrollment.course.quiz
-            ).exists()
-            if has_attempts:
-                assessment_status = "Passed" if enrollment.is_quiz_passed else "Failed"
-            else:
-                assessment_status = "Not Attempted"
+        if not hasattr(enrollment.course, 'quiz'):
+            assessment_status = "No Quiz"
+        elif enrollment.final_quiz_passed:
+            assessment_status = "Passed"
+        elif (enrollment.student_id, enrollment.course_id) in final_quiz_attempts:
+            assessment_status = "Failed"
+        else:
+            assessment_status = "Not Attempted"
 
         detailed_logs.append({
             'student_first_name': enrollment.student.first_name,
@@ -2588,6 +2323,13 @@ def assign_course_to_student_view(request):
                     domain = current_site.domain
                     current_year = timezone.now().year
 
+                    notify(
+                        student.id, 'assignment',
+                        f'You have been assigned: {course.title}',
+                        f"Due {calculated_due_date.strftime('%B %d, %Y')}.",
+                        course.get_absolute_url(),
+                    )
+
                     # --- Email to student ---
                     student_context = {
                         'student_name': student.get_full_name() or student.email,
@@ -2600,7 +2342,7 @@ def assign_course_to_student_view(request):
                         'domain': domain,
                         'current_year': current_year,
                     }
-                    send_templated_email(
+                    queue_templated_email(
                         'emails/course_assigned.html',
                         'You have been assigned a new course!',
                         [student.email],
@@ -2620,7 +2362,7 @@ def assign_course_to_student_view(request):
                         'assigned_by_role': assigner_role,
                         
                     }
-                    send_templated_email(
+                    queue_templated_email(
                         'emails/course_assigned_confirmation.html',
                         f"Course '{course.title}' successfully assigned!",
                         [assigner.email],
@@ -2676,33 +2418,22 @@ def assign_course_page_view(request):
         b = random.randint(0, 255)
         return f'rgba({r}, {g}, {b}, 0.8)'
 
-    enrolled_courses = {enrollment.course for enrollment in all_enrollments}
-    all_modules = Module.objects.filter(course__in=enrolled_courses).order_by('title').distinct()
-    module_content_counts = {
-        module.id: Content.objects.filter(lesson__module=module).count()
-        for module in all_modules
-    }
+    enrollment_list = list(all_enrollments.select_related('student'))
+    progress_map = EnrollmentProgressService.for_enrollments(enrollment_list, include_modules=True)
+    enrolled_course_ids = {enrollment.course_id for enrollment in enrollment_list}
+    all_modules = Module.objects.filter(course_id__in=enrolled_course_ids).order_by('title').distinct()
 
-    enrollment_list = list(all_enrollments)
     for enrollment in enrollment_list:
         student_name = enrollment.student.get_full_name() or enrollment.student.email
         chart_labels.append(student_name)
 
     for module in all_modules:
         module_progress_data = []
-        total_content_in_module = module_content_counts.get(module.id, 0)
 
         for enrollment in enrollment_list:
             student_progress_count = None
-            if module.course == enrollment.course:
-                if total_content_in_module > 0:
-                    completed_content_count = StudentContentProgress.objects.filter(
-                        student=enrollment.student,
-                        content__lesson__module=module
-                    ).count()
-                    student_progress_count = (completed_content_count / total_content_in_module) * 100
-                else:
-                    student_progress_count = 0
+            if module.course_id == enrollment.course_id:
+                student_progress_count = progress_map[enrollment.pk].module_percentage(module.id)
             module_progress_data.append(round(student_progress_count, 2) if student_progress_count is not None else None)
 
         chart_datasets.append({
@@ -2716,7 +2447,7 @@ def assign_course_page_view(request):
     else:
         chart_data = {'labels': chart_labels, 'datasets': chart_datasets}
 
-    paginator = Paginator(all_enrollments, 10)
+    paginator = Paginator(all_enrollments.select_related('student', 'course', 'course__quiz'), 10)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
 
@@ -2760,40 +2491,41 @@ def submit_ticket(request):
     if request.method == 'POST':
         form = SupportTicketForm(request.POST)
         if form.is_valid():
-            ticket = form.save(commit=False)
-            ticket.student = request.user
-            ticket.save()
-
-            student_context = {
-                'ticket': ticket,
-                'username': request.user.get_full_name() or request.user.email,
-                'current_year': timezone.now().year,
-                'request': request,
-            }
-            send_templated_email(
-                'emails/ticket_confirmation.html',
-                f'Confirmation: Support Request #{ticket.ticket_id}',
-                [request.user.email],
-                student_context
-            )
-
-            admin_users = User.objects.filter(is_staff=True, is_active=True).values_list('email', flat=True)
-            admin_emails = [email for email in admin_users if email]
+            with transaction.atomic():
+                ticket = form.save(commit=False)
+                ticket.student = request.user
+                ticket.save()
 
-            if admin_emails:
-                current_site = get_current_site(request)
-                admin_context = {
+                student_context = {
                     'ticket': ticket,
+                    'username': request.user.get_full_name() or request.user.email,
                     'current_year': timezone.now().year,
-                    'domain': current_site.domain,
-                    'protocol': 'https' if request.is_secure() else 'http',
+                    'request': request,
                 }
-                send_templated_email(
-                    'emails/admin_ticket_notification.html',
-                    f'NEW Support Request:#{ticket.ticket_id}',
-                    admin_emails,
-                    admin_context
+                queue_templated_email(
+                    'emails/ticket_confirmation.html',
+                    f'Confirmation: Support Request #{ticket.ticket_id}',
+                    [request.user.email],
+                    student_context
                 )
+
+                admin_users = User.objects.filter(is_staff=True, is_active=True).values_list('email', flat=True)
+                admin_emails = [email for email in admin_users if email]
+
+                if admin_emails:
+                    current_site = get_current_site(request)
+                    admin_context = {
+                        'ticket': ticket,
+                        'current_year': timezone.now().year,
+                        'domain': current_site.domain,
+                        'protocol': 'https' if request.is_secure() else 'http',
+                    }
+                    queue_templated_email(
+                        'emails/admin_ticket_notification.html',
+                        f'NEW Support Request:#{ticket.ticket_id}',
+                        admin_emails,
+                        admin_context
+                    )
             return redirect('ticket_detail', ticket_id=ticket.ticket_id)
     else:
         form = SupportTicketForm()
@@ -2886,6 +2618,12 @@ def resolve_ticket(request, ticket_id):
         ticket.status = 'closed'
         ticket.resolution_note = resolution_note
         ticket.save()
+        notify(
+            ticket.student_id, 'ticket',
+            f'Your support ticket ({ticket.ticket_id}) has been resolved',
+            resolution_note[:200],
+            reverse('ticket_detail', kwargs={'ticket_id': ticket.ticket_id}),
+        )
 
         # --- Get domain and protocol for email links ---
         current_site = get_current_site(request)
@@ -2901,7 +2639,7 @@ def resolve_ticket(request, ticket_id):
             'submit_ticket_url': f"{protocol}://{domain}{reverse('submit_ticket')}", # ADDED
         }
         try:
-            send_templated_email(
+            queue_templated_email(
                 'emails/ticket_resolved_notification.html',
                 f'Your Support Ticket ({ticket.ticket_id}) Has Been Resolved', # Updated subject
                 [ticket.student.email],
@@ -2922,7 +2660,7 @@ def resolve_ticket(request, ticket_id):
 def hr_appraisal_dashboard(request):
     """
     HR Dashboard showing enrollment, completion data, KPIs, and advanced filtering.
-    Progress percentage is now calculated safely in Python (in-memory) after fetching.
+    Progress percentage is read from each enrollment's stored progress counters.
     """
 
     # --- 1. Filter Setup and Base Query ---
@@ -2930,9 +2668,6 @@ def hr_appraisal_dashboard(request):
         'student',
         'course',
         'course__instructor'
-    ).prefetch_related(
-        'course__modules__lessons__contents',
-        'student__content_progress'
     ).order_by('-completed_at', '-enrolled_at')
 
     # Filtering parameters
@@ -2963,31 +2698,9 @@ def hr_appraisal_dashboard(request):
     # Apply filters
     filtered_queryset = enrollments_queryset.filter(filters).order_by(sort_by)
 
-    # --- 2. Progress Calculation ---
-    course_content_counts = (
-        Content.objects
-        .values('lesson__module__course')
-        .annotate(total=Count('id'))
-        )
-    
-    course_content_map = {
-        item['lesson__module__course']: item['total']
-        for item in course_content_counts
-        }
-    
+    # --- 2. Progress Calculation (from the stored progress counters) ---
     for enrollment in filtered_queryset:
-        total_content = course_content_map.get(enrollment.course.id, 0)
-        completed_content = enrollment.student.content_progress.filter(
-        completed=True,
-        content__lesson__module__course=enrollment.course.id
-
-        ).count()
-
-        enrollment.progress_perc = (
-        round((completed_content / total_content) * 100, 0)
-        if total_content > 0 else 0
-
-        )
+        enrollment.progress_perc = round(enrollment.content_percentage, 0)
 
     # --- 3. EXPORT LOGIC ---
     if request.GET.get('export') == 'csv':
@@ -3200,7 +2913,7 @@ def send_evaluation_email_to_hr(request, evaluation):
     }
     
     # 3. Send email
-    send_templated_email(
+    queue_templated_email(
         'emails/evaluation_submission_notification.html',
         f"NEW EVALUATION: {context['course_title']} Submitted by {context['student_name']}",
         recipient_list,
@@ -3471,9 +3184,8 @@ def module_quiz_take(request, module_id):
         messages.error(request, "This knowledge check is not currently available.")
         return redirect('course_detail', slug=course.slug)
  
-    lessons_done = all(
-        lesson.is_completed_by_student(request.user) for lesson in module.lessons.all()
-    )
+    outline = LearnerOutline.build(course, request.user)
+    lessons_done = outline.are_module_lessons_completed(module.id)
     if not lessons_done:
         messages.error(request, "Complete all lessons in this module before taking its knowledge check.")
         return redirect('course_detail', slug=course.slug)
@@ -3666,7 +3378,7 @@ def instructor_assign_training(request):
  
             current_site = get_current_site(request)
             protocol = 'https' if request.is_secure() else 'http'
-            send_templated_email(
+            queue_templated_email(
                 'emails/instructor_training_assigned.html',
                 f"New Training Assigned: {training.training_title}",
                 [training.instructor.email],
@@ -3740,6 +3452,15 @@ def admin_training_review(request):
     return render(request, 'admin/training_review.html', {'page_obj': page_obj})
 
 
+@login_required
+def training_proof(request, training_id):
+    """Proof of completion for an instructor training; visible to the instructor and admins."""
+    training = get_object_or_404(InstructorTraining, id=training_id)
+    if not (request.user.is_staff or training.instructor_id == request.user.id):
+        raise Http404("Training not found.")
+    return serve_field_file(request, training.proof_file)
+
+
 @login_required
 @user_passes_test(is_student)
 def external_training_catalog(request):
@@ -3919,6 +3640,15 @@ def external_training_verify(request, completion_id):
     return redirect('external_training_manage')
 
 
+@login_required
+def external_training_proof(request, completion_id):
+    """Proof uploaded with a self-reported external completion; visible to the student and admins."""
+    completion = get_object_or_404(ExternalTrainingCompletion, id=completion_id)
+    if not (request.user.is_staff or completion.student_id == request.user.id):
+        raise Http404("Completion not found.")
+    return serve_field_file(request, completion.proof_file)
+
+
 @login_required
 @user_passes_test(is_hr)
 def bulk_assign_by_department(request):
@@ -3956,17 +3686,28 @@ def bulk_assign_by_department(request):
                     )
                     for student in students_to_enroll
                 ])
+                # bulk_create skips Enrollment.save, so seed the progress counters here.
+                if new_enrollments:
+                    course.refresh_enrollment_progress()
+                    notify_many('assignment', (
+                        (
+                            e.student_id,
+                            f'You have been assigned: {course.title}',
+                            f"Due {calculated_due_date.strftime('%B %d, %Y')}.",
+                            course.get_absolute_url(),
+                        )
+                        for e in new_enrollments
+                    ))
  
             skipped_count = len(already_enrolled_ids)
             created_count = len(new_enrollments)
  
             if created_count:
                 student_ids = [e.student_id for e in new_enrollments]
-                send_bulk_assignment_emails.delay(
-                    course_id=course.id,
-                    student_ids=student_ids,
-                    assigner_id=request.user.id,
-                    due_date_iso=calculated_due_date.isoformat(),
+                # Chunked so a retry only re-runs one slice, and skips students already emailed.
+                fan_out(
+                    send_bulk_assignment_emails, new_campaign_id('bulk_assignment', course.id),
+                    student_ids, course.id, request.user.id, calculated_due_date.isoformat(),
                 )
  
             messages.success(